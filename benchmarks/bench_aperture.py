@@ -1,233 +1,576 @@
-"""Run benchmarks for aperture photometry functions."""
+"""Run benchmarks for aperture photometry functions.
+
+The suite times each aperture function (circular and elliptical apertures
+and annuli) with each method, without errors, with ``error``, with
+``error`` and ``gain`` and with a ``mask``, and for the shapes of aperture
+parameters allowed by the broadcasting rules. Results can be saved with a
+label (as JSON, in a '_results' directory next to this script), shown, and
+compared to find significant slowdowns:
+
+    python bench_aperture.py run -l before
+    python bench_aperture.py run -l after
+    python bench_aperture.py compare before after
+
+With ``run --memory``, the peak and retained memory of a call of each
+case and the increase of the resident set size are also recorded, and
+shown and compared next to the timings.
+
+`compare` exits with status 1 if a case is significantly slower or uses
+more memory.
+"""
+
+from __future__ import print_function, division
 
-import time
 import os
+import sys
 import glob
+import json
+import gc
+import time
+import math
+import fnmatch
 import argparse
+import platform
+import datetime
+import threading
 from collections import OrderedDict
+
+try:
+    import tracemalloc
+except ImportError:  # Python < 3.4
+    tracemalloc = None
+
 import numpy as np
-import photutils
 
-parser = argparse.ArgumentParser(description=__doc__)
-parser.add_argument("-l", "--label", dest="label", default=None, 
-                    help="Save results to a pickle with this label, so that"
-                    "they can be displayed later. Pickles are save in a "
-                    "'_results' directory in the same parent directory as "
-                    "this script.")
-parser.add_argument("-s", "--show", dest="show", action="store_true",
-                    default=False, help="Show all results from previously "
-                    "labeled runs")
-parser.add_argument("-d", "--delete", dest="delete_label", default=None,
-                    help="Delete saved results with the given label "
-                    "(or 'all' to delete all results). Do not run any "
-                    "benchmarks.")
-args = parser.parse_args()
-
-if args.show and args.label:
-    parser.error("--label doesn't do anything when --show is specified.")
-if args.delete_label and (args.label or args.show):
-    parser.error("--label and --show do not do anything when --delete is "
-                 "specified.")
+import photutils
 
 resultsdir = os.path.abspath(os.path.join(os.path.dirname(__file__),
                                           '_results', 'aperture'))
-piknames = glob.glob(os.path.join(resultsdir, '*.pik'))
 
-# Delete saved results, if requested.
-if args.delete_label is not None:
-    if args.delete_label.lower() == 'all':
-        for pikname in piknames:
-            os.remove(pikname)
+# Highest resolution timer available.
+timer = getattr(time, 'perf_counter', time.time)
+
+
+# Images and objects: image shape, number of objects, aperture size and
+# number of apertures per object for the multi-aperture shapes.
+scenarios = OrderedDict()
+scenarios['small'] = dict(dims=(20, 20), n_obj=1, size=5., n_aper=5)
+scenarios['isolated'] = dict(dims=(1000, 1000), n_obj=1000, size=5.,
+                             n_aper=5)
+scenarios['big'] = dict(dims=(1000, 1000), n_obj=100, size=50., n_aper=3)
+
+
+# Aperture functions, with their parameters as a function of the size of
+# the aperture (lengths are multiplied by the broadcast size array).
+functions = OrderedDict()
+functions['circ'] = (photutils.aperture_circular,
+                     lambda s: (s,))
+functions['circ_ann'] = (photutils.annulus_circular,
+                         lambda s: (s, 1.5 * s))
+functions['elli'] = (photutils.aperture_elliptical,
+                     lambda s: (s, 0.6 * s, 0.5))
+functions['elli_ann'] = (photutils.annulus_elliptical,
+                         lambda s: (s, 1.5 * s, 0.9 * s, 0.5))
+
+methods = OrderedDict()
+methods['center'] = dict(method='center')
+methods['subpixel5'] = dict(method='subpixel', subpixels=5)
+methods['subpixel10'] = dict(method='subpixel', subpixels=10)
+methods['exact'] = dict(method='exact')
+
+errors = ['none', 'error', 'error+gain', 'mask']
+
+# Shapes of the aperture parameters (see `aperture_photometry`).
+shapes = ['()', '(N,)', '(M, 1)', '(M, N)']
+
+
+def aperture_sizes(shape, size, n_aper, n_obj, rng):
+    """Array of aperture sizes broadcasting to ``shape``."""
+    if shape == '()':
+        return np.array(size)
+    per_object = rng.uniform(0.8, 1.2, n_obj)
+    per_aperture = np.linspace(0.5, 1.5, n_aper)[:, np.newaxis]
+    if shape == '(N,)':
+        return size * per_object
+    if shape == '(M, 1)':
+        return size * per_aperture
+    return size * per_aperture * per_object
+
+
+def make_cases():
+    """Benchmark cases, by name.
+
+    All functions and methods are timed in each scenario without errors
+    and for a single aperture shared by all objects. The errors, mask and
+    multi-aperture shapes are timed on isolated objects.
+    """
+    cases = OrderedDict()
+    for scenario in scenarios:
+        for function in functions:
+            for method in methods:
+                for error in errors:
+                    for shape in shapes:
+                        if scenario != 'isolated' and (error != 'none' or
+                                                       shape != '()'):
+                            continue
+                        if error != 'none' and shape != '()':
+                            continue
+                        name = '/'.join([scenario, function, shape, method,
+                                         error])
+                        cases[name] = dict(scenario=scenario,
+                                           function=function, method=method,
+                                           error=error, shape=shape)
+    return cases
+
+
+def setup_case(case, seed=0):
+    """Function of no arguments running one case."""
+    rng = np.random.RandomState(seed)
+    scenario = scenarios[case['scenario']]
+    ny, nx = scenario['dims']
+    n_obj = scenario['n_obj']
+    size = scenario['size']
+
+    data = rng.uniform(0., 1., (ny, nx))
+    margin = min(2. * size, nx / 4.)
+    if n_obj == 1:
+        xc, yc = nx / 2., ny / 2.
     else:
+        xc = rng.uniform(margin, nx - margin, n_obj)
+        yc = rng.uniform(margin, ny - margin, n_obj)
+
+    kwargs = dict(methods[case['method']])
+    if case['error'] in ('error', 'error+gain'):
+        kwargs['error'] = rng.uniform(0.5, 1., (ny, nx))
+    if case['error'] == 'error+gain':
+        kwargs['gain'] = rng.uniform(1., 2., (ny, nx))
+    if case['error'] == 'mask':
+        kwargs['mask'] = rng.uniform(size=(ny, nx)) < 0.01
+
+    function, parameters = functions[case['function']]
+    sizes = aperture_sizes(case['shape'], size, scenario['n_aper'], n_obj,
+                           rng)
+    params = parameters(sizes)
+
+    return lambda: function(data, xc, yc, *params, **kwargs)
+
+
+def time_case(func, repeat, min_time):
+    """Time ``func``, calibrating the number of calls per sample so that a
+    sample lasts at least ``min_time`` seconds. Returns the number of
+    calls per sample and the time per call of each of ``repeat``
+    samples."""
+    number = 1
+    while True:
+        t0 = timer()
+        for i in range(number):
+            func()
+        elapsed = timer() - t0
+        if elapsed >= min_time or number >= 2 ** 20:
+            break
+        number *= 2 if elapsed == 0. else max(2, min(
+            10, int(math.ceil(1.2 * min_time / elapsed))))
+    samples = []
+    for k in range(repeat):
+        t0 = timer()
+        for i in range(number):
+            func()
+        samples.append((timer() - t0) / number)
+    return number, samples
+
+
+def current_rss():
+    """Resident set size of this process in bytes, or `None` if it cannot
+    be read (it is read from /proc on Linux, or with psutil if it is
+    installed)."""
+    try:
+        with open('/proc/self/statm') as infile:
+            return int(infile.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process(os.getpid()).memory_info().rss
+
+
+class RSSSampler(threading.Thread):
+    """Thread recording the largest resident set size of the process,
+    sampled every ``interval`` seconds until `stop` is called.
+
+    Samples are only taken while the main thread releases the GIL (as
+    numpy does for large operations), so short peaks may be missed.
+    """
+
+    def __init__(self, interval):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.interval = interval
+        self.peak = current_rss()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.is_set():
+            self._sample()
+            self._done.wait(self.interval)
+
+    def _sample(self):
+        rss = current_rss()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        self._sample()
+        return self.peak
+
+
+def measure_memory(func, interval):
+    """Memory used by a call of ``func``.
+
+    Returns a dictionary of the peak size of the Python and numpy
+    allocations traced by `tracemalloc` during the call (``peak``), the
+    size and number of the allocations still alive after it
+    (``retained`` and ``retained_blocks``), and the largest increase of
+    the resident set size of the process (``rss``, `None` if it cannot be
+    read). Sizes are in bytes, relative to the state before the call.
+    """
+    func()  # Warm up caches and imports, which are not counted.
+    gc.collect()
+    tracemalloc.start()
+    try:
+        start_blocks = len(tracemalloc.take_snapshot().traces)
+        start_size = tracemalloc.get_traced_memory()[0]
+        start_rss = current_rss()
+        sampler = RSSSampler(interval)
+        sampler.start()
         try:
-            os.remove(os.path.join(resultsdir,
-                                   '{0}.pik'.format(args.delete_label)))
-        except OSError:
-            raise ValueError('No such label exists: {0}'
-                             .format(args.delete_label))
-    exit()
-
-c = OrderedDict()
-
-name = "Small data, single small aperture"
-c[name] = {}
-c[name]['dims']     = (20, 20)
-c[name]['pos']      = (10., 10.)
-c[name]['circ']     = (5.,)
-c[name]['circ_ann'] = (5., 6.)
-c[name]['elli']     = (5., 2., 0.5)
-c[name]['elli_ann'] = (2., 5., 4., 0.5)
-c[name]['iter']     = 1000
-
-name = "Big data, single small aperture"
-c[name] = {}
-c[name]['dims']     = (1000, 1000)
-c[name]['pos']      = (500., 500.)
-c[name]['circ']     = (5.,)
-c[name]['circ_ann'] = (5., 6.)
-c[name]['elli']     = (5., 2., 0.5)
-c[name]['elli_ann'] = (2., 5., 4., 0.5)
-c[name]['iter']     = 1000
-
-name = "Big data, single big aperture"
-c[name] = {}
-c[name]['dims']     = (1000, 1000)
-c[name]['pos']      = (500., 500.)
-c[name]['circ']     = (50.,)
-c[name]['circ_ann'] = (50., 60.)
-c[name]['elli']     = (50., 20., 0.5)
-c[name]['elli_ann'] = (20., 50., 40., 0.5)
-c[name]['iter']     = 10
-
-name = "Small data, multiple small apertures"
-c[name] = {}
-c[name]['dims']     = (20, 20)
-c[name]['pos']      = (np.random.uniform(5., 15., 1000), np.random.uniform(5., 15., 1000))
-c[name]['circ']     = (5.,)
-c[name]['circ_ann'] = (5., 6.)
-c[name]['elli']     = (5., 2., 0.5)
-c[name]['elli_ann'] = (2., 5., 4., 0.5)
-c[name]['iter']     = 1
-
-name = "Big data, multiple small apertures"
-c[name] = {}
-c[name]['dims']     = (1000, 1000)
-c[name]['pos']      = (np.random.uniform(250., 750., 1000), np.random.uniform(250., 750., 1000))
-c[name]['circ']     = (5.,)
-c[name]['circ_ann'] = (5., 6.)
-c[name]['elli']     = (5., 2., 0.5)
-c[name]['elli_ann'] = (2., 5., 4., 0.5)
-c[name]['iter']     = 1
-
-name = "Big data, multiple small apertures, multiple per object"
-c[name] = {}
-c[name]['dims']     = (1000, 1000)
-c[name]['pos']      = (np.random.uniform(250., 750., 1000), np.random.uniform(250., 750., 1000))
-c[name]['circ']     = (np.linspace(1., 10., 10).reshape((10, 1)),)
-c[name]['iter']     = 1
-
-name = "Big data, multiple big apertures"
-c[name] = {}
-c[name]['dims']     = (1000, 1000)
-c[name]['pos']      = (np.random.uniform(250., 750., 100), np.random.uniform(250., 750., 100))
-c[name]['circ']     = (50.,)
-c[name]['circ_ann'] = (50., 60.)
-c[name]['elli']     = (50., 20., 0.5)
-c[name]['elli_ann'] = (20., 50., 40., 0.5)
-c[name]['iter']     = 1
-
-
-f = {}
-f['circ'] = photutils.aperture_circular
-f['circ_ann'] = photutils.annulus_circular
-f['elli'] = photutils.aperture_elliptical
-f['elli_ann'] = photutils.annulus_elliptical
-
-
-# Select subset of defined tests and functions to run, to save time.
-names_to_run = ["Small data, single small aperture",
-                "Big data, single small aperture",
-                "Big data, single big aperture",
-                "Small data, multiple small apertures",
-                "Big data, multiple small apertures, multiple per object",
-                "Big data, multiple small apertures",
-                "Big data, multiple big apertures"]
-functions_to_run = ['circ']
-
-if not args.show:
-
-    # Initialize results
-    results = OrderedDict()
-
-    for name in names_to_run:
-
-        # Initialize results container for this benchmark
-        results[name] = OrderedDict()
-        for t in functions_to_run:
-            results[name][t] = OrderedDict()
-
-        # Initialize data
-        x, y = c[name]['pos']
-        data = np.ones(c[name]['dims'])
-
-        # Print header for this benchmark
-        print "=" * 79
-        print name, "  (milliseconds)"
-        print "%30s " % ("subpixels ="),
-        for subpixels in [1, 5, 10, 'exact']:
-            print str(subpixels).center(10) + " ",
-        print ""
-        print "-" * 79
-
-        t0 = time.time()
-
-        for t in functions_to_run:
-
-            if t not in c[name]: continue
-            print "%30s " % t,
-
-            for subpixels in [1, 5, 10, 'exact']:
-                time1 = time.time()
-                for i in range(c[name]['iter']):
-                    f[t](data, x, y, *c[name][t], subpixels=subpixels)
-                time2 = time.time()
-                time_sec = (time2 - time1) / c[name]['iter']
-                print "%10.5f " % (time_sec * 1000.),
-                results[name][t][subpixels] = time_sec
-            print ""
-
-        t1 = time.time()
-
-        print "-" * 79
-        print 'Real time: %10.4f s' % (t1 - t0)
-        print ""
-
-    # If a label was specified, save results to a pickle.
+            func()
+        finally:
+            peak_rss = sampler.stop()
+        size, peak = tracemalloc.get_traced_memory()
+        gc.collect()
+        size = tracemalloc.get_traced_memory()[0]
+        blocks = len(tracemalloc.take_snapshot().traces)
+    finally:
+        tracemalloc.stop()
+
+    rss = None
+    if start_rss is not None and peak_rss is not None:
+        rss = max(peak_rss - start_rss, 0)
+    return OrderedDict([('peak', peak - start_size),
+                        ('retained', size - start_size),
+                        ('retained_blocks', blocks - start_blocks),
+                        ('rss', rss)])
+
+
+def format_size(size):
+    """Size in MB for tables, or '-' if it is not known."""
+    if size is None:
+        return "-"
+    return "%.2f" % (size / 2. ** 20)
+
+
+def environment():
+    """Description of the machine and software versions."""
+    return OrderedDict([
+        ('date', datetime.datetime.now().isoformat()),
+        ('python', platform.python_version()),
+        ('numpy', np.__version__),
+        ('photutils', getattr(photutils, '__version__', 'unknown')),
+        ('platform', platform.platform()),
+        ('processor', platform.processor() or platform.machine())])
+
+
+def results_path(label):
+    """Path of the results file of a label (or a path to a JSON file)."""
+    if label.endswith('.json') and os.path.exists(label):
+        return label
+    return os.path.join(resultsdir, '{0}.json'.format(label))
+
+
+def load_results(label):
+    path = results_path(label)
+    if not os.path.exists(path):
+        raise ValueError('No such label exists: {0}'.format(label))
+    with open(path) as infile:
+        return json.load(infile, object_pairs_hook=OrderedDict)
+
+
+def save_results(results, label):
+    if not os.path.exists(resultsdir):
+        os.makedirs(resultsdir)
+    with open(results_path(label), 'w') as outfile:
+        json.dump(results, outfile, indent=1)
+
+
+def mann_whitney_greater(x, y):
+    """One-sided p-value for the samples ``x`` being greater than ``y``
+    (Mann-Whitney U test with the normal approximation, corrected for
+    ties)."""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n_x, n_y = len(x), len(y)
+    if n_x < 2 or n_y < 2:
+        return 1.
+    values = np.concatenate([x, y])
+    # Mid-ranks, averaged over ties.
+    order = np.argsort(values, kind='mergesort')
+    ranks = np.empty(len(values))
+    ranks[order] = np.arange(1, len(values) + 1)
+    unique, inverse, counts = np.unique(values, return_inverse=True,
+                                        return_counts=True)
+    ranks = (np.bincount(inverse, ranks) / counts)[inverse]
+
+    u = ranks[:n_x].sum() - n_x * (n_x + 1) / 2.
+    n = n_x + n_y
+    variance = n_x * n_y / 12. * ((n + 1) -
+                                  np.sum(counts ** 3 - counts) / (n * (n - 1)))
+    if variance <= 0.:
+        return 1.
+    z = (u - n_x * n_y / 2. - 0.5) / math.sqrt(variance)
+    return 0.5 * math.erfc(z / math.sqrt(2.))
+
+
+def run(args):
+    cases = make_cases()
+    names = [name for name in cases
+             if not args.select or
+             any(fnmatch.fnmatch(name, pattern) for pattern in args.select)]
+    if not names:
+        raise ValueError('No benchmark matches {0}'.format(args.select))
+
+    if args.memory and tracemalloc is None:
+        raise RuntimeError('--memory requires the tracemalloc module '
+                           '(Python 3.4 or later)')
+
+    results = OrderedDict([('environment', environment()),
+                           ('repeat', args.repeat),
+                           ('cases', OrderedDict())])
+
+    print("=" * 79)
+    if args.memory:
+        print("%-45s %10s %7s %7s %7s" % ("case", "median ms", "peak MB",
+                                          "kept MB", "rss MB"))
+    else:
+        print("%-55s %10s %10s" % ("case", "median ms", "min ms"))
+    print("-" * 79)
+    t0 = timer()
+    for name in names:
+        func = setup_case(cases[name])
+        number, samples = time_case(func, args.repeat, args.min_time)
+        result = OrderedDict([('number', number), ('times', samples)])
+        results['cases'][name] = result
+        if args.memory:
+            # Measured apart from the timings, which tracing slows down.
+            memory = measure_memory(func, args.memory_interval)
+            result['memory'] = memory
+            print("%-45s %10.4f %7s %7s %7s" % (
+                name, np.median(samples) * 1.e3,
+                format_size(memory['peak']), format_size(memory['retained']),
+                format_size(memory['rss'])))
+        else:
+            print("%-55s %10.4f %10.4f" % (name, np.median(samples) * 1.e3,
+                                           min(samples) * 1.e3))
+        sys.stdout.flush()
+    print("-" * 79)
+    print('Real time: %10.4f s' % (timer() - t0))
+
     if args.label is not None:
-        import pickle
-        pikname = os.path.join(resultsdir, '{0}.pik'.format(args.label))
-        if not os.path.exists(resultsdir):
-            os.makedirs(resultsdir)
-        outfile = open(pikname, 'w')
-        pickle.dump(results, outfile)
-        outfile.close()
-
-if args.show:
-    import pickle
-
-    # Load pickled results
-    results = OrderedDict()
-    piknames = glob.glob(os.path.join(resultsdir, '*.pik'))
-    for pikname in piknames:
-        label = os.path.basename(pikname)[:-4]
-        infile = open(pikname, 'r')
-        results[label] = pickle.load(infile)
-        infile.close()
-    if len(results) == 0:
-        raise RuntimeError('No saved results.')
+        save_results(results, args.label)
 
-    # Loop over different cases
-    firstlabel = results.keys()[0]
-    for name in results[firstlabel]:
-   
-        # Print header for this case
-        print "=" * 79
-        print "%-63s (milliseconds)" % name
-        print " " * 45, "subpixels"
-        print "%15s %20s" % ("function", "label"),
-        for subpixels in [1, 5, 10, 'exact']:
-            print str(subpixels).center(8) + " ",
-        print ""
-        print "-" * 79
-        
-        for t in functions_to_run:
-            for label, result in results.iteritems():
-                if t not in result[name]: continue
-                print "%15s %20s" % (t, label),
-                for subpixels in [1, 5, 10, 'exact']:
-                    time_sec = result[name][t][subpixels]
-                    print "%8.3f " % (time_sec * 1000.),
-                print ""
-
-        print "-" * 79
-        print ""
+
+def show(args):
+    labels = args.labels
+    if not labels:
+        labels = sorted(os.path.basename(path)[:-5] for path in
+                        glob.glob(os.path.join(resultsdir, '*.json')))
+    if not labels:
+        raise RuntimeError('No saved results.')
+    results = OrderedDict((label, load_results(label)) for label in labels)
+
+    names = []
+    for result in results.values():
+        names.extend(name for name in result['cases'] if name not in names)
+
+    print("=" * 79)
+    print("median time (ms)")
+    print("%-45s" % "case" + "".join(" %10s" % label[:10]
+                                     for label in results))
+    print("-" * 79)
+    for name in names:
+        line = "%-45s" % name
+        for result in results.values():
+            if name in result['cases']:
+                line += " %10.4f" % (
+                    np.median(result['cases'][name]['times']) * 1.e3)
+            else:
+                line += " %10s" % "-"
+        print(line)
+    print("-" * 79)
+
+    if not any('memory' in case for result in results.values()
+               for case in result['cases'].values()):
+        return
+    print("")
+    print("=" * 79)
+    print("peak traced memory (MB)")
+    print("%-45s" % "case" + "".join(" %10s" % label[:10]
+                                     for label in results))
+    print("-" * 79)
+    for name in names:
+        line = "%-45s" % name
+        for result in results.values():
+            memory = result['cases'].get(name, {}).get('memory')
+            line += " %10s" % (format_size(memory['peak'])
+                               if memory is not None else "-")
+        print(line)
+    print("-" * 79)
+
+
+def compare(args):
+    base = load_results(args.base)
+    new = load_results(args.new)
+
+    print("=" * 79)
+    print("%-47s %9s %9s %6s %7s" % ("case", args.base[:9], args.new[:9],
+                                     "ratio", ""))
+    print("-" * 79)
+    slower = faster = 0
+    for name, new_result in new['cases'].items():
+        if name not in base['cases']:
+            continue
+        base_times = base['cases'][name]['times']
+        new_times = new_result['times']
+        ratio = np.median(new_times) / np.median(base_times)
+        flag = ''
+        if (ratio > 1. + args.threshold and
+                mann_whitney_greater(new_times, base_times) < args.alpha):
+            flag = 'SLOWER'
+            slower += 1
+        elif (ratio < 1. / (1. + args.threshold) and
+                mann_whitney_greater(base_times, new_times) < args.alpha):
+            flag = 'faster'
+            faster += 1
+        if flag or not args.only_changed:
+            print("%-47s %9.4f %9.4f %6.2f %7s" % (
+                name, np.median(base_times) * 1.e3,
+                np.median(new_times) * 1.e3, ratio, flag))
+    print("-" * 79)
+    print("{0} slower, {1} faster (threshold {2:.0%}, alpha {3})"
+          .format(slower, faster, args.threshold, args.alpha))
+
+    # Memory is deterministic enough to compare single measurements, with a
+    # floor on the change for small cases.
+    more_memory = 0
+    lines = []
+    for name, new_result in new['cases'].items():
+        base_memory = base['cases'].get(name, {}).get('memory')
+        new_memory = new_result.get('memory')
+        if base_memory is None or new_memory is None:
+            continue
+        flags = []
+        for key in ('peak', 'retained', 'rss'):
+            if base_memory[key] is None or new_memory[key] is None:
+                continue
+            change = new_memory[key] - base_memory[key]
+            if (change > args.memory_floor * 2 ** 20 and
+                    change > args.memory_threshold * base_memory[key]):
+                flags.append(key)
+        if flags:
+            more_memory += 1
+        if flags or not args.only_changed:
+            lines.append("%-47s %9s %9s %15s" % (
+                name, format_size(base_memory['peak']),
+                format_size(new_memory['peak']),
+                'MORE ' + ','.join(flags) if flags else ''))
+    if lines:
+        print("")
+        print("=" * 79)
+        print("%-47s %9s %9s" % ("case (peak MB)", args.base[:9],
+                                 args.new[:9]))
+        print("-" * 79)
+        for line in lines:
+            print(line)
+        print("-" * 79)
+        print("{0} using more memory (threshold {1:.0%}, at least {2} MB)"
+              .format(more_memory, args.memory_threshold, args.memory_floor))
+
+    return 1 if slower or more_memory else 0
+
+
+def delete(args):
+    if args.label.lower() == 'all':
+        for path in glob.glob(os.path.join(resultsdir, '*.json')):
+            os.remove(path)
+    else:
+        try:
+            os.remove(results_path(args.label))
+        except OSError:
+            raise ValueError('No such label exists: {0}'.format(args.label))
+
+
+parser = argparse.ArgumentParser(
+    description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+subparsers = parser.add_subparsers(dest='command')
+
+parser_run = subparsers.add_parser('run', help="Run the benchmarks.")
+parser_run.add_argument("-l", "--label", dest="label", default=None,
+                        help="Save results with this label, so that they "
+                        "can be shown or compared later.")
+parser_run.add_argument("-k", "--select", dest="select", action="append",
+                        default=[], help="Only run the cases whose name "
+                        "(scenario/function/shape/method/errors) matches "
+                        "this shell-style pattern. May be repeated.")
+parser_run.add_argument("-r", "--repeat", dest="repeat", type=int, default=7,
+                        help="Number of timing samples of each case.")
+parser_run.add_argument("-t", "--min-time", dest="min_time", type=float,
+                        default=0.05, help="Minimum duration of a sample "
+                        "in seconds.")
+parser_run.add_argument("-m", "--memory", dest="memory",
+                        action="store_true", default=False,
+                        help="Also record the peak and retained memory of "
+                        "a call of each case (with tracemalloc) and the "
+                        "largest increase of the resident set size.")
+parser_run.add_argument("--memory-interval", dest="memory_interval",
+                        type=float, default=0.001, help="Interval between "
+                        "samples of the resident set size in seconds.")
+
+parser_show = subparsers.add_parser('show', help="Show saved results.")
+parser_show.add_argument("labels", nargs="*",
+                         help="Labels to show (by default, all).")
+
+parser_compare = subparsers.add_parser(
+    'compare', help="Compare the saved results of two runs.")
+parser_compare.add_argument("base", help="Label of the reference run.")
+parser_compare.add_argument("new", help="Label of the run to check.")
+parser_compare.add_argument("--threshold", dest="threshold", type=float,
+                            default=0.1, help="Smallest relative change of "
+                            "the median time reported.")
+parser_compare.add_argument("--alpha", dest="alpha", type=float,
+                            default=0.01, help="Significance level of the "
+                            "Mann-Whitney U test of the samples.")
+parser_compare.add_argument("--only-changed", dest="only_changed",
+                            action="store_true", default=False,
+                            help="Only show the cases that changed.")
+parser_compare.add_argument("--memory-threshold", dest="memory_threshold",
+                            type=float, default=0.2, help="Smallest "
+                            "relative increase of memory reported.")
+parser_compare.add_argument("--memory-floor", dest="memory_floor",
+                            type=float, default=1., help="Smallest increase "
+                            "of memory reported, in MB.")
+
+parser_delete = subparsers.add_parser(
+    'delete', help="Delete saved results.")
+parser_delete.add_argument("label", help="Label to delete, or 'all'.")
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    if args.command is None:
+        parser.error('a command is required')
+    status = {'run': run, 'show': show, 'compare': compare,
+              'delete': delete}[args.command](args)
+    sys.exit(status or 0)
@@ -0,0 +1,70 @@
+"""Benchmark arrays of apertures in ``aperture_photometry``.
+
+Times the construction of the apertures and the photometry for an object
+array of `CircularAperture` instances and for the equivalent
+`CircularApertureArray`, with a different radius for each object.
+"""
+
+from __future__ import print_function, division
+
+import time
+import argparse
+
+import numpy as np
+
+from photutils import (CircularAperture, CircularApertureArray,
+                       aperture_photometry)
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("-s", "--size", dest="size", type=int, default=2000,
+                    help="Size of the (square) image in pixels.")
+parser.add_argument("-n", "--iter", dest="niter", type=int, default=3,
+                    help="Number of repetitions of each measurement.")
+args = parser.parse_args()
+
+
+def best_time(func, niter):
+    times = []
+    for i in range(niter):
+        t0 = time.time()
+        func()
+        times.append(time.time() - t0)
+    return min(times)
+
+
+def object_array(r):
+    apertures = np.empty(r.shape, dtype=object)
+    for index in np.ndindex(*r.shape):
+        apertures[index] = CircularAperture(r[index])
+    return apertures
+
+
+rng = np.random.RandomState(0)
+data = rng.uniform(0., 1., (args.size, args.size))
+
+print("=" * 70)
+print("{0}x{0} image, time (ms)".format(args.size))
+print("%10s %8s %12s %12s %12s %12s" % ("objects", "method", "build obj",
+                                        "phot obj", "build array",
+                                        "phot array"))
+print("-" * 70)
+
+for nobj in [1000, 100000]:
+    xc = rng.uniform(0., args.size, nobj)
+    yc = rng.uniform(0., args.size, nobj)
+    r = rng.uniform(1., 5., nobj)
+    objects = object_array(r)
+    arrays = CircularApertureArray(r)
+    for method in ['center', 'exact']:
+        times = [best_time(lambda: object_array(r), args.niter),
+                 best_time(lambda: aperture_photometry(
+                     data, xc, yc, objects, method=method, cache=False),
+                     args.niter),
+                 best_time(lambda: CircularApertureArray(r), args.niter),
+                 best_time(lambda: aperture_photometry(
+                     data, xc, yc, arrays, method=method, cache=False),
+                     args.niter)]
+        print("%10d %8s %12.1f %12.1f %12.1f %12.1f" %
+              ((nobj, method) + tuple(t * 1.e3 for t in times)))
+
+print("-" * 70)
@@ -0,0 +1,92 @@
+"""Benchmark the compiled multi-object photometry engine.
+
+Compares ``aperture_photometry`` for many small apertures when the
+apertures are handled by the compiled engine (the built-in aperture
+classes) with the loop over objects in Python (used for any other
+``Aperture`` subclass, here trivial subclasses of the built-in ones).
+"""
+
+from __future__ import print_function, division
+
+import time
+import argparse
+
+import numpy as np
+
+from photutils import CircularAperture, CircularAnnulus, \
+                      EllipticalAperture, EllipticalAnnulus, \
+                      aperture_photometry
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("-N", "--nobj", dest="nobj", type=int, default=10000,
+                    help="Number of objects.")
+parser.add_argument("-s", "--size", dest="size", type=int, default=1000,
+                    help="Size of the (square) image in pixels.")
+parser.add_argument("-n", "--iter", dest="niter", type=int, default=3,
+                    help="Number of repetitions of each measurement.")
+args = parser.parse_args()
+
+
+class LoopCircularAperture(CircularAperture):
+    pass
+
+
+class LoopCircularAnnulus(CircularAnnulus):
+    pass
+
+
+class LoopEllipticalAperture(EllipticalAperture):
+    pass
+
+
+class LoopEllipticalAnnulus(EllipticalAnnulus):
+    pass
+
+
+apertures = [('circ', CircularAperture, LoopCircularAperture, (3.,)),
+             ('circ_ann', CircularAnnulus, LoopCircularAnnulus, (3., 5.)),
+             ('elli', EllipticalAperture, LoopEllipticalAperture,
+              (3., 2., 0.5)),
+             ('elli_ann', EllipticalAnnulus, LoopEllipticalAnnulus,
+              (2., 4., 3., 0.5))]
+
+
+def best_time(func, niter):
+    times = []
+    for i in range(niter):
+        t0 = time.time()
+        func()
+        times.append(time.time() - t0)
+    return min(times)
+
+
+rng = np.random.RandomState(0)
+data = rng.uniform(0., 1., (args.size, args.size))
+xc = rng.uniform(0., args.size, args.nobj)
+yc = rng.uniform(0., args.size, args.nobj)
+
+print("=" * 79)
+print("{0} objects on a {1}x{1} image, time per object (microseconds)"
+      .format(args.nobj, args.size))
+print("%10s %10s %15s %15s %10s" % ("aperture", "method", "python loop",
+                                    "engine", "speedup"))
+print("-" * 79)
+
+for name, cls, loop_cls, params in apertures:
+    for method in ['center', 'subpixel', 'exact']:
+
+        def engine():
+            aperture_photometry(data, xc, yc, cls(*params), method=method)
+
+        def loop():
+            aperture_photometry(data, xc, yc, loop_cls(*params),
+                                method=method)
+
+        t_loop = best_time(loop, args.niter)
+        t_engine = best_time(engine, args.niter)
+
+        print("%10s %10s %15.3f %15.3f %9.1fx" %
+              (name, method, t_loop / args.nobj * 1.e6,
+               t_engine / args.nobj * 1.e6, t_loop / t_engine))
+
+print("-" * 79)
@@ -0,0 +1,76 @@
+"""Benchmark the cache of aperture fraction arrays.
+
+Runs ``aperture_photometry`` with and without the fraction cache, for
+objects on a regular grid (whose sub-pixel offsets repeat) and at random
+positions (whose offsets do not), and reports the cache hits and misses.
+"""
+
+from __future__ import print_function, division
+
+import time
+import argparse
+
+import numpy as np
+
+from photutils import CircularAperture, EllipticalAperture, \
+                      FractionCache, aperture_photometry
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("-N", "--nobj", dest="nobj", type=int, default=100000,
+                    help="Number of objects.")
+parser.add_argument("-s", "--size", dest="size", type=int, default=2000,
+                    help="Size of the (square) image in pixels.")
+parser.add_argument("-n", "--iter", dest="niter", type=int, default=3,
+                    help="Number of repetitions of each measurement.")
+args = parser.parse_args()
+
+
+def best_time(func, niter):
+    times = []
+    for i in range(niter):
+        t0 = time.time()
+        func()
+        times.append(time.time() - t0)
+    return min(times)
+
+
+rng = np.random.RandomState(0)
+data = rng.uniform(0., 1., (args.size, args.size))
+
+step = max(int(args.size / np.sqrt(args.nobj)), 1)
+grid = np.arange(10., args.size - 10., step) + 0.3
+xx, yy = np.meshgrid(grid, grid)
+positions = [('grid', xx.ravel()[:args.nobj], yy.ravel()[:args.nobj]),
+             ('random', rng.uniform(0., args.size, args.nobj),
+              rng.uniform(0., args.size, args.nobj))]
+
+print("=" * 79)
+print("Time per object (microseconds) with and without the fraction cache")
+print("%10s %8s %10s %12s %12s %9s %8s %8s" %
+      ("aperture", "method", "positions", "no cache", "cache", "speedup",
+       "hits", "misses"))
+print("-" * 79)
+
+for name, aperture in [('circ', CircularAperture(4.)),
+                       ('elli', EllipticalAperture(4., 2., 0.5))]:
+    for method in ['center', 'subpixel', 'exact']:
+        for label, xc, yc in positions:
+
+            cache = FractionCache()
+
+            def uncached():
+                aperture_photometry(data, xc, yc, aperture, method=method,
+                                    cache=False)
+
+            def cached():
+                aperture_photometry(data, xc, yc, aperture, method=method,
+                                    cache=cache)
+
+            t_uncached = best_time(uncached, args.niter)
+            t_cached = best_time(cached, args.niter)
+            print("%10s %8s %10s %12.3f %12.3f %8.1fx %8d %8d" %
+                  (name, method, label, t_uncached / len(xc) * 1.e6,
+                   t_cached / len(xc) * 1.e6, t_uncached / t_cached,
+                   cache.hits, cache.misses))
+
+print("-" * 79)
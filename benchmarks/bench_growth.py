@@ -0,0 +1,68 @@
+"""Benchmark growth curves: concentric circular apertures shared by all
+objects.
+
+Compares ``aperture_photometry`` with an (N_radii, 1) array of
+``CircularAperture``, which is done in a single pass over the pixels of
+each object, with the same apertures given separately for each object as
+an (N_radii, N_objects) array, for which each radius covers the whole
+sub-array of the object.
+"""
+
+from __future__ import print_function, division
+
+import time
+import argparse
+
+import numpy as np
+
+from photutils import CircularAperture, aperture_photometry
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("-N", "--nobj", dest="nobj", type=int, default=1000,
+                    help="Number of objects.")
+parser.add_argument("-r", "--radii", dest="nradii", type=int, default=10,
+                    help="Number of radii, from 1 to 10 pixels.")
+parser.add_argument("-n", "--iter", dest="niter", type=int, default=3,
+                    help="Number of repetitions of each measurement.")
+args = parser.parse_args()
+
+
+def best_time(func, niter):
+    times = []
+    for i in range(niter):
+        t0 = time.time()
+        func()
+        times.append(time.time() - t0)
+    return min(times)
+
+
+rng = np.random.RandomState(0)
+data = rng.uniform(0., 1., (1000, 1000))
+xc = rng.uniform(250., 750., args.nobj)
+yc = rng.uniform(250., 750., args.nobj)
+
+shared = np.array([[CircularAperture(r)]
+                   for r in np.linspace(1., 10., args.nradii)])
+separate = np.repeat(shared, args.nobj, axis=1)
+
+print("=" * 79)
+print("{0} radii, {1} objects, time per object (microseconds)"
+      .format(args.nradii, args.nobj))
+print("%10s %15s %15s %10s %12s" % ("method", "separate", "single pass",
+                                    "speedup", "max diff"))
+print("-" * 79)
+
+for method in ['center', 'subpixel', 'exact']:
+
+    def run(apertures):
+        return aperture_photometry(data, xc, yc, apertures, method=method,
+                                   cache=False)
+
+    t_separate = best_time(lambda: run(separate), args.niter)
+    t_shared = best_time(lambda: run(shared), args.niter)
+    diff = np.abs(run(shared) - run(separate)).max()
+    print("%10s %15.3f %15.3f %9.1fx %12.2e" %
+          (method, t_separate / args.nobj * 1.e6, t_shared / args.nobj * 1.e6,
+           t_separate / t_shared, diff))
+
+print("-" * 79)
@@ -0,0 +1,72 @@
+"""Benchmark the dense flux maps of `aperture_photometry_map`.
+
+Times the flux map of an image with apertures of increasing size, with
+direct and FFT correlation, and compares the time per position with
+``aperture_photometry`` on a sample of the positions.
+"""
+
+from __future__ import print_function, division
+
+import time
+import argparse
+
+import numpy as np
+
+from photutils import CircularAperture, EllipticalAperture, \
+                      aperture_photometry, aperture_photometry_map
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("-s", "--size", dest="size", type=int, default=2000,
+                    help="Size of the (square) image in pixels.")
+parser.add_argument("-t", "--tile", dest="tile", type=int, default=1024,
+                    help="Size of the tiles in pixels.")
+parser.add_argument("-N", "--nobj", dest="nobj", type=int, default=10000,
+                    help="Number of positions for aperture_photometry.")
+parser.add_argument("-n", "--iter", dest="niter", type=int, default=3,
+                    help="Number of repetitions of each measurement.")
+args = parser.parse_args()
+
+
+def best_time(func, niter):
+    times = []
+    for i in range(niter):
+        t0 = time.time()
+        func()
+        times.append(time.time() - t0)
+    return min(times)
+
+
+rng = np.random.RandomState(0)
+data = rng.uniform(0., 1., (args.size, args.size))
+xc = rng.randint(0, args.size, args.nobj).astype(float)
+yc = rng.randint(0, args.size, args.nobj).astype(float)
+
+print("=" * 79)
+print("Flux map of a {0}x{0} image, method='exact', time per position "
+      "(microseconds)".format(args.size))
+print("%10s %6s %12s %12s %12s %12s" % ("aperture", "size", "photometry",
+                                        "direct", "fft", "max abs diff"))
+print("-" * 79)
+
+npix = args.size * args.size
+for r in [1., 3., 5., 10., 30.]:
+    for name, aperture in [('circ', CircularAperture(r)),
+                           ('elli', EllipticalAperture(r, 0.5 * r, 0.5))]:
+        t_phot = best_time(lambda: aperture_photometry(data, xc, yc, aperture,
+                                                       cache=False),
+                           args.niter)
+        times = {}
+        maps = {}
+        for convolution in ['direct', 'fft']:
+            def run():
+                maps[convolution] = aperture_photometry_map(
+                    data, aperture, convolution=convolution,
+                    tile_size=args.tile)
+            times[convolution] = best_time(run, args.niter)
+        diff = np.max(np.abs(maps['fft'] - maps['direct']))
+        print("%10s %6.0f %12.4f %12.4f %12.4f %12.2e" %
+              (name, r, t_phot / args.nobj * 1.e6,
+               times['direct'] / npix * 1.e6, times['fft'] / npix * 1.e6,
+               diff))
+
+print("-" * 79)
@@ -0,0 +1,80 @@
+"""Benchmark photometry of a memory-mapped image, read tile by tile.
+
+Writes a float32 image to a temporary file, and compares the time and the
+peak resident memory of ``aperture_photometry`` on the memory-mapped
+image, with tiles (``tile_size``, the default for memory-mapped images)
+and without (``tile_size=0``, which converts the whole image). Each case
+runs in its own process so that the peak memory is its own.
+"""
+
+from __future__ import print_function, division
+
+import os
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import multiprocessing
+
+import numpy as np
+
+from photutils import CircularAperture, aperture_photometry
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("-N", "--nobj", dest="nobj", type=int, default=100000,
+                    help="Number of objects.")
+parser.add_argument("-s", "--size", dest="size", type=int, default=10000,
+                    help="Size of the (square) image in pixels.")
+parser.add_argument("-t", "--tile-size", dest="tile_size", type=int,
+                    default=1024, help="Size of the tiles in pixels.")
+args = parser.parse_args()
+
+
+def run(filename, tile_size, error, queue):
+    data = np.memmap(filename, dtype=np.float32, mode='r',
+                     shape=(args.size, args.size))
+    rng = np.random.RandomState(1)
+    xc = rng.uniform(0., args.size, args.nobj)
+    yc = rng.uniform(0., args.size, args.nobj)
+    t0 = time.time()
+    aperture_photometry(data, xc, yc, CircularAperture(4.), error=error,
+                        tile_size=tile_size)
+    elapsed = time.time() - t0
+    # Maximum resident set size, in kB on Linux.
+    queue.put((elapsed,
+               resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.))
+
+
+tmpdir = tempfile.mkdtemp()
+try:
+    filename = os.path.join(tmpdir, 'image.dat')
+    image = np.memmap(filename, dtype=np.float32, mode='w+',
+                      shape=(args.size, args.size))
+    rng = np.random.RandomState(0)
+    for start in range(0, args.size, 1000):
+        rows = image[start:start + 1000]
+        rows[:] = rng.uniform(0., 1., rows.shape)
+    image.flush()
+    del image
+
+    print("=" * 59)
+    print("{0} objects on a {1}x{1} float32 memory-mapped image"
+          .format(args.nobj, args.size))
+    print("%10s %10s %12s %16s" % ("tile_size", "error", "time (s)",
+                                   "peak RSS (MB)"))
+    print("-" * 59)
+    for tile_size in [0, args.tile_size]:
+        for error in [None, 1.]:
+            queue = multiprocessing.Queue()
+            process = multiprocessing.Process(
+                target=run, args=(filename, tile_size, error, queue))
+            process.start()
+            elapsed, peak = queue.get()
+            process.join()
+            print("%10d %10s %12.2f %16.1f" %
+                  (tile_size, 'no' if error is None else 'scalar', elapsed,
+                   peak))
+    print("-" * 59)
+finally:
+    shutil.rmtree(tmpdir)
@@ -0,0 +1,113 @@
+"""Benchmark the exact circular overlap kernel per boundary pixel.
+
+Compares the cost of evaluating the boundary pixels of a circle through the
+Python-level ``overlap_single_exact`` wrapper (one Python call per pixel)
+with the cost of the same pixels inside ``circular_overlap_grid``, where
+they are evaluated by the C-level kernel without the GIL. Both columns use
+the current C kernel, so their ratio is the overhead of a Python call per
+pixel, not the gain over the previous implementation (in which the grid
+also made Python-level calls of the helper functions for each pixel).
+
+To compare with the previous implementation, build it as an importable
+module (e.g., ``circular_overlap`` from an older checkout, renamed) and
+give its name with ``--baseline``; its ``circular_overlap_grid`` is then
+timed on the same grids.
+"""
+
+from __future__ import print_function, division
+
+import time
+import argparse
+import importlib
+
+import numpy as np
+
+from photutils.circular_overlap import circular_overlap_grid, \
+                                       overlap_single_exact
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("-r", "--radii", dest="radii", type=float, nargs='+',
+                    default=[3., 10., 30., 100.],
+                    help="Circle radii (in pixels) to benchmark.")
+parser.add_argument("-n", "--iter", dest="niter", type=int, default=5,
+                    help="Number of repetitions of each measurement.")
+parser.add_argument("--baseline", dest="baseline", default=None,
+                    help="Name of a module with the circular_overlap_grid "
+                         "function of the previous implementation.")
+args = parser.parse_args()
+
+baseline_grid = None
+if args.baseline is not None:
+    baseline_grid = importlib.import_module(args.baseline) \
+        .circular_overlap_grid
+
+
+def boundary_pixels(r, xmin, ymin, n):
+    """Return the lower-left corners of the pixels that need an exact
+    overlap calculation (those with centers within a pixel radius of the
+    circle edge), using the same criterion as circular_overlap_grid."""
+    centers = np.arange(n) + 0.5
+    x = xmin + centers
+    y = ymin + centers
+    xx, yy = np.meshgrid(x, y)
+    d = np.sqrt(xx * xx + yy * yy)
+    pixrad = 0.5 * np.sqrt(2.)
+    sel = (d >= r - pixrad) & (d < r + pixrad)
+    return xx[sel] - 0.5, yy[sel] - 0.5
+
+
+def best_time(func, niter):
+    times = []
+    for i in range(niter):
+        t0 = time.time()
+        func()
+        times.append(time.time() - t0)
+    return min(times)
+
+
+print("=" * 79)
+print("Exact circular overlap, time per boundary pixel (microseconds)")
+if baseline_grid is None:
+    print("The speedup is that of the grid over a Python call per pixel of")
+    print("the same C kernel; use --baseline for the previous implementation.")
+    print("%10s %12s %15s %15s %10s" % ("radius", "n_boundary",
+                                        "python calls", "C kernel",
+                                        "speedup"))
+else:
+    print("The speedup is that of the grid over the baseline grid.")
+    print("%10s %12s %15s %15s %10s" % ("radius", "n_boundary",
+                                        "baseline grid", "C kernel",
+                                        "speedup"))
+print("-" * 79)
+
+for r in args.radii:
+
+    # Grid large enough to enclose the circle, offset from the pixel grid.
+    n = int(2 * r + 3)
+    xmin = ymin = -0.5 * n + 0.3
+    xmax = ymax = xmin + n
+
+    x0, y0 = boundary_pixels(r, xmin, ymin, n)
+    nbound = len(x0)
+
+    def python_calls():
+        for i in range(nbound):
+            overlap_single_exact(x0[i], y0[i], x0[i] + 1., y0[i] + 1., r)
+
+    def c_kernel():
+        circular_overlap_grid(xmin, xmax, ymin, ymax, n, n, r, 1, 1)
+
+    def baseline():
+        baseline_grid(xmin, xmax, ymin, ymax, n, n, r, 1, 1)
+
+    t_py = best_time(python_calls if baseline_grid is None else baseline,
+                     args.niter)
+    t_c = best_time(c_kernel, args.niter)
+
+    # The grid times also include the interior and exterior pixels, so the
+    # per-boundary-pixel figures of the grids are upper limits.
+    print("%10.1f %12d %15.4f %15.4f %9.1fx" %
+          (r, nbound, t_py / nbound * 1.e6, t_c / nbound * 1.e6,
+           t_py / t_c))
+
+print("-" * 79)
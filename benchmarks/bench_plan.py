@@ -0,0 +1,76 @@
+"""Benchmark forced photometry of many images with a `PhotometryPlan`.
+
+Compares the time per image of ``aperture_photometry`` with that of
+``PhotometryPlan.apply``, for the same objects and apertures on images of
+the same shape, and reports the time to build the plan.
+"""
+
+from __future__ import print_function, division
+
+import time
+import argparse
+
+import numpy as np
+
+from photutils import CircularAperture, CircularAnnulus, \
+                      EllipticalAperture, PhotometryPlan, aperture_photometry
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("-N", "--nobj", dest="nobj", type=int, default=10000,
+                    help="Number of objects.")
+parser.add_argument("-s", "--size", dest="size", type=int, default=2000,
+                    help="Size of the (square) images in pixels.")
+parser.add_argument("-n", "--iter", dest="niter", type=int, default=3,
+                    help="Number of repetitions of each measurement.")
+args = parser.parse_args()
+
+
+def best_time(func, niter):
+    times = []
+    for i in range(niter):
+        t0 = time.time()
+        func()
+        times.append(time.time() - t0)
+    return min(times)
+
+
+rng = np.random.RandomState(0)
+data = rng.uniform(0., 1., (args.size, args.size))
+error = rng.uniform(0.5, 1., (args.size, args.size))
+xc = rng.uniform(0., args.size, args.nobj)
+yc = rng.uniform(0., args.size, args.nobj)
+
+print("=" * 79)
+print("{0} objects on {1}x{1} images, time per image (ms)"
+      .format(args.nobj, args.size))
+print("%10s %8s %6s %10s %10s %10s %8s %10s" %
+      ("aperture", "method", "error", "build", "photometry", "plan",
+       "speedup", "max diff"))
+print("-" * 79)
+
+for name, aperture in [('circ', CircularAperture(4.)),
+                       ('circ_ann', CircularAnnulus(6., 10.)),
+                       ('elli', EllipticalAperture(6., 3., 0.5))]:
+    for method in ['center', 'exact']:
+        t_build = best_time(lambda: PhotometryPlan(data.shape, xc, yc,
+                                                   aperture, method=method),
+                            args.niter)
+        plan = PhotometryPlan(data.shape, xc, yc, aperture, method=method)
+        for err in [None, error]:
+
+            def photometry():
+                return aperture_photometry(data, xc, yc, aperture,
+                                           error=err, method=method,
+                                           cache=False)
+
+            t_phot = best_time(photometry, args.niter)
+            t_plan = best_time(lambda: plan.apply(data, error=err),
+                               args.niter)
+            diff = np.max(np.abs(np.subtract(plan.apply(data, error=err),
+                                             photometry())))
+            print("%10s %8s %6s %10.2f %10.2f %10.2f %7.1fx %10.2e" %
+                  (name, method, 'yes' if err is not None else 'no',
+                   t_build * 1.e3, t_phot * 1.e3, t_plan * 1.e3,
+                   t_phot / t_plan, diff))
+
+print("-" * 79)
@@ -0,0 +1,80 @@
+"""Benchmark the prefix-sum photometry of large apertures.
+
+Compares ``aperture_photometry`` with the 'center' and 'exact' methods,
+with and without ``prefix_sums`` (which sums each row of an aperture, or
+its pixels entirely within the aperture, from cumulative sums of the data
+computed once beforehand) for apertures of increasing size, and reports
+the largest relative difference of the fluxes.
+"""
+
+from __future__ import print_function, division
+
+import time
+import argparse
+
+import numpy as np
+
+from photutils import CircularAperture, CircularAnnulus, \
+                      EllipticalAperture, EllipticalAnnulus, PrefixSums, \
+                      aperture_photometry
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("-N", "--nobj", dest="nobj", type=int, default=100,
+                    help="Number of objects.")
+parser.add_argument("-s", "--size", dest="size", type=int, default=1000,
+                    help="Size of the (square) image in pixels.")
+parser.add_argument("-n", "--iter", dest="niter", type=int, default=3,
+                    help="Number of repetitions of each measurement.")
+args = parser.parse_args()
+
+
+def best_time(func, niter):
+    times = []
+    for i in range(niter):
+        t0 = time.time()
+        func()
+        times.append(time.time() - t0)
+    return min(times)
+
+
+rng = np.random.RandomState(0)
+data = rng.uniform(0., 1., (args.size, args.size))
+error = rng.uniform(0.5, 1., (args.size, args.size))
+xc = rng.uniform(0.25 * args.size, 0.75 * args.size, args.nobj)
+yc = rng.uniform(0.25 * args.size, 0.75 * args.size, args.nobj)
+
+t_setup = best_time(lambda: PrefixSums(data, error), args.niter)
+prefix_sums = PrefixSums(data, error)
+
+print("=" * 79)
+print("Computing the cumulative sums of data and variance: {0:.3f} ms"
+      .format(t_setup * 1.e3))
+print("{0} objects on a {1}x{1} image, with error, time (ms)"
+      .format(args.nobj, args.size))
+print("%10s %6s %6s %12s %12s %10s %12s" % ("aperture", "method", "size",
+                                            "pixel sums", "prefix sums",
+                                            "speedup", "max rel diff"))
+print("-" * 79)
+
+for method in ['center', 'exact']:
+    for r in [5., 20., 50., 100.]:
+        for name, aperture in [('circ', CircularAperture(r)),
+                               ('circ_ann', CircularAnnulus(r, 1.5 * r)),
+                               ('elli', EllipticalAperture(r, 0.4 * r, 0.5)),
+                               ('elli_ann', EllipticalAnnulus(r, 1.5 * r,
+                                                              0.6 * r, 0.5))]:
+
+            def run(prefix_sums):
+                return aperture_photometry(data, xc, yc, aperture,
+                                           error=error, method=method,
+                                           cache=False,
+                                           prefix_sums=prefix_sums)
+
+            t_pixels = best_time(lambda: run(False), args.niter)
+            t_prefix = best_time(lambda: run(prefix_sums), args.niter)
+            diff = np.max(np.abs(run(prefix_sums)[0] / run(False)[0] - 1.))
+            print("%10s %6s %6.0f %12.3f %12.3f %9.1fx %12.2e" %
+                  (name, method, r, t_pixels * 1.e3, t_prefix * 1.e3,
+                   t_pixels / t_prefix, diff))
+
+print("-" * 79)
@@ -0,0 +1,66 @@
+"""Benchmark the spatial sorting of objects in ``aperture_photometry``.
+
+Times ``aperture_photometry`` on a large image with objects in random
+order, with ``sort_objects=False`` and ``sort_objects=True`` (the default
+for images of this size). The defaults (a 20000x20000 image and 10^6
+objects) need about 4 GB of memory.
+"""
+
+from __future__ import print_function, division
+
+import time
+import argparse
+
+import numpy as np
+
+from photutils import CircularAperture, EllipticalAperture, \
+                      aperture_photometry
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("-N", "--nobj", dest="nobj", type=int, default=10 ** 6,
+                    help="Number of objects.")
+parser.add_argument("-s", "--size", dest="size", type=int, default=20000,
+                    help="Size of the (square) image in pixels.")
+parser.add_argument("-n", "--iter", dest="niter", type=int, default=3,
+                    help="Number of repetitions of each measurement.")
+args = parser.parse_args()
+
+
+def best_time(func, niter):
+    times = []
+    for i in range(niter):
+        t0 = time.time()
+        func()
+        times.append(time.time() - t0)
+    return min(times)
+
+
+rng = np.random.RandomState(0)
+data = np.empty((args.size, args.size))
+for start in range(0, args.size, 1000):
+    rows = data[start:start + 1000]
+    rows[:] = rng.uniform(0., 1., rows.shape)
+xc = rng.uniform(0., args.size, args.nobj)
+yc = rng.uniform(0., args.size, args.nobj)
+
+print("=" * 59)
+print("{0} objects in random order on a {1}x{1} image, time (s)"
+      .format(args.nobj, args.size))
+print("%10s %8s %12s %12s %8s" % ("aperture", "method", "unsorted",
+                                  "sorted", "speedup"))
+print("-" * 59)
+
+for name, aperture in [('circ', CircularAperture(4.)),
+                       ('elli', EllipticalAperture(6., 3., 0.5))]:
+    for method in ['center', 'exact']:
+        times = []
+        for sort_objects in [False, True]:
+            times.append(best_time(
+                lambda: aperture_photometry(data, xc, yc, aperture,
+                                            method=method, cache=False,
+                                            sort_objects=sort_objects),
+                args.niter))
+        print("%10s %8s %12.3f %12.3f %7.2fx" %
+              (name, method, times[0], times[1], times[0] / times[1]))
+
+print("-" * 59)
@@ -0,0 +1,111 @@
+"""Benchmark the memory used by the 'subpixel' method of elliptical
+apertures.
+
+Compares ``EllipticalAperture.encloses`` and ``EllipticalAnnulus.encloses``
+(which sample the subpixels one row at a time) with the previous
+implementation, which built (ny * subpixels, nx * subpixels) coordinate
+arrays and temporaries before downsampling. Reports the time and the peak
+memory of a single call (measured in a separate process, as the growth of
+its maximum resident set size), and whether the results are identical.
+"""
+
+from __future__ import print_function, division
+
+import sys
+import math
+import time
+import argparse
+import resource
+import multiprocessing
+
+import numpy as np
+
+from photutils import EllipticalAperture, EllipticalAnnulus
+from photutils.utils.downsample import downsample
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("-p", "--subpixels", dest="subpixels", type=int,
+                    default=10, help="Subsampling factor.")
+parser.add_argument("-n", "--iter", dest="niter", type=int, default=3,
+                    help="Number of repetitions of each measurement.")
+args = parser.parse_args()
+
+
+def meshgrid_encloses(x_min, x_max, y_min, y_max, nx, ny, a_in, b_in, a_out,
+                      b_out, theta, subpixels):
+    """The previous implementation of the 'subpixel' method."""
+    x_size = (x_max - x_min) / (nx * subpixels)
+    y_size = (y_max - y_min) / (ny * subpixels)
+    x_centers = np.arange(x_min + x_size / 2., x_max, x_size)
+    y_centers = np.arange(y_min + y_size / 2., y_max, y_size)
+    xx, yy = np.meshgrid(x_centers, y_centers)
+    numerator1 = xx * math.cos(theta) + yy * math.sin(theta)
+    numerator2 = yy * math.cos(theta) - xx * math.sin(theta)
+    in_aper = ((numerator1 / a_out) ** 2 + (numerator2 / b_out) ** 2) < 1.
+    if a_in != 0 and b_in != 0:
+        in_aper &= ((numerator1 / a_in) ** 2 + (numerator2 / b_in) ** 2) > 1.
+    return downsample(in_aper.astype(float), subpixels)
+
+
+def best_time(func, niter):
+    times = []
+    for i in range(niter):
+        t0 = time.time()
+        func()
+        times.append(time.time() - t0)
+    return min(times)
+
+
+def _measure(func, queue):
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    func()
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on OS X, kilobytes elsewhere.
+    scale = 1024. ** 2 if sys.platform == 'darwin' else 1024.
+    queue.put((after - before) / scale)
+
+
+def peak_memory(func):
+    """Peak memory increase (MB) while running ``func`` in a new process."""
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_measure, args=(func, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+print("=" * 79)
+print("subpixels={0}: time (ms) and peak memory (MB) of a single call"
+      .format(args.subpixels))
+print("%10s %6s %10s %10s %10s %10s %10s" %
+      ("aperture", "a", "old time", "new time", "old MB", "new MB",
+       "identical"))
+print("-" * 79)
+
+for a in [25., 50., 100., 200.]:
+    for name, aperture, axes in [
+            ('elli', EllipticalAperture(a, 0.5 * a, 0.5),
+             (0., 0., a, 0.5 * a)),
+            ('elli_ann', EllipticalAnnulus(0.5 * a, a, 0.5 * a, 0.5),
+             (0.5 * a, 0.25 * a, a, 0.5 * a))]:
+
+        x_min, x_max, y_min, y_max = aperture.extent()
+        nx = int(x_max - x_min) + 2
+        ny = int(y_max - y_min) + 2
+        grid = (x_min - 0.7, x_min - 0.7 + nx, y_min - 0.3, y_min - 0.3 + ny,
+                nx, ny)
+
+        def old():
+            return meshgrid_encloses(*(grid + axes + (0.5, args.subpixels)))
+
+        def new():
+            return aperture.encloses(*grid, method='subpixel',
+                                     subpixels=args.subpixels)
+
+        print("%10s %6.0f %10.2f %10.2f %10.1f %10.1f %10s" %
+              (name, a, best_time(old, args.niter) * 1.e3,
+               best_time(new, args.niter) * 1.e3, peak_memory(old),
+               peak_memory(new), np.array_equal(old(), new())))
+
+print("-" * 79)
@@ -0,0 +1,87 @@
+"""Benchmark the scaling of aperture_photometry with the number of threads.
+
+Runs the same photometry with ``n_jobs`` = 1, 2, 4, ... up to the number of
+CPUs (or the given maximum) and reports the throughput in objects per
+second, the speedup relative to a single thread, and whether the results
+are identical to the single-threaded ones.
+"""
+
+from __future__ import print_function, division
+
+import time
+import argparse
+import multiprocessing
+
+import numpy as np
+
+from photutils import CircularAperture, EllipticalAperture, \
+                      aperture_photometry
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("-N", "--nobj", dest="nobj", type=int, default=100000,
+                    help="Number of objects.")
+parser.add_argument("-s", "--size", dest="size", type=int, default=2000,
+                    help="Size of the (square) image in pixels.")
+parser.add_argument("-j", "--max-jobs", dest="max_jobs", type=int,
+                    default=multiprocessing.cpu_count(),
+                    help="Maximum number of threads.")
+parser.add_argument("-n", "--iter", dest="niter", type=int, default=3,
+                    help="Number of repetitions of each measurement.")
+args = parser.parse_args()
+
+
+def best_time(func, niter):
+    times = []
+    for i in range(niter):
+        t0 = time.time()
+        func()
+        times.append(time.time() - t0)
+    return min(times)
+
+
+rng = np.random.RandomState(0)
+data = rng.uniform(0., 1., (args.size, args.size))
+error = rng.uniform(0.5, 1., (args.size, args.size))
+xc = rng.uniform(0., args.size, args.nobj)
+yc = rng.uniform(0., args.size, args.nobj)
+
+n_jobs_list = [1]
+while n_jobs_list[-1] * 2 <= args.max_jobs:
+    n_jobs_list.append(n_jobs_list[-1] * 2)
+if n_jobs_list[-1] != args.max_jobs:
+    n_jobs_list.append(args.max_jobs)
+
+cases = [('circ', CircularAperture(4.)),
+         ('elli', EllipticalAperture(4., 2., 0.5))]
+
+for name, aperture in cases:
+    for method in ['center', 'subpixel', 'exact']:
+
+        print("=" * 79)
+        print("{0}, method={1}: {2} objects on a {3}x{3} image"
+              .format(name, method, args.nobj, args.size))
+        print("%10s %20s %10s %12s" % ("n_jobs", "objects per second",
+                                       "speedup", "identical"))
+        print("-" * 79)
+
+        reference = aperture_photometry(data, xc, yc, aperture, error=error,
+                                        method=method)
+        t_serial = None
+
+        for n_jobs in n_jobs_list:
+
+            def run():
+                return aperture_photometry(data, xc, yc, aperture,
+                                           error=error, method=method,
+                                           n_jobs=n_jobs)
+
+            t = best_time(run, args.niter)
+            if t_serial is None:
+                t_serial = t
+            result = run()
+            identical = all(np.array_equal(r1, r2)
+                            for r1, r2 in zip(result, reference))
+            print("%10d %20.0f %9.2fx %12s" %
+                  (n_jobs, args.nobj / t, t_serial / t, identical))
+
+print("-" * 79)
@@ -0,0 +1,61 @@
+"""Benchmark the error propagation of ``aperture_photometry``.
+
+Times photometry without error, with ``error`` and ``gain`` arrays, and
+with the equivalent precomputed ``variance`` array, for isolated and for
+overlapping objects (for which the variance image is built once from the
+error and gain).
+"""
+
+from __future__ import print_function, division
+
+import time
+import argparse
+
+import numpy as np
+
+from photutils import CircularAperture, aperture_photometry
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("-s", "--size", dest="size", type=int, default=2000,
+                    help="Size of the (square) image in pixels.")
+parser.add_argument("-n", "--iter", dest="niter", type=int, default=3,
+                    help="Number of repetitions of each measurement.")
+args = parser.parse_args()
+
+
+def best_time(func, niter):
+    times = []
+    for i in range(niter):
+        t0 = time.time()
+        func()
+        times.append(time.time() - t0)
+    return min(times)
+
+
+rng = np.random.RandomState(0)
+data = rng.uniform(0., 1., (args.size, args.size))
+error = rng.uniform(0.5, 1., (args.size, args.size))
+gain = rng.uniform(1., 2., (args.size, args.size))
+variance = error ** 2 + data / gain
+
+print("=" * 70)
+print("{0}x{0} image, time (ms)".format(args.size))
+print("%10s %8s %8s %12s %12s %12s" % ("objects", "radius", "method",
+                                       "no error", "error+gain",
+                                       "variance"))
+print("-" * 70)
+
+for nobj, r in [(10000, 4.), (10000, 30.)]:
+    xc = rng.uniform(0., args.size, nobj)
+    yc = rng.uniform(0., args.size, nobj)
+    aperture = CircularAperture(r)
+    for method in ['center', 'exact']:
+        times = [best_time(lambda: aperture_photometry(
+                     data, xc, yc, aperture, method=method, cache=False,
+                     **kwargs), args.niter)
+                 for kwargs in [{}, dict(error=error, gain=gain),
+                                dict(variance=variance)]]
+        print("%10d %8.1f %8s %12.1f %12.1f %12.1f" %
+              ((nobj, r, method) + tuple(t * 1.e3 for t in times)))
+
+print("-" * 70)
@@ -129,4 +129,7 @@ if not _ASTROPY_SETUP_:
 
     del os, warn, config_dir  # clean up namespace
 
-from .aperture import *
\ No newline at end of file
+from .aperture import *
+from .aperture_parallel import *
+from .aperture_map import *
+from .aperture_stream import *
@@ -4,12 +4,20 @@
 
 import math
 import abc
-import copy
+import time
+import threading
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+from collections import OrderedDict
 
 import numpy as np
 
 __all__ = ["CircularAperture", "CircularAnnulus",
            "EllipticalAperture", "EllipticalAnnulus",
+           "ApertureArray", "CircularApertureArray", "CircularAnnulusArray",
+           "EllipticalApertureArray", "EllipticalAnnulusArray",
+           "FractionCache", "PhotometryProfile", "PrefixSums",
+           "PhotometryPlan",
            "aperture_photometry",
            "aperture_circular", "aperture_elliptical",
            "annulus_circular", "annulus_elliptical"]
@@ -143,17 +151,15 @@ class CircularAnnulus(Aperture):
             return (dist_sq < self.r_out * self.r_out) \
                 & (dist_sq > self.r_in * self.r_in)
         elif method == 'subpixel':
-            from .circular_overlap import circular_overlap_grid
-            return (circular_overlap_grid(x_min, x_max, y_min, y_max, nx, ny,
-                                          self.r_out, 0, subpixels) -
-                    circular_overlap_grid(x_min, x_max, y_min, y_max, nx, ny,
-                                          self.r_in, 0, subpixels))
+            from .circular_overlap import circular_annulus_overlap_grid
+            return circular_annulus_overlap_grid(x_min, x_max, y_min, y_max,
+                                                 nx, ny, self.r_in,
+                                                 self.r_out, 0, subpixels)
         elif method == 'exact':
-            from .circular_overlap import circular_overlap_grid
-            return (circular_overlap_grid(x_min, x_max, y_min, y_max, nx, ny,
-                                          self.r_out, 1, 1) -
-                    circular_overlap_grid(x_min, x_max, y_min, y_max, nx, ny,
-                                          self.r_in, 1, 1))
+            from .circular_overlap import circular_annulus_overlap_grid
+            return circular_annulus_overlap_grid(x_min, x_max, y_min, y_max,
+                                                 nx, ny, self.r_in,
+                                                 self.r_out, 1, 1)
         else:
             raise ValueError('{0} method not supported for aperture class {1}'
                              .format(method, self.__class__.__name__))
@@ -185,8 +191,8 @@ class EllipticalAperture(Aperture):
         self.theta = theta
 
     def extent(self):
-        r = max(self.a, self.b)
-        return (-r, r, -r, r)
+        x_half, y_half = _ellipse_half_widths(self.a, self.b, self.theta)
+        return (-x_half, x_half, -y_half, y_half)
 
 
     def encloses(self, x_min, x_max, y_min, y_max, nx, ny,
@@ -198,22 +204,12 @@ class EllipticalAperture(Aperture):
 
         if method == 'center' or method == 'subpixel':
             if method == 'center': subpixels = 1
-            x_size = (x_max - x_min) / (nx * subpixels)
-            y_size = (y_max - y_min) / (ny * subpixels)
-            x_centers = np.arange(x_min + x_size / 2., x_max, x_size)
-            y_centers = np.arange(y_min + y_size / 2., y_max, y_size)
-            xx, yy = np.meshgrid(x_centers, y_centers)
-            numerator1 = (xx * math.cos(self.theta) +
-                          yy * math.sin(self.theta))
-            numerator2 = (yy * math.cos(self.theta) -
-                          xx * math.sin(self.theta))
-            in_aper = (((numerator1 / self.a) ** 2 +
-                        (numerator2 / self.b) ** 2) < 1.).astype(float)
-            if method == 'center':
-                return in_aper
-            else:
-                from .utils.downsample import downsample
-                return downsample(in_aper, subpixels)
+            # Subpixels are sampled row by row, without (ny * subpixels,
+            # nx * subpixels) temporary arrays.
+            from .aperture_batch import elliptical_sampled_grid
+            return elliptical_sampled_grid(x_min, x_max, y_min, y_max, nx, ny,
+                                           0., 0., self.a, self.b,
+                                           self.theta, subpixels)
 
         elif method == 'exact':
             from .elliptical_exact import elliptical_overlap_grid
@@ -260,8 +256,9 @@ class EllipticalAnnulus(Aperture):
 
 
     def extent(self):
-        r = max(self.a_out, self.b_out)
-        return (-r, r, -r, r)
+        x_half, y_half = _ellipse_half_widths(self.a_out, self.b_out,
+                                              self.theta)
+        return (-x_half, x_half, -y_half, y_half)
 
 
     def encloses(self, x_min, x_max, y_min, y_max, nx, ny,
@@ -273,40 +270,21 @@ class EllipticalAnnulus(Aperture):
 
         if method == 'center' or method == 'subpixel':
             if method == 'center': subpixels = 1
-            x_size = (x_max - x_min) / (nx * subpixels)
-            y_size = (y_max - y_min) / (ny * subpixels)
-            x_centers = np.arange(x_min + x_size / 2., x_max, x_size)
-            y_centers = np.arange(y_min + y_size / 2., y_max, y_size)
-            xx, yy = np.meshgrid(x_centers, y_centers)
-
-            numerator1 = (xx * math.cos(self.theta) +
-                          yy * math.sin(self.theta))
-            numerator2 = (yy * math.cos(self.theta) -
-                          xx * math.sin(self.theta))
-            inside_outer_ellipse = ((numerator1 / self.a_out) ** 2 +
-                                    (numerator2 / self.b_out) ** 2) < 1.
-            if self.a_in == 0 or self.b_in == 0:
-                in_aper = inside_outer_ellipse.astype(float)
-            else:
-                outside_inner_ellipse = ((numerator1 / self.a_in) ** 2 +
-                                         (numerator2 / self.b_in) ** 2) > 1.
-                in_aper = (inside_outer_ellipse &
-                           outside_inner_ellipse).astype(float)
-
-            if method == 'center':
-                return in_aper
-            else:
-                from .utils.downsample import downsample
-                return downsample(in_aper, subpixels)
+            # Subpixels are sampled row by row, without (ny * subpixels,
+            # nx * subpixels) temporary arrays.
+            from .aperture_batch import elliptical_sampled_grid
+            return elliptical_sampled_grid(x_min, x_max, y_min, y_max, nx, ny,
+                                           self.a_in, self.b_in, self.a_out,
+                                           self.b_out, self.theta, subpixels)
 
         elif method == 'exact':
-            from .elliptical_exact import elliptical_overlap_grid
+            from .elliptical_exact import elliptical_annulus_overlap_grid
             x_edges = np.linspace(x_min, x_max, nx + 1)
             y_edges = np.linspace(y_min, y_max, ny + 1)
-            return (elliptical_overlap_grid(x_edges, y_edges, self.a_out,
-                                            self.b_out, self.theta) -
-                    elliptical_overlap_grid(x_edges, y_edges, self.a_in,
-                                            self.b_in, self.theta))
+            return elliptical_annulus_overlap_grid(x_edges, y_edges,
+                                                   self.a_in, self.b_in,
+                                                   self.a_out, self.b_out,
+                                                   self.theta)
         else:
             raise ValueError('{0} method not supported for aperture class {1}'
                              .format(method, self.__class__.__name__))
@@ -316,9 +294,898 @@ class EllipticalAnnulus(Aperture):
         return math.pi * (self.a_out * self.b_out - self.a_in * self.b_in)
 
 
+def _ellipse_half_widths(a, b, theta):
+    """Half-widths in x and y of the bounding box of an ellipse with
+    semimajor axis a, semiminor axis b and position angle theta."""
+    cos_theta = math.cos(theta)
+    sin_theta = math.sin(theta)
+    return (math.sqrt((a * cos_theta) ** 2 + (b * sin_theta) ** 2),
+            math.sqrt((a * sin_theta) ** 2 + (b * cos_theta) ** 2))
+
+
+class ApertureArray(object):
+    """An abstract base class for arrays of apertures of the same class.
+
+    The apertures are stored as an array of their parameters, with a
+    trailing dimension for the parameters, rather than as an object array
+    of `Aperture` instances. `aperture_photometry` uses the parameters
+    directly, and indexing with a single element returns the corresponding
+    `Aperture` instance.
+
+    Derived classes define ``aperture_class`` (the `Aperture` subclass
+    whose constructor takes the parameters in the same order) and the
+    vectorized methods ``extents`` and ``areas``.
+    """
+
+    __metaclass__ = abc.ABCMeta
+
+    __slots__ = ('params',)
+
+    aperture_class = None
+
+    def __init__(self, *params):
+        params = np.broadcast_arrays(*[np.asarray(value, dtype=np.float64)
+                                       for value in params])
+        self.params = np.empty(params[0].shape + (len(params),),
+                               dtype=np.float64)
+        for k, value in enumerate(params):
+            self.params[..., k] = value
+        self._check()
+
+    @classmethod
+    def _from_params(cls, params):
+        """Array of apertures of the given parameter array, not checked."""
+        result = object.__new__(cls)
+        result.params = params
+        return result
+
+    @property
+    def shape(self):
+        """Shape of the array of apertures."""
+        return self.params.shape[:-1]
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    def __len__(self):
+        if not self.shape:
+            raise TypeError('len() of unsized object')
+        return self.shape[0]
+
+    def __getitem__(self, index):
+        if not isinstance(index, tuple):
+            index = (index,)
+        if any(item is Ellipsis or item is None for item in index):
+            # Index the array of the aperture numbers, so that the trailing
+            # dimension of the parameters is not affected.
+            numbers = np.arange(self.size).reshape(self.shape)[index]
+            params = self.params.reshape(-1, self.params.shape[-1])[numbers]
+        else:
+            params = self.params[index + (slice(None),)]
+        if params.ndim == 1:
+            return self.aperture_class(*params)
+        return self._from_params(params)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getstate__(self):
+        return (self.params,)
+
+    def __setstate__(self, state):
+        self.params, = state
+
+    def __repr__(self):
+        return '<{0} of shape {1}>'.format(self.__class__.__name__,
+                                           self.shape)
+
+    def atleast_2d(self):
+        """This array, with leading dimensions of length 1 added up to 2
+        dimensions (as `numpy.atleast_2d`)."""
+        shape = (1,) * (2 - self.ndim) + self.shape
+        return self._from_params(self.params.reshape(shape +
+                                                     self.params.shape[-1:]))
+
+    def broadcast_to(self, shape):
+        """This array broadcast to ``shape`` (a read-only view)."""
+        shape = tuple(shape)
+        return self._from_params(np.broadcast_to(
+            self.params, shape + self.params.shape[-1:]))
+
+    def to_objects(self):
+        """Object array of the `Aperture` instances."""
+        result = np.empty(self.shape, dtype=object)
+        for index in np.ndindex(*self.shape):
+            result[index] = self[index]
+        return result
+
+    def _check(self):
+        """Check the values of the parameters."""
+        pass
+
+    @abc.abstractmethod
+    def extents(self):
+        """Extents of the apertures relative to object center, as an array
+        of shape ``shape + (4,)`` (see `Aperture.extent`)."""
+        return
+
+    @abc.abstractmethod
+    def areas(self):
+        """Areas of the apertures."""
+        return
+
+    def _engine_params(self, nparams):
+        """Parameters in the layout of `photutils.aperture_batch`, as an
+        array of shape ``shape + (nparams,)``."""
+        result = np.zeros(self.shape + (nparams,), dtype=np.float64)
+        result[..., :self.params.shape[-1]] = self.params
+        return result
+
+
+class CircularApertureArray(ApertureArray):
+    """An array of circular apertures.
+
+    Parameters
+    ----------
+    r : float or array_like
+        The radii of the apertures.
+    """
+
+    __slots__ = ()
+
+    aperture_class = CircularAperture
+
+    def _check(self):
+        if not np.all(self.params[..., 0] >= 0.):
+            raise ValueError('r must be non-negative')
+
+    def extents(self):
+        r = self.params[..., 0]
+        return np.stack([-r, r, -r, r], axis=-1)
+
+    def areas(self):
+        return math.pi * self.params[..., 0] ** 2
+
+
+class CircularAnnulusArray(ApertureArray):
+    """An array of circular annulus apertures.
+
+    Parameters
+    ----------
+    r_in, r_out : float or array_like
+        The inner and outer radii of the annuli.
+    """
+
+    __slots__ = ()
+
+    aperture_class = CircularAnnulus
+
+    def _check(self):
+        r_in, r_out = self.params[..., 0], self.params[..., 1]
+        if not np.all(r_out > r_in):
+            raise ValueError('r_out must be greater than r_in')
+        if not np.all(r_in >= 0.):
+            raise ValueError('r_in must be non-negative')
+
+    def extents(self):
+        r = self.params[..., 1]
+        return np.stack([-r, r, -r, r], axis=-1)
+
+    def areas(self):
+        return math.pi * (self.params[..., 1] ** 2 - self.params[..., 0] ** 2)
+
+
+class EllipticalApertureArray(ApertureArray):
+    """An array of elliptical apertures.
+
+    Parameters
+    ----------
+    a, b, theta : float or array_like
+        The semimajor and semiminor axes, and the position angles of the
+        semimajor axes in radians (counterclockwise).
+    """
+
+    __slots__ = ()
+
+    aperture_class = EllipticalAperture
+
+    def _check(self):
+        if np.any(self.params[..., :2] < 0):
+            raise ValueError('a and b must be nonnegative.')
+
+    def extents(self):
+        x_half, y_half = _ellipse_half_widths_array(self.params[..., 0],
+                                                    self.params[..., 1],
+                                                    self.params[..., 2])
+        return np.stack([-x_half, x_half, -y_half, y_half], axis=-1)
+
+    def areas(self):
+        return math.pi * self.params[..., 0] * self.params[..., 1]
+
+
+class EllipticalAnnulusArray(ApertureArray):
+    """An array of elliptical annulus apertures.
+
+    Parameters
+    ----------
+    a_in, a_out, b_out, theta : float or array_like
+        The inner and outer semimajor axes, the outer semiminor axes, and
+        the position angles of the semimajor axes in radians
+        (counterclockwise). See `EllipticalAnnulus`.
+    """
+
+    __slots__ = ()
+
+    aperture_class = EllipticalAnnulus
+
+    def _check(self):
+        a_in, a_out, b_out = [self.params[..., k] for k in range(3)]
+        if not np.all(a_out > a_in):
+            raise ValueError('a_out must be greater than a_in')
+        if np.any(a_in < 0) or np.any(b_out < 0):
+            raise ValueError('a_in and b_out must be non-negative')
+
+    def extents(self):
+        x_half, y_half = _ellipse_half_widths_array(self.params[..., 1],
+                                                    self.params[..., 2],
+                                                    self.params[..., 3])
+        return np.stack([-x_half, x_half, -y_half, y_half], axis=-1)
+
+    def areas(self):
+        a_in, a_out, b_out = [self.params[..., k] for k in range(3)]
+        return math.pi * (a_out * b_out - a_in * (a_in * b_out / a_out))
+
+    def _engine_params(self, nparams):
+        a_in, a_out, b_out, theta = [self.params[..., k] for k in range(4)]
+        result = np.zeros(self.shape + (nparams,), dtype=np.float64)
+        result[..., 0] = a_in
+        result[..., 1] = a_in * b_out / a_out
+        result[..., 2] = a_out
+        result[..., 3] = b_out
+        result[..., 4] = theta
+        return result
+
+
+def _ellipse_half_widths_array(a, b, theta):
+    """Same as `_ellipse_half_widths` for arrays."""
+    cos_theta = np.cos(theta)
+    sin_theta = np.sin(theta)
+    return (np.sqrt((a * cos_theta) ** 2 + (b * sin_theta) ** 2),
+            np.sqrt((a * sin_theta) ** 2 + (b * cos_theta) ** 2))
+
+
+class FractionCache(object):
+    """A least-recently-used cache of the arrays giving the fraction of
+    each pixel covered by an aperture.
+
+    The fraction array of one of the built-in apertures depends only on
+    the aperture parameters, the method, the number of subpixels and the
+    position of the object center relative to the pixel grid. When the
+    same apertures are used at positions that repeat this offset (e.g.,
+    for gridded or forced photometry), `aperture_photometry` reuses the
+    cached arrays instead of recomputing them. Positions are compared
+    exactly, so the results are identical to those computed without the
+    cache. A cache can be shared by calls running in several threads.
+
+    Parameters
+    ----------
+    max_bytes : int, optional
+        Maximum total size of the cached arrays, in bytes. The least
+        recently used arrays are discarded beyond this size. Setting
+        it to 0 disables the cache.
+    max_pixels : int or `None`, optional
+        Fraction arrays with more pixels than this are not cached (no
+        limit if `None`).
+
+    Attributes
+    ----------
+    hits, misses : int
+        Number of fraction arrays that were (or were not) found in the
+        cache.
+    nbytes : int
+        Total size of the cached arrays, in bytes.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 ** 2, max_pixels=250000):
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        self._arrays = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._arrays)
+
+    def __contains__(self, key):
+        return key in self._arrays
+
+    def clear(self):
+        """Remove all arrays from the cache and reset the counters."""
+        with self._lock:
+            self._arrays.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def get(self, key):
+        """Return the array stored under ``key`` (marking it as the most
+        recently used), or `None`."""
+        with self._lock:
+            array = self._arrays.pop(key, None)
+            if array is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._arrays[key] = array
+        return array
+
+    def put(self, key, array):
+        """Store ``array`` under ``key``, discarding the least recently
+        used arrays if needed to stay within ``max_bytes``."""
+        if ((self.max_pixels is not None and array.size > self.max_pixels)
+                or array.nbytes > self.max_bytes):
+            return
+        with self._lock:
+            old = self._arrays.pop(key, None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            self._arrays[key] = array
+            self.nbytes += array.nbytes
+            while self.nbytes > self.max_bytes:
+                self.nbytes -= self._arrays.popitem(last=False)[1].nbytes
+
+
+class PhotometryProfile(object):
+    """Time spent in each stage of `aperture_photometry`, and number of
+    pixels whose covered fraction was evaluated.
+
+    An instance given as the ``profile`` argument of `aperture_photometry`
+    accumulates the wall-clock time of each stage of all the calls it is
+    given to (including those made internally for each tile or frame).
+    Without ``profile``, nothing is timed or counted.
+
+    The stages are:
+
+    'setup'
+        Checks of the arguments, and ordering of the objects.
+    'read'
+        Reading the windows of lazily read images (see ``tile_size``).
+    'extent'
+        Extents of the apertures and sub-array bounds of the objects.
+    'cutout'
+        Slicing of the sub-arrays of each object (Python loop).
+    'mask'
+        Mirroring of the masked pixels (Python loop).
+    'encloses'
+        Fractions of the pixels covered by the apertures: the `encloses`
+        method of the apertures in the Python loop, the cached or
+        precomputed fraction arrays of the compiled engine, and the
+        `PhotometryPlan` of 3-d arrays.
+    'sum'
+        Weighted sums of the data (Python loop, and `PhotometryPlan`).
+    'errors'
+        Error propagation, including the variance of the pixels.
+    'engine'
+        The compiled engine, which computes the fractions and sums the
+        data and variance of each aperture in a single pass.
+
+    Attributes
+    ----------
+    calls : int
+        Number of calls of `aperture_photometry`.
+    times : `~collections.OrderedDict`
+        Time spent in each stage, in seconds.
+    pixels : `~collections.OrderedDict`
+        Number of pixels of the sub-arrays of the apertures that were
+        'full' (fraction of 1), 'empty' (0) or on the 'boundary' of an
+        aperture, counted by the Python loop and `batch_photometry` (the
+        concentric circle, ``phase_tolerance`` and ``prefix_sums`` modes
+        do not evaluate the pixels one aperture at a time).
+    paths : `~collections.OrderedDict`
+        Number of objects measured by each path: 'batch', 'growth',
+        'phase' and 'prefix' for the compiled engine (see
+        `aperture_photometry`), 'loop' for the Python loop and 'plan' for
+        3-d arrays.
+    """
+
+    stages = ('setup', 'read', 'extent', 'cutout', 'mask', 'encloses',
+              'sum', 'errors', 'engine')
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """Reset the times and counters."""
+        self.calls = 0
+        self.times = OrderedDict((stage, 0.) for stage in self.stages)
+        self.pixels = OrderedDict([('full', 0), ('empty', 0),
+                                   ('boundary', 0)])
+        self.paths = OrderedDict()
+
+    def lap(self, stage, start):
+        """Add the time since ``start`` (a value of `_clock`) to ``stage``,
+        and return the current time."""
+        now = _clock()
+        self.times[stage] += now - start
+        return now
+
+    def add_path(self, path, n_obj):
+        self.paths[path] = self.paths.get(path, 0) + n_obj
+
+    def add_pixels(self, full, empty, boundary):
+        self.pixels['full'] += int(full)
+        self.pixels['empty'] += int(empty)
+        self.pixels['boundary'] += int(boundary)
+
+    def add_fraction(self, fraction):
+        """Count the pixels of a fraction array."""
+        full = np.count_nonzero(fraction == 1.)
+        empty = np.count_nonzero(fraction == 0.)
+        self.add_pixels(full, empty, np.size(fraction) - full - empty)
+
+    def report(self):
+        """The times and counters, as a dictionary with the items 'calls',
+        'total' (time of all stages), 'stages' (the time and fraction of
+        the total of each stage), 'pixels' and 'paths'."""
+        total = sum(self.times.values())
+        stages = OrderedDict(
+            (stage, OrderedDict([('time', seconds),
+                                 ('fraction', seconds / total if total > 0.
+                                  else 0.)]))
+            for stage, seconds in self.times.items())
+        return OrderedDict([('calls', self.calls), ('total', total),
+                            ('stages', stages),
+                            ('pixels', OrderedDict(self.pixels)),
+                            ('paths', OrderedDict(self.paths))])
+
+    def __str__(self):
+        report = self.report()
+        lines = ['{0} calls, {1:.6f} s'.format(report['calls'],
+                                                report['total'])]
+        for stage, values in report['stages'].items():
+            lines.append('{0:>10s} {1:12.6f} s {2:6.1%}'.format(
+                stage, values['time'], values['fraction']))
+        lines.append('pixels: ' + ', '.join(
+            '{0} {1}'.format(kind, count)
+            for kind, count in report['pixels'].items()))
+        if report['paths']:
+            lines.append('objects: ' + ', '.join(
+                '{0} {1}'.format(path, count)
+                for path, count in report['paths'].items()))
+        return '\n'.join(lines)
+
+
+# Clock used by `PhotometryProfile`.
+_clock = getattr(time, 'perf_counter', time.time)
+
+
+class PrefixSums(object):
+    """Cumulative sums of an image (and of its variance) along rows.
+
+    These are used by `aperture_photometry` with ``prefix_sums`` to sum
+    the pixels of each row of an aperture (or, with ``method='exact'``,
+    those entirely within it) as the difference of two values. Computing
+    them takes about as long as summing the whole image, so for several
+    calls on the same image they should be computed once, and this object
+    given as ``prefix_sums``.
+
+    Non-finite values are summed as zero, and counted separately, so that
+    they only affect the objects whose sub-arrays contain them (these are
+    then done without the cumulative sums). The rounding errors of the
+    sums of a row grow with the values before it on the row, so the
+    relative precision of faint apertures to the right of bright pixels
+    is lower than that of a direct sum.
+
+    Parameters
+    ----------
+    data : array_like
+        The 2-d image.
+    error, gain : array_like or float, optional
+        Error and gain (see `aperture_photometry`). If ``error`` is given,
+        the cumulative sums of the variance ``error ** 2 + data / gain``
+        are also computed, for pixelwise errors.
+    variance : array_like or float, optional
+        Variance of each pixel, whose cumulative sums are computed instead
+        of those of ``error ** 2 + data / gain``.
+
+    Attributes
+    ----------
+    data, variance : `~numpy.ndarray`
+        (ny, nx + 1) arrays of cumulative sums along rows, starting with a
+        column of zeros (``variance`` is `None` if there is no error).
+    nonfinite : `~numpy.ndarray`
+        (ny + 1, nx + 1) array whose element ``[y, x]`` is the number of
+        pixels of ``[:y, :x]`` with a non-finite data or variance value.
+    """
+
+    def __init__(self, data, error=None, gain=None, variance=None):
+        data = np.asarray(data, dtype=np.float64)
+        if data.ndim != 2:
+            raise ValueError('data must be a 2-d array')
+        if variance is not None:
+            variance = np.broadcast_to(np.asarray(variance,
+                                                  dtype=np.float64),
+                                       data.shape)
+        elif error is not None:
+            error = np.broadcast_to(np.asarray(error, dtype=np.float64),
+                                    data.shape)
+            variance = error * error
+            if gain is not None:
+                variance = variance + data / gain
+        finite = np.isfinite(data)
+        if variance is not None:
+            finite &= np.isfinite(variance)
+        self.nonfinite = np.zeros((data.shape[0] + 1, data.shape[1] + 1),
+                                  dtype=np.intp)
+        np.cumsum(np.cumsum(~finite, axis=0), axis=1,
+                  out=self.nonfinite[1:, 1:])
+        all_finite = self.nonfinite[-1, -1] == 0
+        self.data = self._cumsum(data if all_finite else
+                                 np.where(finite, data, 0.))
+        self.variance = None
+        if variance is not None:
+            self.variance = self._cumsum(variance if all_finite else
+                                         np.where(finite, variance, 0.))
+
+    @property
+    def shape(self):
+        """Shape of the image."""
+        return (self.data.shape[0], self.data.shape[1] - 1)
+
+    @staticmethod
+    def _cumsum(image):
+        result = np.zeros((image.shape[0], image.shape[1] + 1))
+        np.cumsum(image, axis=1, out=result[:, 1:])
+        return result
+
+    def _nonfinite_objects(self, bounds):
+        """Whether the sub-array of each object (given by ``bounds``, as
+        computed by `_batch_bounds`) contains a non-finite value."""
+        x0, x1, y0, y1 = [bounds[:, k] for k in range(4)]
+        counts = self.nonfinite
+        return (counts[y1, x1] - counts[y0, x1] - counts[y1, x0] +
+                counts[y0, x0]) > 0
+
+
+class PhotometryPlan(object):
+    """Fractions of the pixels covered by the apertures of a list of
+    objects, for repeated photometry of images of the same shape.
+
+    The fractions are computed once and stored as a sparse matrix in
+    compressed sparse row (CSR) format, with a row for each aperture of
+    each object and a column for each pixel of the (flattened) image, so
+    that the photometry of an image is a sparse matrix-vector product.
+    The matrix can be used with ``scipy.sparse.csr_matrix((plan.weights,
+    plan.indices, plan.indptr), shape=plan.matrix_shape)``.
+
+    Parameters
+    ----------
+    shape : tuple of int
+        (ny, nx) shape of the images.
+    xc, yc, apertures, method, subpixels
+        See `aperture_photometry`.
+
+    Attributes
+    ----------
+    indptr, indices, weights : `~numpy.ndarray`
+        The CSR matrix: the fractions of row ``j * N_objects + i``
+        (aperture ``j`` of object ``i``) are ``weights[indptr[r]:indptr[r +
+        1]]``, for the pixels of flattened indices ``indices[indptr[r]:
+        indptr[r + 1]]``.
+    """
+
+    def __init__(self, shape, xc, yc, apertures, method='exact',
+                 subpixels=5):
+        shape = tuple(int(n) for n in shape)
+        if len(shape) != 2:
+            raise ValueError('shape must be the shape of a 2-d image')
+        self.shape = shape
+
+        # Check input array type and dimension, as aperture_photometry does.
+        self._scalar_obj_centers = np.isscalar(xc) and np.isscalar(yc)
+        xc = np.atleast_1d(xc).astype(np.float64)
+        yc = np.atleast_1d(yc).astype(np.float64)
+        if xc.ndim > 1 or yc.ndim > 1:
+            raise ValueError('Only 1-d arrays supported for object '
+                             'coordinates')
+        if xc.shape[0] != yc.shape[0]:
+            raise ValueError('length of xc and yc must match')
+        apertures = _check_apertures(apertures, xc.shape[0])
+        if method == 'subpixel':
+            subpixels = int(subpixels)
+            if subpixels < 1:
+                raise ValueError('subpixels: an integer greater than 0 is '
+                                 'required')
+        else:
+            subpixels = 1
+        n_aper, n_obj = apertures.shape[0], xc.shape[0]
+
+        # The built-in apertures use the compiled engine, other aperture
+        # classes their `encloses` method.
+        batch = _batch_parameters(apertures, None, None, None, method)
+        apertures = _broadcast_apertures(apertures, (n_aper, n_obj))
+        if batch is None:
+            kinds = params = None
+            extents = _aperture_extents(apertures)
+            areas = np.empty((n_aper, n_obj), dtype=np.float64)
+        else:
+            kinds, params, extents, areas = [
+                np.broadcast_to(array, (n_aper, n_obj) + array.shape[2:])
+                for array in batch]
+        bounds = _batch_bounds(xc, yc, extents, shape)
+        if bounds is None:
+            raise ValueError('object coordinates must be finite')
+
+        # Pixel of the center of each object (limited to be within the
+        # image), for errors that are not pixelwise. It is -1 for objects
+        # outside the image, which are skipped.
+        self._centers = np.full(n_obj, -1, dtype=np.intp)
+        inside = bounds[:, 1] > 0
+        self._centers[inside] = (
+            np.clip(np.trunc(yc[inside] + 0.5), 0, shape[0] - 1)
+            .astype(np.intp) * shape[1] +
+            np.clip(np.trunc(xc[inside] + 0.5), 0, shape[1] - 1)
+            .astype(np.intp))
+
+        index_dtype = (np.intc if shape[0] * shape[1] < 2 ** 31
+                       else np.intp)
+        counts = np.zeros((n_aper, n_obj), dtype=np.intp)
+        indices = []
+        weights = []
+        for j in range(n_aper):
+            for start in range(0, n_obj, self._chunk_size):
+                chunk = slice(start, min(start + self._chunk_size, n_obj))
+                if batch is None:
+                    bank = _loop_fractions(apertures[j, chunk], xc[chunk],
+                                           yc[chunk], bounds[chunk], method,
+                                           subpixels, areas[j, chunk])
+                else:
+                    bank = _engine_fractions(kinds[j, chunk],
+                                             params[j, chunk], xc[chunk],
+                                             yc[chunk], bounds[chunk],
+                                             method, subpixels)
+                pixels, entries = _bank_pixels(bounds[chunk], shape)
+                nonzero = bank != 0.
+                indices.append(pixels[nonzero].astype(index_dtype))
+                weights.append(bank[nonzero])
+                counts[j, chunk] = np.bincount(
+                    entries[nonzero], minlength=chunk.stop - chunk.start)
+
+        self.indptr = np.zeros(n_aper * n_obj + 1, dtype=np.intp)
+        np.cumsum(counts.ravel(), out=self.indptr[1:])
+        self.indices = np.concatenate(indices)
+        self.weights = np.concatenate(weights)
+        self._areas = np.array(areas, dtype=np.float64)
+        self._bounds = bounds
+
+    # Number of objects whose fraction arrays are computed at a time.
+    _chunk_size = 4096
+
+    @property
+    def matrix_shape(self):
+        """Shape of the CSR matrix, (N_apertures * N_objects, ny * nx)."""
+        return (self._areas.size, self.shape[0] * self.shape[1])
+
+    def dot(self, image):
+        """Product of the matrix and the flattened ``image`` (an array of
+        shape `shape`, or a stack of such arrays), as a (N_apertures,
+        N_objects) array (or a stack of them)."""
+        values = self._pixel_values(image)
+        values *= self.weights
+        return self._row_sums(values)
+
+    def apply(self, data, error=None, gain=None, pixelwise_errors=True,
+              variance=None):
+        """Sum flux within the apertures on an image, or on each frame of
+        a cube of images.
+
+        Parameters
+        ----------
+        data : array_like
+            The 2-d image, of the shape of the plan, or a 3-d cube of
+            such images (frames).
+        error, gain, pixelwise_errors, variance
+            See `aperture_photometry`. For a cube, ``error``, ``gain`` and
+            ``variance`` may also be the same 2-d arrays for all frames.
+
+        Returns
+        -------
+        flux, fluxerr
+            As returned by `aperture_photometry` for the objects and
+            apertures of the plan (to the rounding errors of the sums),
+            including the NaN given by non-finite values in the sub-arrays
+            of the objects. For a cube, these have an additional first
+            dimension for the frames.
+        """
+
+        data = np.asanyarray(data)
+        if data.ndim not in (2, 3) or data.shape[-2:] != self.shape:
+            raise ValueError('shape of data array must match the plan')
+        if variance is not None:
+            if error is not None or gain is not None:
+                raise ValueError('variance cannot be combined with error '
+                                 'or gain')
+            pixelwise_errors = pixelwise_errors and not np.isscalar(variance)
+        elif ((error is None) or
+              (np.isscalar(error) and gain is None) or
+              (np.isscalar(error) and np.isscalar(gain))):
+            pixelwise_errors = False
+        for name, array in [('error', error), ('gain', gain),
+                            ('variance', variance)]:
+            if array is not None and not np.isscalar(array):
+                if np.shape(array) not in (data.shape, self.shape):
+                    raise ValueError('shapes of {0} array and data array '
+                                     'must match'.format(name))
+        if gain is not None and error is None:
+            raise ValueError('gain requires error')
+        has_error = error is not None or variance is not None
+
+        if data.ndim == 2:
+            flux, fluxvar = self._apply(data, error, gain, pixelwise_errors,
+                                        variance)
+        else:
+            # Limit the number of values gathered at a time.
+            step = max(1, self._max_values // max(len(self.indices), 1))
+            results = [self._apply(data[k:k + step],
+                                   _frames(error, k, step),
+                                   _frames(gain, k, step),
+                                   pixelwise_errors,
+                                   _frames(variance, k, step))
+                       for k in range(0, data.shape[0], step)]
+            flux = np.concatenate([result[0] for result in results] or
+                                  [np.zeros((0,) + self._areas.shape)])
+            fluxvar = None
+            if has_error:
+                fluxvar = np.concatenate([result[1] for result in results] or
+                                         [np.zeros(flux.shape)])
+
+        fluxerr = None
+        if has_error:
+            # Make sure variance is > 0 when converting to st. dev.
+            fluxerr = np.sqrt(np.where(0. > fluxvar, 0., fluxvar))
+
+        # Return scalars, 1-d or 2-d arrays (per frame), as
+        # aperture_photometry does.
+        index = (slice(None),) * data.ndim
+        if self._scalar_obj_centers and self._areas.shape[0] == 1:
+            index = index[:-2] + (0, 0)
+        elif self._areas.shape[0] == 1:
+            index = index[:-2] + (0, slice(None))
+        flux = flux[index]
+        if not has_error:
+            return flux
+        else:
+            return flux, fluxerr[index]
+
+    # Largest number of values gathered at a time from a cube of images.
+    _max_values = 2 ** 22
+
+    def _apply(self, data, error, gain, pixelwise_errors, variance=None):
+        """Flux and variance (`None` without ``error`` or ``variance``) of
+        an image or a cube, as (N_apertures, N_objects) arrays or stacks
+        of them."""
+
+        flux = self._weighted_sums(data)
+        if error is None and variance is None:
+            return flux, None
+        if pixelwise_errors:
+            if variance is None:
+                variance = np.asarray(error, dtype=np.float64)
+                variance = variance * variance
+                if gain is not None:
+                    variance = variance + (np.asarray(data, dtype=np.float64)
+                                           / gain)
+            # A 2-d error array without gain gives the same variance for
+            # all frames.
+            return flux, np.broadcast_to(self._weighted_sums(variance),
+                                         flux.shape)
+
+        # Assume error and gain are constant over whole aperture.
+        inside = self._centers >= 0
+        fluxvar = np.zeros(flux.shape)
+        if variance is not None:
+            local_var = self._center_values(variance)[..., inside]
+        else:
+            local_error = self._center_values(error)[..., inside]
+            local_var = np.power(local_error, np.full_like(local_error, 2.))
+        fluxvar[..., inside] = (local_var[..., np.newaxis, :] *
+                                self._areas[:, inside])
+        if gain is not None:
+            fluxvar[..., inside] += (flux[..., inside] /
+                                     self._center_values(gain)[
+                                         ..., np.newaxis, inside])
+        return flux, fluxvar
+
+    def _weighted_sums(self, image):
+        """Sums of the weighted values of ``image`` (an image or a cube)
+        over each row, with the non-finite values outside the apertures
+        propagated as by `aperture_photometry`.
+
+        The other kernels multiply the whole sub-array of an object by
+        the fractions, so that a NaN or infinite value at a pixel with a
+        zero fraction (not an entry of the matrix) gives NaN (0 * NaN).
+        """
+        values = self._pixel_values(image)
+        sums = self._row_sums(values * self.weights)
+        nonfinite = ~np.isfinite(image)
+        if not np.any(nonfinite):
+            return sums
+        # Number of non-finite values in the sub-array of each object
+        # (from a summed-area table), and among the entries of each row.
+        table = np.zeros(nonfinite.shape[:-2] +
+                         (nonfinite.shape[-2] + 1, nonfinite.shape[-1] + 1),
+                         dtype=np.intp)
+        np.cumsum(np.cumsum(nonfinite, axis=-2), axis=-1,
+                  out=table[..., 1:, 1:])
+        x0, x1, y0, y1 = [self._bounds[:, k] for k in range(4)]
+        in_subarray = (table[..., y1, x1] - table[..., y0, x1] -
+                       table[..., y1, x0] + table[..., y0, x0])
+        in_row = self._row_sums((~np.isfinite(values)).astype(np.float64))
+        sums[in_subarray[..., np.newaxis, :] > in_row] = np.nan
+        return sums
+
+    def _pixel_values(self, array):
+        """Values of ``array`` (or a scalar) at the non-zero entries, for
+        each image if ``array`` is a cube."""
+        if np.isscalar(array):
+            return np.full(self.indices.shape, array, dtype=np.float64)
+        array = np.asarray(array)
+        return np.take(array.reshape(array.shape[:-2] + (-1,)), self.indices,
+                       axis=-1).astype(np.float64, copy=False)
+
+    def _center_values(self, array):
+        """Values of ``array`` (or a scalar) at the object centers, for
+        each image if ``array`` is a cube."""
+        if np.isscalar(array):
+            return np.full(self._centers.shape, array, dtype=np.float64)
+        array = np.asarray(array, dtype=np.float64)
+        return np.take(array.reshape(array.shape[:-2] + (-1,)),
+                       np.maximum(self._centers, 0), axis=-1)
+
+    def _row_sums(self, values):
+        """Sums of ``values`` (one per non-zero entry, along the last
+        axis) over each row."""
+        sums = np.zeros(values.shape[:-1] + (self._areas.size,),
+                        dtype=np.float64)
+        starts = self.indptr[:-1]
+        nonempty = starts < self.indptr[1:]
+        if np.any(nonempty):
+            sums[..., nonempty] = np.add.reduceat(values, starts[nonempty],
+                                                  axis=-1)
+        return sums.reshape(values.shape[:-1] + self._areas.shape)
+
+
+def _frames(array, start, count):
+    """Frames [start, start + count) of a cube, or a 2-d array or scalar
+    used for all frames."""
+    if array is None or np.ndim(array) < 3:
+        return array
+    return array[start:start + count]
+
+
+# Cache used by `aperture_photometry` by default.
+fraction_cache = FractionCache()
+
+# Cache of the banks of fraction arrays on grids of sub-pixel phases used
+# by `aperture_photometry` with ``phase_tolerance``.
+phase_bank_cache = FractionCache(max_bytes=256 * 1024 ** 2, max_pixels=None)
+
+
 def aperture_photometry(data, xc, yc, apertures, error=None, gain=None,
                         mask=None, method='exact', subpixels=5,
-                        pixelwise_errors=True):
+                        pixelwise_errors=True, n_jobs=1, executor=None,
+                        cache=True, phase_tolerance=None,
+                        phase_interpolation='bilinear', prefix_sums=False,
+                        tile_size=None, sort_objects=None, variance=None,
+                        profile=None):
     r"""Sum flux within aperture(s).
 
     Multiple objects and multiple apertures per object can be specified.
@@ -326,13 +1193,19 @@ def aperture_photometry(data, xc, yc, apertures, error=None, gain=None,
     Parameters
     ----------
     data : array_like
-        The 2-d array on which to perform photometry.
+        The 2-d array on which to perform photometry, or a 3-d array of
+        shape (N_frames, ny, nx) (e.g., a time series of images). For a
+        3-d array, the fractions of the pixels covered by the apertures
+        are computed once (see `PhotometryPlan`) and used for all frames.
     xc, yc : float or list_like
         The x and y coordinates of the object center(s). If list_like,
         the lengths must match.
-    apertures : `Aperture` object or array of `Aperture` objects
+    apertures : `Aperture`, array of `Aperture` objects or `ApertureArray`
 
-        The apertures to use for photometry. If an array (of at most 2
+        The apertures to use for photometry. An `ApertureArray` (e.g.,
+        `CircularApertureArray`) holds apertures of a single class without
+        creating an `Aperture` object for each of them, and is otherwise
+        equivalent to the array of its elements. If an array (of at most 2
         dimensions), the trailing dimension of the array must be
         broadcastable to N_objects (= `len(xc)`). In  other words,
         the trailing dimension must be equal to either 1 or N_objects. The
@@ -351,17 +1224,22 @@ def aperture_photometry(data, xc, yc, apertures, error=None, gain=None,
         resampled once for each object.
     error : float or array_like, optional
         Error in each pixel, interpreted as Gaussian 1-sigma uncertainty.
+        For a 3-d `data` array, this may be a 3-d array of the same shape
+        or a 2-d array used for all frames.
     gain : float or array_like, optional
         Ratio of counts (e.g., electrons or photons) to units of the data
         (e.g., ADU), for the purpose of calculating Poisson error from the
         object itself. If `gain` is `None` (default), `error` is assumed to
         include all uncertainty in each pixel. If `gain` is given, `error`
         is assumed to be the "background error" only (not accounting for
-        Poisson error in the flux in the apertures).
+        Poisson error in the flux in the apertures). For a 3-d `data`
+        array, this may be 2-d, as `error`.
     mask : array_like (bool), optional
         Mask to apply to the data. The value of masked pixels are replaced
         by the value of the pixel mirrored across the center of the object,
-        if available. If unavailable, the value is set to zero.
+        if available. If unavailable, the value is set to zero. For a 3-d
+        `data` array, this may be 2-d, as `error`; the frames are then
+        processed one at a time.
     method : str, optional
         Method to use for determining overlap between the aperture and pixels.
         Options include ['center', 'subpixel', 'exact'], but not all options
@@ -389,6 +1267,98 @@ def aperture_photometry(data, xc, yc, apertures, error=None, gain=None,
         within an aperture. Use the single value of error and/or gain at
         the center of each aperture as the value for the entire aperture.
         Default is True.
+    n_jobs : int, optional
+        Number of threads used to perform photometry on the objects in
+        parallel (-1 to use all CPUs). The objects are split into chunks
+        that are processed without holding the GIL. The results do not
+        depend on the number of threads. Only used for the built-in
+        aperture classes; other apertures are processed serially.
+        Default is 1.
+    executor : object, optional
+        An executor (e.g., a `concurrent.futures.ThreadPoolExecutor` or a
+        `multiprocessing.pool.ThreadPool`) whose ``map`` method is used
+        to run the chunks of objects, instead of creating a pool of
+        ``n_jobs`` threads. It must run them in threads of this process.
+    cache : bool or `FractionCache`, optional
+        If True (default), the fraction arrays of the built-in apertures
+        are reused from (and stored in) ``photutils.aperture.fraction_cache``
+        when objects share the same apertures and sub-pixel offsets. A
+        `FractionCache` instance may be given instead. If False, the
+        fraction arrays are always computed.
+    phase_tolerance : float, optional
+        If given, use an approximate version of the 'exact' method: the
+        fraction arrays of each distinct aperture are precomputed on a
+        grid of sub-pixel positions of the object center (phases), and
+        each object uses the array of the nearest phase or a bilinear
+        interpolation of the arrays of the surrounding phases (see
+        ``phase_interpolation``). The resolution of the grid is chosen
+        such that the sum over pixels of the absolute error on the
+        fractions, relative to the aperture area, is at most
+        ``phase_tolerance``. The error on the flux is then at most
+        ``phase_tolerance`` times the area times the largest absolute
+        data value in the aperture. The precomputed arrays are kept in
+        ``photutils.aperture.phase_bank_cache``. Requires
+        ``method='exact'``, no ``mask`` and the built-in aperture
+        classes.
+    phase_interpolation : {'bilinear', 'nearest'}, optional
+        How the precomputed fraction arrays are used with
+        ``phase_tolerance``. 'nearest' needs a much finer grid of phases
+        for the same tolerance, and is only practical for tolerances of
+        about 1e-2 or more.
+    prefix_sums : bool or `PrefixSums`, optional
+        With ``method='center'``, sum each row of an aperture as the
+        difference of two values of the cumulative sums of the data (and
+        of the variance, for pixelwise errors) along rows. With
+        ``method='exact'``, the pixels entirely within the aperture are
+        summed in the same way, and the exact overlap is only computed
+        for the pixels on its boundary. The cost of an aperture is then
+        proportional to its height (or perimeter) rather than its area,
+        which is faster for large apertures; the same pixels and fractions
+        are used, and the sums are accurate to the rounding errors of the
+        cumulative sums, which grow with the values before an aperture on
+        its rows (see `PrefixSums`). Objects whose sub-arrays contain
+        non-finite values are done without the cumulative sums, so that
+        these values propagate as they do otherwise, and do not affect
+        the other objects. If True, the cumulative sums are computed in this
+        call; a `PrefixSums` instance computed from the same ``data``,
+        ``error`` and ``gain`` may be given instead to reuse them over
+        several calls. Requires no ``mask`` and the built-in aperture
+        classes.
+    tile_size : int, optional
+        If non-zero, the objects are grouped by tiles of the image of this
+        size (in pixels), and the tiles are processed in order of
+        increasing row and column. Only the part of the 2-d ``data``
+        array (and of the ``error``, ``gain`` and ``mask`` arrays) around
+        the objects of a tile is read and converted, so that the memory
+        used grows with the size of the tiles rather than that of the
+        image. The results are the same, to rounding errors of the object
+        coordinates relative to the tile. If `None` (default), tiles of
+        1024 pixels are used when ``data`` is a `~numpy.memmap` or another
+        array-like object with ``shape`` and ``__getitem__`` attributes
+        that is not a `~numpy.ndarray` (e.g., a lazily loaded image), and
+        no tiles are used otherwise. Not used with a `PrefixSums`
+        instance, which describes the whole image.
+    sort_objects : bool, optional
+        If True, the objects are processed in order of bands of rows of
+        the image, and of increasing column within a band, rather than in
+        the order of `xc`, `yc`, so that the sub-arrays of successive
+        objects are close in memory. The results are returned in the order
+        of `xc`, `yc`, and do not depend on this option. If `None`
+        (default), the objects are sorted for images of at least 2 ** 22
+        pixels.
+    variance : float or array_like, optional
+        Total variance of each pixel (e.g., ``error ** 2 + data / gain``),
+        used instead of `error` and `gain`, which must then be `None`.
+        With pixelwise errors, the variance within the apertures is then a
+        weighted sum of these values, like the flux. If `error` and `gain`
+        are given instead, and the sub-arrays of the objects (for all
+        their apertures) cover more pixels than the image, the variance
+        image is computed from them once for the built-in aperture
+        classes.
+    profile : `PhotometryProfile`, optional
+        If given, the time spent in each stage of the photometry and the
+        number of pixels evaluated are added to this instance (see
+        `PhotometryProfile`). The results do not depend on this option.
 
     Returns
     -------
@@ -397,18 +1367,62 @@ def aperture_photometry(data, xc, yc, apertures, error=None, gain=None,
         there is a single aperture, a float is returned. If xc, yc are
         list_like and there is a single aperture per object, a 1-d
         array is returned. If there are multiple apertures per object,
-        a 2-d array is returned.
+        a 2-d array is returned. For a 3-d `data` array, these have an
+        additional first dimension of length N_frames.
     fluxerr : float or `~numpy.ndarray`
-        Uncertainty in flux values. Only returned if error is not `None`.
+        Uncertainty in flux values. Only returned if error or variance is
+        not `None`.
     """
 
-    # Check input array type and dimension.
-    data = np.asarray(data)
+    return _aperture_photometry(
+        data, xc, yc, apertures, error=error, gain=gain, mask=mask,
+        method=method, subpixels=subpixels,
+        pixelwise_errors=pixelwise_errors, n_jobs=n_jobs, executor=executor,
+        cache=cache, phase_tolerance=phase_tolerance,
+        phase_interpolation=phase_interpolation, prefix_sums=prefix_sums,
+        tile_size=tile_size, sort_objects=sort_objects, variance=variance,
+        profile=profile)
+
+
+def _aperture_photometry(data, xc, yc, apertures, error=None, gain=None,
+                         mask=None, method='exact', subpixels=5,
+                         pixelwise_errors=True, n_jobs=1, executor=None,
+                         cache=True, phase_tolerance=None,
+                         phase_interpolation='bilinear', prefix_sums=False,
+                         tile_size=None, sort_objects=None, variance=None,
+                         profile=None, shared_apertures=True):
+    """`aperture_photometry`, with ``shared_apertures`` False for a group
+    of per-object apertures that has a single object (see
+    `_photometry_batch`)."""
+
+    if profile is not None:
+        profile.calls += 1
+        start = _clock()
+
+    # Check input array type and dimension. Images read lazily (e.g.,
+    # memory-mapped files) are only sliced, unless there are several
+    # frames.
+    lazy = _is_lazy(data)
+    if not lazy or len(data.shape) == 3:
+        data = np.asarray(data)
     if np.iscomplexobj(data):
         raise TypeError('Complex type not supported')
-    if data.ndim != 2:
+    if variance is not None and (error is not None or gain is not None):
+        raise ValueError('variance cannot be combined with error or gain')
+    if len(data.shape) == 3:
+        if profile is not None:
+            profile.lap('setup', start)
+        return _photometry_cube(data, xc, yc, apertures, error, gain, mask,
+                                method, subpixels, pixelwise_errors,
+                                variance=variance, n_jobs=n_jobs,
+                                executor=executor, cache=cache,
+                                phase_tolerance=phase_tolerance,
+                                phase_interpolation=phase_interpolation,
+                                prefix_sums=prefix_sums, profile=profile)
+    if len(data.shape) != 2:
         raise ValueError('{0}-d array not supported. '
-                         'Only 2-d arrays supported.'.format(data.ndim))
+                         'Only 2-d and 3-d arrays supported.'
+                         .format(len(data.shape)))
 
     # Note whether xc, yc are scalars so we can try to return scalars later.
     scalar_obj_centers = np.isscalar(xc) and np.isscalar(yc)
@@ -422,32 +1436,43 @@ def aperture_photometry(data, xc, yc, apertures, error=None, gain=None,
         raise ValueError('length of xc and yc must match')
     n_obj = xc.shape[0]
 
-    # Check 'apertures' dimensions and type
-    apertures = np.atleast_2d(apertures)
-    if apertures.ndim > 2:
-        raise ValueError('{0}-d aperture array not supported. '
-                         'Only 2-d arrays supported.'.format(apertures.ndim))
-    for aperture in apertures.ravel():
-        if not isinstance(aperture, Aperture):
-            raise TypeError("'aperture' must be an instance of Aperture.")
+    # Check 'apertures' dimensions, type and shape, and expand trailing
+    # dimension to match N_obj if necessary.
+    apertures = _check_apertures(apertures, n_obj)
     n_aper = apertures.shape[0]
-
-    # Check 'apertures' shape and expand trailing dimension to match N_obj
-    # if necessary.
-    if apertures.shape[1] not in [1, n_obj]:
-        raise ValueError("trailing dimension of 'apertures' must be 1 or "
-                         "match length of xc, yc")
+    apertures_in = apertures
     if apertures.shape[1] != n_obj:
-        # We will not use xc2d. This is just for broadcasting 'apertures':
-        apertures, xc2d = np.broadcast_arrays(apertures, xc)
+        apertures = _broadcast_apertures(apertures, (n_aper, n_obj))
 
     # Check whether we really need to calculate pixelwise errors, even if
     # requested. (If neither error nor gain is an array, we don't need to.)
-    if ((error is None) or
-        (np.isscalar(error) and gain is None) or
-        (np.isscalar(error) and np.isscalar(gain))):
+    if variance is not None:
+        pixelwise_errors = pixelwise_errors and not np.isscalar(variance)
+    elif ((error is None) or
+          (np.isscalar(error) and gain is None) or
+          (np.isscalar(error) and np.isscalar(gain))):
         pixelwise_errors = False
 
+    # Process the image tile by tile, reading only the parts around the
+    # objects.
+    if tile_size is None:
+        tile_size = _default_tile_size if lazy else 0
+    tile_size = int(tile_size)
+    if tile_size < 0:
+        raise ValueError('tile_size must not be negative')
+    if tile_size > 0 and not isinstance(prefix_sums, PrefixSums):
+        if profile is not None:
+            profile.lap('setup', start)
+        flux, fluxerr = _photometry_tiles(
+            data, xc, yc, apertures_in, error, gain, mask, tile_size,
+            variance=variance, method=method, subpixels=subpixels,
+            pixelwise_errors=pixelwise_errors, n_jobs=n_jobs,
+            executor=executor, cache=cache, phase_tolerance=phase_tolerance,
+            phase_interpolation=phase_interpolation,
+            prefix_sums=prefix_sums, profile=profile)
+        return _photometry_result(flux, fluxerr, scalar_obj_centers)
+    data = np.asarray(data)
+
     # Check error shape.
     if error is not None:
         if np.isscalar(error):
@@ -467,6 +1492,14 @@ def aperture_photometry(data, xc, yc, apertures, error=None, gain=None,
         if gain.shape != data.shape:
             raise ValueError('shapes of gain array and data array must match')
 
+    # Check variance shape.
+    if variance is not None:
+        if np.isscalar(variance):
+            variance, data = np.broadcast_arrays(variance, data)
+        if variance.shape != data.shape:
+            raise ValueError('shapes of variance array and data array must'
+                             ' match')
+
     # Check mask shape and type.
     if mask is not None:
         mask = np.asarray(mask)
@@ -476,6 +1509,14 @@ def aperture_photometry(data, xc, yc, apertures, error=None, gain=None,
             raise ValueError('{0}-d array not supported. '
                              'Only 2-d arrays supported.'.format(mask.ndim))
 
+    # Check number of threads.
+    if n_jobs == -1:
+        n_jobs = multiprocessing.cpu_count()
+    n_jobs = int(n_jobs)
+    if n_jobs < 1:
+        raise ValueError('n_jobs: an integer greater than 0 (or -1) is '
+                         'required')
+
     # Check that 'subpixels' is an int and is 1 or greater.
     if method == 'subpixel':
         subpixels = int(subpixels)
@@ -483,16 +1524,309 @@ def aperture_photometry(data, xc, yc, apertures, error=None, gain=None,
             raise ValueError('subpixels: an integer greater than 0 is '
                              'required')
 
+    # Check the approximate mode.
+    if phase_tolerance is not None:
+        if not phase_tolerance > 0.:
+            raise ValueError('phase_tolerance must be positive')
+        if method != 'exact':
+            raise ValueError("phase_tolerance requires method='exact'")
+        if phase_interpolation not in ('bilinear', 'nearest'):
+            raise ValueError("phase_interpolation must be 'bilinear' or "
+                             "'nearest'")
+    if prefix_sums is not None and prefix_sums is not False:
+        if method not in ('center', 'exact'):
+            raise ValueError("prefix_sums requires method='center' or "
+                             "'exact'")
+        if (isinstance(prefix_sums, PrefixSums) and
+                prefix_sums.shape != data.shape):
+            raise ValueError('prefix_sums were computed for an image of a '
+                             'different shape')
+
+    # Process the objects in an order that follows the image in memory.
+    if sort_objects is None:
+        sort_objects = data.size >= _sort_objects_min_size
+    order = None
+    if sort_objects and n_obj > 1:
+        order = _spatial_order(xc, yc)
+        xc = xc[order]
+        yc = yc[order]
+        apertures = apertures[:, order]
+        if apertures_in.shape[1] > 1:
+            apertures_in = apertures_in[:, order]
+
     # Initialize arrays to return.
     flux = np.zeros(apertures.shape, dtype=np.float)
-    if error is not None:
+    fluxerr = None
+    if error is not None or variance is not None:
         fluxerr = np.zeros(apertures.shape, dtype=np.float)
 
+    # The built-in apertures are handled by a compiled engine that computes
+    # all objects in a single call. Masked data and other aperture classes
+    # go through the loop over objects.
+    if profile is not None:
+        start = profile.lap('setup', start)
+    batch = None
+    if mask is None:
+        batch = _batch_parameters(apertures_in, data, error, gain, method,
+                                  variance=variance)
+    if profile is not None:
+        profile.lap('extent', start)
+    if batch is not None:
+        batch = _photometry_batch(data, xc, yc, apertures.shape, batch,
+                                  error, gain, method, subpixels,
+                                  pixelwise_errors, flux, fluxerr,
+                                  variance=variance, n_jobs=n_jobs,
+                                  executor=executor, cache=cache,
+                                  phase_tolerance=phase_tolerance,
+                                  phase_interpolation=phase_interpolation,
+                                  prefix_sums=prefix_sums, profile=profile,
+                                  shared_apertures=shared_apertures)
+    if batch is None:
+        if phase_tolerance is not None:
+            raise ValueError('phase_tolerance is only supported for the '
+                             'built-in aperture classes, without mask')
+        if prefix_sums is not None and prefix_sums is not False:
+            raise ValueError('prefix_sums is only supported for the '
+                             'built-in aperture classes, without mask')
+        _photometry_loop(data, xc, yc, apertures, error, gain, mask, method,
+                         subpixels, pixelwise_errors, flux, fluxerr,
+                         variance=variance, profile=profile)
+
+    # Scatter the results back to the order of the objects.
+    if profile is not None:
+        start = _clock()
+    if order is not None:
+        flux[:, order] = flux.copy()
+        if fluxerr is not None:
+            fluxerr[:, order] = fluxerr.copy()
+    if profile is not None:
+        profile.lap('setup', start)
+
+    return _photometry_result(flux, fluxerr, scalar_obj_centers)
+
+
+def _photometry_result(flux, fluxerr, scalar_obj_centers):
+    """Return values of `aperture_photometry` from the (N_apertures,
+    N_objects) ``flux`` and ``fluxerr`` (`None` without error) arrays."""
+
+    n_aper = flux.shape[0]
+
+    # If input coordinates were scalars, return scalars (if single aperture)
+    if scalar_obj_centers and n_aper == 1:
+        if fluxerr is None:
+            return flux[0, 0]
+        else:
+            return flux[0, 0], fluxerr[0, 0]
+
+    # If we only had a single aperture per object, we can return 1-d arrays
+    if n_aper == 1:
+        if fluxerr is None:
+            return flux[0]
+        else:
+            return flux[0], fluxerr[0]
+
+    # Otherwise, return 2-d array
+    if fluxerr is None:
+        return flux
+    else:
+        return flux, fluxerr
+
+
+# Size of the tiles used by default for images read lazily.
+_default_tile_size = 1024
+
+# Smallest image (in pixels) for which the objects are sorted by default,
+# and height of the bands of rows they are sorted by.
+_sort_objects_min_size = 2 ** 22
+_sort_band_height = 64
+
+
+def _spatial_order(xc, yc):
+    """Order of the objects by bands of `_sort_band_height` rows, and by
+    column within each band."""
+    band = np.floor(np.asarray(yc, dtype=np.float64) / _sort_band_height)
+    return np.lexsort((xc, band))
+
+
+def _is_lazy(array):
+    """Whether ``array`` is a memory-mapped array or another array-like
+    object (not a `~numpy.ndarray`) that is read when it is sliced."""
+    if isinstance(array, np.memmap):
+        return True
+    return (not isinstance(array, np.ndarray) and
+            hasattr(array, 'shape') and hasattr(array, '__getitem__'))
+
+
+def _photometry_tiles(data, xc, yc, apertures, error, gain, mask, tile_size,
+                      variance=None, **kwargs):
+    """Fluxes and errors (`None` without ``error`` or ``variance``), as
+    (N_apertures,
+    N_objects) arrays, of the objects grouped by tiles of the 2-d
+    ``data`` array (see `aperture_photometry`).
+
+    Each group is measured by `aperture_photometry` on the smallest window
+    of the arrays that contains the sub-arrays of its objects, with the
+    other keyword arguments of that function in ``kwargs``. The objects
+    get the same sub-arrays as on the whole image: windows are bounded by
+    the sub-arrays, which are limited to the image in the same way.
+    """
+
+    shape = tuple(int(n) for n in data.shape)
+    for name, array in [('error', error), ('gain', gain), ('mask', mask),
+                        ('variance', variance)]:
+        if array is not None and not np.isscalar(array):
+            if tuple(array.shape) != shape:
+                raise ValueError('shapes of {0} array and data array '
+                                 'must match'.format(name))
+
+    n_aper, n_obj = apertures.shape[0], xc.shape[0]
+    flux = np.zeros((n_aper, n_obj), dtype=np.float64)
+    fluxerr = None
+    if error is not None or variance is not None:
+        fluxerr = np.zeros((n_aper, n_obj), dtype=np.float64)
+
+    # Sub-array bounds of the objects, from the extents of the distinct
+    # apertures.
+    profile = kwargs.get('profile')
+    if profile is not None:
+        start = _clock()
+    extents = np.broadcast_to(_aperture_extents(apertures),
+                              (n_aper, n_obj, 4))
+    bounds = _batch_bounds(xc.astype(np.float64), yc.astype(np.float64),
+                           extents, shape)
+    if bounds is None:
+        raise ValueError('object coordinates must be finite')
+    if profile is not None:
+        profile.lap('extent', start)
+
+    # Tile of the lower corner of each sub-array, in row-major order, so
+    # that the windows follow the layout of the image in memory (or on
+    # disk). Objects entirely outside the image are skipped.
+    inside = np.flatnonzero(bounds[:, 1] > 0)
+    n_tiles_x = shape[1] // tile_size + 1
+    tiles = ((bounds[inside, 2] // tile_size) * n_tiles_x +
+             bounds[inside, 0] // tile_size)
+    order = np.argsort(tiles, kind='mergesort')
+    tiles = tiles[order]
+    groups = np.split(inside[order],
+                      np.flatnonzero(tiles[1:] != tiles[:-1]) + 1)
+
+    for group in groups:
+        if len(group) == 0:
+            continue
+        x_min = bounds[group, 0].min()
+        x_max = bounds[group, 1].max()
+        y_min = bounds[group, 2].min()
+        y_max = bounds[group, 3].max()
+        window = (slice(y_min, y_max), slice(x_min, x_max))
+
+        def read(array):
+            if array is None or np.isscalar(array):
+                return array
+            return np.asarray(array[window])
+
+        # Groups of per-object apertures go through the same kernels as
+        # the whole catalog, even if they have a single object.
+        shared = apertures.shape[1] == 1
+        if shared:
+            group_apertures = apertures
+        else:
+            group_apertures = apertures[:, group]
+        if profile is not None:
+            start = _clock()
+        windows = dict(error=read(error), gain=read(gain), mask=read(mask),
+                       variance=read(variance))
+        window_data = read(data)
+        if profile is not None:
+            profile.lap('read', start)
+        result = _aperture_photometry(window_data, xc[group] - x_min,
+                                      yc[group] - y_min, group_apertures,
+                                      tile_size=0, shared_apertures=shared,
+                                      **dict(kwargs, **windows))
+        if fluxerr is None:
+            flux[:, group] = np.reshape(result, (n_aper, len(group)))
+        else:
+            flux[:, group] = np.reshape(result[0], (n_aper, len(group)))
+            fluxerr[:, group] = np.reshape(result[1], (n_aper, len(group)))
+
+    return flux, fluxerr
+
+
+def _photometry_cube(data, xc, yc, apertures, error, gain, mask, method,
+                     subpixels, pixelwise_errors, variance=None, **kwargs):
+    """Photometry of each frame of a 3-d ``data`` array (see
+    `aperture_photometry`), with the results stacked along a first axis.
+
+    Without mask, ``phase_tolerance`` or ``prefix_sums``, the fractions
+    are computed once in a `PhotometryPlan` and all frames are summed
+    together. Otherwise, each frame goes through `aperture_photometry`,
+    with the other keyword arguments of that function in ``kwargs``.
+    """
+
+    for name, array in [('error', error), ('gain', gain), ('mask', mask),
+                        ('variance', variance)]:
+        if array is not None and not np.isscalar(array):
+            if np.shape(array) not in (data.shape, data.shape[1:]):
+                raise ValueError('shapes of {0} array and data array '
+                                 'must match'.format(name))
+    if gain is not None and error is None:
+        raise ValueError('gain requires error')
+    prefix_sums = kwargs['prefix_sums']
+    if isinstance(prefix_sums, PrefixSums):
+        raise ValueError('prefix_sums cannot be reused for 3-d arrays')
+
+    if (mask is None and kwargs['phase_tolerance'] is None and
+            (prefix_sums is None or prefix_sums is False)):
+        profile = kwargs['profile']
+        if profile is not None:
+            start = _clock()
+        plan = PhotometryPlan(data.shape[1:], xc, yc, apertures,
+                              method=method, subpixels=subpixels)
+        if profile is not None:
+            start = profile.lap('encloses', start)
+            profile.add_path('plan', int(np.count_nonzero(
+                plan._centers >= 0)))
+        result = plan.apply(data, error=error, gain=gain,
+                            pixelwise_errors=pixelwise_errors,
+                            variance=variance)
+        if profile is not None:
+            profile.lap('sum', start)
+        return result
+
+    def frame(array, k):
+        return array[k] if np.ndim(array) == 3 else array
+
+    results = [aperture_photometry(data[k], xc, yc, apertures,
+                                   error=frame(error, k),
+                                   gain=frame(gain, k), mask=frame(mask, k),
+                                   variance=frame(variance, k),
+                                   method=method, subpixels=subpixels,
+                                   pixelwise_errors=pixelwise_errors,
+                                   **kwargs)
+               for k in range(data.shape[0])]
+    if error is None and variance is None:
+        return np.array(results)
+    return (np.array([result[0] for result in results]),
+            np.array([result[1] for result in results]))
+
+
+def _photometry_loop(data, xc, yc, apertures, error, gain, mask, method,
+                     subpixels, pixelwise_errors, flux, fluxerr,
+                     variance=None, profile=None):
+    """Fill ``flux`` and ``fluxerr`` (see `aperture_photometry`) by looping
+    over objects in Python. This works for any `Aperture` subclass. The
+    stages are timed with ``profile`` (a `PhotometryProfile` or `None`)."""
+
+    n_aper, n_obj = apertures.shape
+
     # 'extents' will hold the extent of all apertures for a given object.
     extents = np.empty((n_aper, 4), dtype=np.float)
 
     for i in range(n_obj):  # Loop over objects.
 
+        if profile is not None:
+            start = _clock()
+
         # Fill 'extents' with extent of all apertures for this object.
         for j in range(n_aper):
             extents[j] = apertures[j, i].extent()
@@ -507,6 +1841,8 @@ def aperture_photometry(data, xc, yc, apertures, error=None, gain=None,
         if (x_min >= data.shape[1] or x_max <= 0 or
             y_min >= data.shape[0] or y_max <= 0):
             # TODO: flag all the apertures for this object
+            if profile is not None:
+                profile.lap('extent', start)
             continue
 
         # Limit sub-array to be within the image.
@@ -514,54 +1850,49 @@ def aperture_photometry(data, xc, yc, apertures, error=None, gain=None,
         x_max = min(x_max, data.shape[1])
         y_min = max(y_min, 0)
         y_max = min(y_max, data.shape[0])
+        if profile is not None:
+            start = profile.lap('extent', start)
+            profile.add_path('loop', 1)
 
         # Get the sub-array of the image and error
         subdata = data[y_min:y_max, x_min:x_max]
-        if pixelwise_errors:
+        if profile is not None:
+            start = profile.lap('cutout', start)
+        if pixelwise_errors and variance is not None:
+            subvariance = variance[y_min:y_max, x_min:x_max]
+        elif pixelwise_errors:
             subvariance = error[y_min:y_max, x_min:x_max] ** 2
             # If gain is specified, add poisson noise from the counts above
             # the background
             if gain is not None:
                 subgain = gain[y_min:y_max, x_min:x_max]
                 subvariance += subdata / subgain
-
+        if profile is not None:
+            start = profile.lap('errors', start)
+
+        # Masked pixels take the value of the pixel mirrored across the
+        # center of the object, or zero if that pixel is masked or out of
+        # the sub-array. Rather than replacing values in copies of the
+        # sub-arrays, the fractions of the masked pixels are moved to their
+        # mirrors (see `_mirror_fraction`).
+        masked = None
         if mask is not None:
-            submask = mask[y_min:y_max, x_min:x_max]  # Get sub-mask.
-
-            # Get a copy of the data, because we will edit it
-            subdata = copy.deepcopy(subdata)
-
-            # Coordinates of masked pixels in sub-array.
-            y_masked, x_masked = np.nonzero(submask)
-
-            # Corresponding coordinates mirrored across xc, yc
-            x_mirror = (2 * (xc[i] - x_min) - x_masked + 0.5).view('int32')
-            y_mirror = (2 * (yc[i] - y_min) - y_masked + 0.5).view('int32')
-
-            # reset pixels that go out of the image.
-            outofimage = ((x_mirror < 0) |
-                          (y_mirror < 0) |
-                          (x_mirror >= subdata.shape[1]) |
-                          (y_mirror >= subdata.shape[0]))
-            if outofimage.any():
-                x_mirror[outofimage] = x_masked[outofimage]
-                y_mirror[outofimage] = y_masked[outofimage]
-
-            # Replace masked pixel values.
-            subdata[y_masked, x_masked] = subdata[y_mirror, x_mirror]
-            if pixelwise_errors:
-                subvariance[y_masked, x_masked] = \
-                    subvariance[y_mirror, x_mirror]
-
-            # Set pixels that mirrored to another masked pixel to zero.
-            # This will also set to zero any pixels that mirrored out of
-            # the image.
-            mirror_is_masked = submask[y_mirror, x_mirror]
-            x_bad = x_masked[mirror_is_masked]
-            y_bad = y_masked[mirror_is_masked]
-            subdata[y_bad, x_bad] = 0.
-            if pixelwise_errors:
-                subvariance[y_bad, x_bad] = 0.
+            submask = np.asarray(mask[y_min:y_max, x_min:x_max], dtype=bool)
+            masked = np.flatnonzero(submask)
+            if len(masked) == 0:
+                masked = None
+            else:
+                moved, mirrors = _mirror_pixels(masked, submask,
+                                                xc[i] - x_min, yc[i] - y_min)
+                # Masked pixels get a weight of zero, which is only enough
+                # if their values are finite (they are often NaN).
+                if not np.all(np.isfinite(subdata.flat[masked])):
+                    subdata = np.where(submask, 0., subdata)
+                if (pixelwise_errors and
+                        not np.all(np.isfinite(subvariance.flat[masked]))):
+                    subvariance = np.where(submask, 0., subvariance)
+            if profile is not None:
+                start = profile.lap('mask', start)
 
         # Loop over apertures for this object.
         for j in range(apertures.shape[0]):
@@ -572,51 +1903,794 @@ def aperture_photometry(data, xc, yc, apertures, error=None, gain=None,
                 y_min - yc[i] - 0.5, y_max - yc[i] - 0.5,
                 subdata.shape[1], subdata.shape[0],
                 method=method, subpixels=subpixels)
+            if profile is not None:
+                profile.add_fraction(fraction)
+                start = profile.lap('encloses', start)
+
+            weights = fraction
+            if masked is not None:
+                weights = _mirror_fraction(fraction, masked, moved, mirrors)
+                if profile is not None:
+                    start = profile.lap('mask', start)
 
             # Sum the flux in those pixels and assign it to the output array.
-            flux[j, i] = np.sum(subdata * fraction)
+            flux[j, i] = np.sum(subdata * weights)
+            if profile is not None:
+                start = profile.lap('sum', start)
 
-            if error is not None:  # If given, calculate error on flux.
+            if fluxerr is not None:  # If given, calculate error on flux.
 
                 # If pixelwise, we have to do this the slow way.
                 if pixelwise_errors:
-                    fluxvar = np.sum(subvariance * fraction)
+                    fluxvar = np.sum(subvariance * weights)
 
                 # Otherwise, assume error and gain are constant over whole
                 # aperture.
                 else:
-                    local_error = error[int(yc[i] + 0.5), int(xc[i] + 0.5)]
+                    # Pixel of the center, limited to be within the image.
+                    iy = min(max(int(yc[i] + 0.5), 0), data.shape[0] - 1)
+                    ix = min(max(int(xc[i] + 0.5), 0), data.shape[1] - 1)
+                    if variance is not None:
+                        local_var = variance[iy, ix]
+                    else:
+                        local_error = error[iy, ix]
+                        local_var = local_error ** 2
                     if hasattr(apertures[j, i], 'area'):
                         area = apertures[j, i].area()
                     else:
                         area = np.sum(fraction)
-                    fluxvar = local_error ** 2 * area
+                    fluxvar = local_var * area
                     if gain is not None:
-                        local_gain = gain[int(yc[i] + 0.5), int(xc[i] + 0.5)]
+                        local_gain = gain[iy, ix]
                         fluxvar += flux[j, i] / local_gain
 
                 # Make sure variance is > 0 when converting to st. dev.
                 fluxerr[j, i] = math.sqrt(max(fluxvar, 0.))
+                if profile is not None:
+                    start = profile.lap('errors', start)
+
+
+def _mirror_pixels(masked, submask, x_center, y_center):
+    """Masked pixels of a sub-array (flat indices ``masked``) whose mirror
+    across the object center (``x_center``, ``y_center``, relative to the
+    sub-array) is within the sub-array and not masked, and the flat indices
+    of these mirrors."""
+
+    ny, nx = submask.shape
+    y_masked, x_masked = np.divmod(masked, nx)
+    x_mirror = np.floor(2. * x_center - x_masked + 0.5).astype(np.intp)
+    y_mirror = np.floor(2. * y_center - y_masked + 0.5).astype(np.intp)
+    valid = ((x_mirror >= 0) & (x_mirror < nx) &
+             (y_mirror >= 0) & (y_mirror < ny))
+    mirrors = y_mirror[valid] * nx + x_mirror[valid]
+    unmasked = ~submask.ravel()[mirrors]
+    return masked[valid][unmasked], mirrors[unmasked]
+
+
+def _mirror_fraction(fraction, masked, moved, mirrors):
+    """Weights of the pixels of a sub-array such that the weighted sum of
+    the data equals that of ``fraction`` on the data in which the masked
+    pixels (flat indices ``masked``) are replaced by their mirrors
+    (``moved`` pixels, see `_mirror_pixels`) or by zero."""
+
+    weights = np.array(fraction, dtype=np.float64)
+    flat = weights.reshape(-1)
+    values = flat[moved]
+    flat[masked] = 0.
+    # Mirroring is one-to-one, so that no mirror appears twice.
+    flat[mirrors] += values
+    return weights
+
+
+def _check_apertures(apertures, n_obj):
+    """Check the ``apertures`` argument of `aperture_photometry` for
+    ``n_obj`` objects, and return it as a 2-d object array or
+    `ApertureArray`."""
+
+    if isinstance(apertures, ApertureArray):
+        apertures = apertures.atleast_2d()
+    else:
+        apertures = np.atleast_2d(apertures)
+    if apertures.ndim > 2:
+        raise ValueError('{0}-d aperture array not supported. '
+                         'Only 2-d arrays supported.'.format(apertures.ndim))
+    if not isinstance(apertures, ApertureArray):
+        for aperture in apertures.ravel():
+            if not isinstance(aperture, Aperture):
+                raise TypeError("'aperture' must be an instance of "
+                                "Aperture.")
+    if apertures.shape[1] not in [1, n_obj]:
+        raise ValueError("trailing dimension of 'apertures' must be 1 or "
+                         "match length of xc, yc")
+    return apertures
 
-    # If input coordinates were scalars, return scalars (if single aperture)
-    if scalar_obj_centers and n_aper == 1:
-        if error is None:
-            return flux[0, 0]
+
+def _broadcast_apertures(apertures, shape):
+    """Broadcast a 2-d object array or `ApertureArray` to ``shape``."""
+    if isinstance(apertures, ApertureArray):
+        return apertures.broadcast_to(shape)
+    return np.broadcast_to(apertures, shape)
+
+
+def _aperture_extents(apertures):
+    """Extents of ``apertures`` (an object array or `ApertureArray`), as an
+    array with a trailing dimension of 4."""
+    if isinstance(apertures, ApertureArray):
+        return apertures.extents()
+    extents = np.empty(apertures.shape + (4,), dtype=np.float64)
+    for index, aperture in np.ndenumerate(apertures):
+        extents[index] = aperture.extent()
+    return extents
+
+
+def _batch_parameters(apertures, data, error, gain, method, variance=None):
+    """Describe ``apertures`` (a 2-d object array or `ApertureArray`) for
+    the compiled engine
+    in `photutils.aperture_batch`.
+
+    Returns
+    -------
+    kinds, params, extents, areas : `~numpy.ndarray` or `None`
+        Arrays of aperture kinds, parameters, extents and areas, with the
+        shape of ``apertures`` (and a trailing dimension for ``params``
+        and ``extents``), or `None` if the engine cannot be used.
+    """
+
+    from .aperture_batch import (METHODS, NPARAMS, CIRCULAR,
+                                 CIRCULAR_ANNULUS, ELLIPTICAL,
+                                 ELLIPTICAL_ANNULUS)
+
+    if method not in tuple(METHODS):
+        return None
+
+    # The engine works in double precision, which matches the loop for
+    # data of any real type up to double precision, and for
+    # double-precision error, gain and variance arrays. (The arrays are not
+    # checked if `None`.)
+    if data is not None and (data.dtype.kind not in 'biuf' or
+                             data.dtype.itemsize > 8):
+        return None
+    for array in (error, gain, variance):
+        if array is not None and array.dtype != np.float64:
+            return None
+
+    if isinstance(apertures, ApertureArray):
+        # As for the aperture instances, only the exact types are used.
+        kind = {CircularApertureArray: CIRCULAR,
+                CircularAnnulusArray: CIRCULAR_ANNULUS,
+                EllipticalApertureArray: ELLIPTICAL,
+                EllipticalAnnulusArray: ELLIPTICAL_ANNULUS
+                }.get(type(apertures))
+        if kind is None:
+            return None
+        return (np.full(apertures.shape, kind, dtype=np.intc),
+                apertures._engine_params(NPARAMS), apertures.extents(),
+                apertures.areas())
+
+    kinds = np.empty(apertures.shape, dtype=np.intc)
+    params = np.zeros(apertures.shape + (NPARAMS,), dtype=np.float64)
+    extents = np.empty(apertures.shape + (4,), dtype=np.float64)
+    areas = np.empty(apertures.shape, dtype=np.float64)
+
+    for index, aperture in np.ndenumerate(apertures):
+        # Subclasses may redefine `encloses`, so only exact types are used.
+        aperture_type = type(aperture)
+        if aperture_type is CircularAperture:
+            kinds[index] = CIRCULAR
+            params[index][:1] = aperture.r
+        elif aperture_type is CircularAnnulus:
+            kinds[index] = CIRCULAR_ANNULUS
+            params[index][:2] = aperture.r_in, aperture.r_out
+        elif aperture_type is EllipticalAperture:
+            kinds[index] = ELLIPTICAL
+            params[index][:3] = aperture.a, aperture.b, aperture.theta
+        elif aperture_type is EllipticalAnnulus:
+            kinds[index] = ELLIPTICAL_ANNULUS
+            params[index][:5] = (aperture.a_in, aperture.b_in,
+                                 aperture.a_out, aperture.b_out,
+                                 aperture.theta)
         else:
-            return flux[0, 0], fluxerr[0, 0]
+            return None
+        extents[index] = aperture.extent()
+        areas[index] = aperture.area()
 
-    # If we only had a single aperture per object, we can return 1-d arrays
-    if n_aper == 1:
-        if error is None:
-            return flux[0]
+    return kinds, params, extents, areas
+
+
+def _batch_bounds(xc, yc, extents, shape):
+    """Sub-array bounds (x_min, x_max, y_min, y_max) of the objects, as
+    computed by `_photometry_loop`, for an image of the given shape.
+
+    Objects whose sub-array is entirely outside the image get (0, 0, 0, 0)
+    and the others are limited to be within the image. Returns `None` if
+    the bounds cannot be represented as integers.
+    """
+
+    # Set array index extents to encompass all apertures for each object,
+    # truncating towards zero like int().
+    bounds = np.empty((len(xc), 4), dtype=np.float64)
+    bounds[:, 0] = xc + extents[:, :, 0].min(axis=0) + 0.5
+    bounds[:, 1] = xc + extents[:, :, 1].max(axis=0) + 1.5
+    bounds[:, 2] = yc + extents[:, :, 2].min(axis=0) + 0.5
+    bounds[:, 3] = yc + extents[:, :, 3].max(axis=0) + 1.5
+    with np.errstate(invalid='ignore'):
+        if not np.all(np.abs(bounds) < 2. ** 62):
+            return None
+    bounds = np.trunc(bounds).astype(np.intp)
+
+    outside = ((bounds[:, 0] >= shape[1]) | (bounds[:, 1] <= 0) |
+               (bounds[:, 2] >= shape[0]) | (bounds[:, 3] <= 0))
+    np.clip(bounds[:, :2], 0, shape[1], out=bounds[:, :2])
+    np.clip(bounds[:, 2:], 0, shape[0], out=bounds[:, 2:])
+    bounds[outside] = 0
+    return bounds
+
+
+def _engine_fractions(kinds, params, xc, yc, bounds, method, subpixels):
+    """Fraction arrays of the sub-arrays (see `_batch_bounds`) of one
+    aperture of each object, computed by the compiled engine and stored
+    one after the other (in C order) in a 1-d array."""
+
+    from .aperture_batch import METHODS, fraction_masks
+
+    shapes = np.empty((len(xc), 2), dtype=np.intp)
+    shapes[:, 0] = bounds[:, 3] - bounds[:, 2]
+    shapes[:, 1] = bounds[:, 1] - bounds[:, 0]
+    sizes = shapes[:, 0] * shapes[:, 1]
+    offsets = np.zeros(len(xc), dtype=np.intp)
+    np.cumsum(sizes[:-1], out=offsets[1:])
+    edges = np.empty((len(xc), 4), dtype=np.float64)
+    edges[:, 0] = bounds[:, 0] - xc - 0.5
+    edges[:, 1] = bounds[:, 1] - xc - 0.5
+    edges[:, 2] = bounds[:, 2] - yc - 0.5
+    edges[:, 3] = bounds[:, 3] - yc - 0.5
+    bank = np.zeros(sizes.sum(), dtype=np.float64)
+    fraction_masks(np.ascontiguousarray(kinds), np.ascontiguousarray(params),
+                   edges, shapes, METHODS[method], subpixels, bank, offsets)
+    return bank
+
+
+def _loop_fractions(apertures, xc, yc, bounds, method, subpixels, areas):
+    """Same as `_engine_fractions` with the `encloses` methods of the
+    apertures, also filling ``areas`` as `_photometry_loop` computes
+    them."""
+
+    bank = []
+    for i, aperture in enumerate(apertures):
+        x_min, x_max, y_min, y_max = bounds[i]
+        if x_max == 0:
+            continue  # Entirely outside the image.
+        fraction = aperture.encloses(x_min - xc[i] - 0.5, x_max - xc[i] - 0.5,
+                                     y_min - yc[i] - 0.5, y_max - yc[i] - 0.5,
+                                     x_max - x_min, y_max - y_min,
+                                     method=method, subpixels=subpixels)
+        fraction = np.asarray(fraction, dtype=np.float64).ravel()
+        if hasattr(aperture, 'area'):
+            areas[i] = aperture.area()
         else:
-            return flux[0], fluxerr[0]
+            areas[i] = np.sum(fraction)
+        bank.append(fraction)
+    if not bank:
+        return np.zeros(0)
+    return np.concatenate(bank)
+
+
+def _bank_pixels(bounds, shape):
+    """Flattened image indices of the pixels of the sub-arrays stored by
+    `_engine_fractions`, and the object each of them belongs to."""
+
+    nx = bounds[:, 1] - bounds[:, 0]
+    sizes = nx * (bounds[:, 3] - bounds[:, 2])
+    entries = np.repeat(np.arange(len(bounds)), sizes)
+    offsets = np.zeros(len(bounds), dtype=np.intp)
+    np.cumsum(sizes[:-1], out=offsets[1:])
+    local = np.arange(sizes.sum()) - offsets[entries]
+    row = local // nx[entries]
+    pixels = ((bounds[entries, 2] + row) * shape[1] + bounds[entries, 0] +
+              local - row * nx[entries])
+    return pixels, entries
+
+
+def _photometry_batch(data, xc, yc, shape, batch, error, gain, method,
+                      subpixels, pixelwise_errors, flux, fluxerr, n_jobs=1,
+                      executor=None, cache=False, phase_tolerance=None,
+                      phase_interpolation='bilinear', prefix_sums=False,
+                      variance=None, profile=None, shared_apertures=True):
+    """Fill ``flux`` and ``fluxerr`` (see `aperture_photometry`) with the
+    compiled engine, giving the same results as `_photometry_loop`.
+
+    If ``n_jobs`` > 1 or an ``executor`` is given, the objects are split
+    into chunks that are run in threads. Each chunk writes its own columns
+    of the outputs, so the results do not depend on the chunking.
+
+    ``cache`` is True (for `fraction_cache`), False or a `FractionCache`.
+    If ``phase_tolerance`` is given, the fraction arrays are interpolated
+    from banks of precomputed arrays, and if ``prefix_sums`` is True or a
+    `PrefixSums`, the fluxes are summed from cumulative sums along rows
+    (see `aperture_photometry`). The stages are timed with ``profile`` (a
+    `PhotometryProfile` or `None`). If ``shared_apertures`` is False, a
+    single column of apertures belongs to a single object (a group of
+    per-object apertures), so they are not taken as concentric circles
+    shared by all objects.
+
+    Returns `None` (leaving the outputs untouched) if the sub-array bounds
+    of the objects cannot be represented as integers.
+    """
 
-    # Otherwise, return 2-d array
-    if error is None:
-        return flux
+    from .aperture_batch import METHODS, CIRCULAR, batch_photometry, \
+        growth_photometry, phase_photometry, prefix_photometry
+
+    if profile is not None:
+        start = _clock()
+    kinds, params, extents, areas = [np.broadcast_to(array,
+                                                     shape + array.shape[2:])
+                                     for array in batch]
+    xc = xc.astype(np.float64)
+    yc = yc.astype(np.float64)
+
+    bounds = _batch_bounds(xc, yc, extents, data.shape)
+    if bounds is None:
+        return None
+    outside = bounds[:, 1] == 0
+    if profile is not None:
+        start = profile.lap('extent', start)
+
+    if method == 'subpixel':
+        subpixels = int(subpixels)
     else:
-        return flux, fluxerr
+        subpixels = 1
+
+    fluxvar = None
+    if pixelwise_errors:
+        fluxvar = np.zeros(shape, dtype=np.float64)
+
+    data = np.asarray(data, dtype=np.float64)
+    if not pixelwise_errors:
+        error_pix = gain_pix = variance_pix = None
+    else:
+        error_pix, gain_pix, variance_pix = error, gain, variance
+
+    # Concentric circles shared by all objects (e.g., for growth curves)
+    # are done in a single pass over the pixels of each object, in order
+    # of increasing radius.
+    if prefix_sums is None:
+        prefix_sums = False
+    radii = None
+    if (phase_tolerance is None and prefix_sums is False and
+            shared_apertures and batch[0].shape == (shape[0], 1) and
+            shape[0] > 1 and np.all(batch[0] == CIRCULAR) and
+            np.all(batch[1][:, 0, 0] >= 0.)):
+        order = np.argsort(batch[1][:, 0, 0], kind='mergesort')
+        radii = batch[1][order, 0, 0]
+        flux_out, fluxvar_out = flux, fluxvar
+        flux = np.empty(shape, dtype=np.float64)
+        if fluxvar is not None:
+            fluxvar = np.empty(shape, dtype=np.float64)
+
+    if profile is not None:
+        start = profile.lap('setup', start)
+
+    # Build the variance image once if the sub-arrays of all apertures
+    # cover more pixels than the image, rather than squaring the errors
+    # (and dividing by the gain) of the same pixels several times.
+    if (error_pix is not None and prefix_sums is False and
+            _covered_pixels(bounds) * (1 if radii is not None else shape[0])
+            > data.size):
+        variance_pix = error_pix * error_pix
+        if gain_pix is not None:
+            variance_pix += data / gain_pix
+        error_pix = gain_pix = None
+    if profile is not None:
+        start = profile.lap('errors', start)
+
+    if cache is True:
+        cache = fraction_cache
+    bank = offsets = None
+    if prefix_sums is not False:
+        if not isinstance(prefix_sums, PrefixSums):
+            prefix_sums = PrefixSums(data, error_pix, gain_pix,
+                                     variance=variance_pix)
+        if fluxvar is not None and prefix_sums.variance is None:
+            raise ValueError('prefix_sums must include the variance for '
+                             'pixelwise errors')
+    elif phase_tolerance is not None:
+        index, bank, offsets, nphase, half = _phase_banks(
+            kinds, params, extents, phase_tolerance,
+            phase_interpolation == 'bilinear')
+    elif (radii is None and cache is not None and cache is not False and
+            cache.max_bytes > 0):
+        banked = _cached_fractions(cache, kinds, params, bounds, xc, yc,
+                                   METHODS[method], subpixels)
+        if banked is not None:
+            bank, offsets = banked
+    if profile is not None:
+        start = profile.lap('encloses', start)
+
+    # Pixel counts (full, empty, boundary) of each chunk, if profiled.
+    counts = []
+
+    def run_chunk(chunk):
+        if prefix_sums is not False:
+            prefix_photometry(data, error_pix, gain_pix, prefix_sums.data,
+                              None if fluxvar is None else
+                              prefix_sums.variance, xc[chunk], yc[chunk],
+                              kinds[:, chunk], params[:, chunk],
+                              bounds[chunk], METHODS[method], flux[:, chunk],
+                              None if fluxvar is None else fluxvar[:, chunk],
+                              variance=variance_pix)
+            # The cumulative sums skip non-finite values, which must give
+            # the same results as the other kernels for these objects.
+            redo = np.arange(shape[1])[chunk]
+            redo = redo[prefix_sums._nonfinite_objects(bounds[redo])]
+            if len(redo) > 0:
+                redo_flux = np.empty((shape[0], len(redo)))
+                redo_fluxvar = (None if fluxvar is None else
+                                np.empty((shape[0], len(redo))))
+                batch_photometry(data, error_pix, gain_pix, xc[redo],
+                                 yc[redo], kinds[:, redo], params[:, redo],
+                                 bounds[redo], METHODS[method], 1,
+                                 redo_flux, redo_fluxvar,
+                                 variance=variance_pix)
+                flux[:, redo] = redo_flux
+                if fluxvar is not None:
+                    fluxvar[:, redo] = redo_fluxvar
+            return
+        if radii is not None:
+            growth_photometry(data, error_pix, gain_pix, xc[chunk],
+                              yc[chunk], radii, bounds[chunk],
+                              METHODS[method], subpixels, flux[:, chunk],
+                              None if fluxvar is None else fluxvar[:, chunk],
+                              variance=variance_pix)
+            return
+        if phase_tolerance is not None:
+            phase_photometry(data, error_pix, gain_pix, xc[chunk], yc[chunk],
+                             index[:, chunk], bank, offsets, nphase, half,
+                             phase_interpolation == 'bilinear',
+                             flux[:, chunk],
+                             None if fluxvar is None else fluxvar[:, chunk],
+                             variance=variance_pix)
+            return
+        chunk_counts = None
+        if profile is not None:
+            chunk_counts = np.zeros(3, dtype=np.int64)
+            counts.append(chunk_counts)
+        batch_photometry(data, error_pix, gain_pix, xc[chunk], yc[chunk],
+                         kinds[:, chunk], params[:, chunk], bounds[chunk],
+                         METHODS[method], subpixels, flux[:, chunk],
+                         None if fluxvar is None else fluxvar[:, chunk],
+                         bank=bank,
+                         offsets=None if offsets is None else
+                         offsets[:, chunk], variance=variance_pix,
+                         counts=chunk_counts)
+
+    if executor is None and n_jobs == 1:
+        run_chunk(slice(None))
+    else:
+        chunks = _object_chunks(shape[1], n_jobs)
+        if executor is not None:
+            list(executor.map(run_chunk, chunks))
+        else:
+            pool = ThreadPool(n_jobs)
+            try:
+                pool.map(run_chunk, chunks)
+            finally:
+                # All chunks are done once map returns. Joining would wait
+                # for the polling interval of the pool's handler threads.
+                pool.close()
+    if profile is not None:
+        start = profile.lap('engine', start)
+        if prefix_sums is not False:
+            path = 'prefix'
+        elif radii is not None:
+            path = 'growth'
+        elif phase_tolerance is not None:
+            path = 'phase'
+        else:
+            path = 'batch'
+        profile.add_path(path, int(np.count_nonzero(~outside)))
+        if counts:
+            profile.add_pixels(*np.sum(counts, axis=0))
+
+    if radii is not None:
+        flux_out[order] = flux
+        flux = flux_out
+        if fluxvar is not None:
+            fluxvar_out[order] = fluxvar
+            fluxvar = fluxvar_out
+
+    if fluxerr is not None:
+        inside = ~outside
+        if pixelwise_errors:
+            fluxvar = fluxvar[:, inside]
+        else:
+            # Assume error and gain are constant over whole aperture, using
+            # scalar (libm) powers as the loop does, at the pixel of the
+            # center limited to be within the image.
+            iy = np.clip(np.trunc(yc[inside] + 0.5), 0,
+                         data.shape[0] - 1).astype(np.intp)
+            ix = np.clip(np.trunc(xc[inside] + 0.5), 0,
+                         data.shape[1] - 1).astype(np.intp)
+            if variance is not None:
+                local_var = variance[iy, ix]
+            else:
+                local_error = error[iy, ix]
+                local_var = np.power(local_error,
+                                     np.full_like(local_error, 2.))
+            fluxvar = local_var * areas[:, inside]
+            if gain is not None:
+                fluxvar += flux[:, inside] / gain[iy, ix]
+
+        # Make sure variance is > 0 when converting to st. dev.
+        fluxerr[:, inside] = np.sqrt(np.where(0. > fluxvar, 0., fluxvar))
+    if profile is not None:
+        profile.lap('errors', start)
+
+    return flux, fluxerr
+
+
+def _covered_pixels(bounds):
+    """Total number of pixels of the sub-arrays of the objects (see
+    `_batch_bounds`)."""
+    return int(np.sum((bounds[:, 1] - bounds[:, 0]) *
+                      (bounds[:, 3] - bounds[:, 2])))
+
+
+def _phase_banks(kinds, params, extents, tolerance, bilinear):
+    """Gather the banks of fraction arrays on grids of sub-pixel phases of
+    the distinct apertures, for `aperture_batch.phase_photometry`.
+
+    Returns
+    -------
+    index : `~numpy.ndarray` (int)
+        (N_apertures, N_objects) array giving the distinct aperture used
+        by each aperture of each object.
+    bank : `~numpy.ndarray` (float)
+        1-d array holding the banks of all distinct apertures.
+    offsets, nphase, half : `~numpy.ndarray` (int)
+        Offset in ``bank``, phase resolution and half-size of the window
+        of each distinct aperture.
+    """
+
+    from .aperture_batch import NPARAMS
+
+    n_aper, n_obj = kinds.shape
+    keys = np.empty((n_aper, n_obj, NPARAMS + 2), dtype=np.float64)
+    keys[:, :, 0] = kinds
+    keys[:, :, 1:NPARAMS + 1] = params
+    keys[:, :, NPARAMS + 1] = np.abs(extents).max(axis=2)
+    keys = keys.reshape((n_aper * n_obj, -1))
+    distinct, inverse = _unique_rows(keys)
+
+    banks = []
+    prefix = np.array([tolerance, bilinear], dtype=np.float64).tobytes()
+    for key in keys[distinct]:
+        cache_key = prefix + key.tobytes()
+        bank = phase_bank_cache.get(cache_key)
+        if bank is None:
+            bank = _phase_bank(int(key[0]), key[1:NPARAMS + 1],
+                               key[NPARAMS + 1], tolerance, bilinear)
+            phase_bank_cache.put(cache_key, bank)
+        banks.append(bank)
+
+    nphase = np.array([bank.shape[0] - 1 for bank in banks], dtype=np.intc)
+    half = np.array([bank.shape[2] // 2 for bank in banks], dtype=np.intc)
+    offsets = np.zeros(len(banks), dtype=np.intp)
+    np.cumsum([bank.size for bank in banks[:-1]], out=offsets[1:])
+    bank = np.concatenate([bank.ravel() for bank in banks])
+
+    return (inverse.reshape((n_aper, n_obj)), bank, offsets, nphase, half)
+
+
+def _phase_bank(kind, params, radius, tolerance, bilinear, n_phase=8,
+                n_test=64, max_bytes=256 * 1024 ** 2):
+    """Fraction arrays of an aperture on a grid of sub-pixel phases.
+
+    The resolution of the grid starts at ``n_phase`` and is doubled until
+    the interpolated fraction arrays at ``n_test`` test phases (midpoints
+    of grid cells, where the interpolation error is largest) differ from
+    the exact ones by at most half of ``tolerance`` (sum of absolute
+    differences over pixels, relative to the aperture area).
+
+    Returns
+    -------
+    bank : `~numpy.ndarray`
+        (n + 1, n + 1, w, w) array of the fraction arrays of the window of
+        w = 2 * half + 1 pixels around the pixel containing the center,
+        for phases (a / n, b / n) (see `aperture_batch.phase_photometry`).
+    """
+
+    half = int(np.ceil(radius))
+    width = 2 * half + 1
+    area = _phase_fractions(kind, params, half, np.array([0.]),
+                            np.array([0.])).sum()
+    rng = np.random.RandomState(0)
+
+    while True:
+        if (n_phase + 1) ** 2 * width ** 2 * 8 > max_bytes:
+            raise ValueError('phase_tolerance {0} is too small: use a '
+                             'larger tolerance, or bilinear interpolation'
+                             .format(tolerance))
+        phases = np.arange(n_phase + 1) / float(n_phase)
+        fx, fy = np.meshgrid(phases, phases)
+        bank = _phase_fractions(kind, params, half, fx.ravel(), fy.ravel())
+        bank = bank.reshape((n_phase + 1, n_phase + 1, width, width))
+
+        # Interpolate at the midpoints of randomly chosen grid cells.
+        a = rng.randint(n_phase, size=n_test)
+        b = rng.randint(n_phase, size=n_test)
+        exact = _phase_fractions(kind, params, half,
+                                 (a + 0.5) / n_phase,
+                                 (b + 0.5) / n_phase)
+        if bilinear:
+            approx = 0.25 * (bank[b, a] + bank[b, a + 1] +
+                             bank[b + 1, a] + bank[b + 1, a + 1])
+        else:
+            approx = bank[b, a]
+        error = np.abs(approx - exact).sum(axis=(1, 2)).max()
+        if area == 0. or error <= 0.5 * tolerance * area:
+            return bank
+        n_phase *= 2
+
+
+def _phase_fractions(kind, params, half, fx, fy):
+    """Exact fraction arrays of the window of 2 * half + 1 pixels around the
+    pixel containing the center, for centers at phases (fx, fy)."""
+
+    from .aperture_batch import METHODS, fraction_masks
+
+    n = len(fx)
+    width = 2 * half + 1
+    edges = np.empty((n, 4), dtype=np.float64)
+    edges[:, 0] = -half - fx
+    edges[:, 1] = half + 1 - fx
+    edges[:, 2] = -half - fy
+    edges[:, 3] = half + 1 - fy
+    bank = np.zeros(n * width * width, dtype=np.float64)
+    fraction_masks(np.repeat(np.intc(kind), n),
+                   np.repeat(params[np.newaxis], n, axis=0), edges,
+                   np.repeat([[width, width]], n, axis=0).astype(np.intp),
+                   METHODS['exact'], 1, bank,
+                   np.arange(n, dtype=np.intp) * width * width)
+    return bank.reshape((n, width, width))
+
+
+def _cached_fractions(cache, kinds, params, bounds, xc, yc, method,
+                      subpixels, min_keys=1000, n_sample=1024):
+    """Gather the fraction arrays of all apertures of all objects in a
+    single bank (see `aperture_batch.batch_photometry`), computing each
+    distinct array only once and reusing those found in ``cache``.
+
+    For calls with more than ``min_keys`` apertures, the cache is only
+    worth its overhead if, in a sample of ``n_sample`` apertures, at
+    least half of the fraction arrays are repeated or are already in the
+    cache. Otherwise `None` is returned, and the fraction arrays should be
+    computed by the engine.
+
+    Returns
+    -------
+    bank : `~numpy.ndarray`
+        1-d array holding the distinct fraction arrays.
+    offsets : `~numpy.ndarray`
+        (N_apertures, N_objects) array of the offsets of the fraction
+        array of each aperture in ``bank``.
+    """
+
+    from .aperture_batch import NPARAMS, fraction_masks
+
+    n_aper, n_obj = kinds.shape
+    prefix = np.array([method, subpixels], dtype=np.float64).tobytes()
+
+    if n_aper * n_obj > min_keys:
+        sample = np.linspace(0, n_aper * n_obj - 1, n_sample).astype(np.intp)
+        keys = _fraction_keys(kinds, params, bounds, xc, yc, sample)
+        index = _unique_rows(keys)[0]
+        if 2 * len(index) > n_sample:
+            n_cached = sum(prefix + key.tobytes() in cache
+                           for key in keys[index])
+            if 2 * n_cached < len(index):
+                return None
+
+    keys = _fraction_keys(kinds, params, bounds, xc, yc)
+    index, inverse = _unique_rows(keys)
+    keys = keys[index]
+    shapes = keys[:, -2:].astype(np.intp)
+    sizes = shapes[:, 0] * shapes[:, 1]
+    unique_offsets = np.zeros(len(index), dtype=np.intp)
+    np.cumsum(sizes[:-1], out=unique_offsets[1:])
+    bank = np.empty(sizes.sum(), dtype=np.float64)
+
+    # Copy the arrays found in the cache, and compute the others.
+    cache_keys = [prefix + key.tobytes() for key in keys]
+    missing = []
+    for n, key in enumerate(cache_keys):
+        if sizes[n] == 0:
+            continue
+        array = cache.get(key)
+        if array is None:
+            missing.append(n)
+        else:
+            bank[unique_offsets[n]:unique_offsets[n] + sizes[n]] = array
+    if missing:
+        fraction_masks(keys[missing, 0].astype(np.intc),
+                       keys[missing, 1:NPARAMS + 1],
+                       keys[missing, NPARAMS + 1:NPARAMS + 5],
+                       shapes[missing], method, subpixels, bank,
+                       unique_offsets[missing])
+        for n in missing:
+            cache.put(cache_keys[n],
+                      bank[unique_offsets[n]:unique_offsets[n] +
+                           sizes[n]].copy())
+
+    return bank, unique_offsets[inverse].reshape((n_aper, n_obj))
+
+
+def _fraction_keys(kinds, params, bounds, xc, yc, select=None):
+    """Everything the fraction array of each aperture depends on: kind,
+    parameters, edges of the sub-array relative to the object center (as
+    computed by the engine) and shape (ny, nx) of the sub-array.
+
+    Returns a 2-d float array with a row for each aperture of each object
+    (in C order), or for the apertures at the flat indices ``select``.
+    """
+
+    from .aperture_batch import NPARAMS
+
+    per_object = np.empty((len(xc), 6), dtype=np.float64)
+    per_object[:, 0] = bounds[:, 0] - xc - 0.5
+    per_object[:, 1] = bounds[:, 1] - xc - 0.5
+    per_object[:, 2] = bounds[:, 2] - yc - 0.5
+    per_object[:, 3] = bounds[:, 3] - yc - 0.5
+    per_object[:, 4] = bounds[:, 3] - bounds[:, 2]
+    per_object[:, 5] = bounds[:, 1] - bounds[:, 0]
+
+    if select is None:
+        keys = np.empty(kinds.shape + (NPARAMS + 7,), dtype=np.float64)
+        keys[:, :, 0] = kinds
+        keys[:, :, 1:NPARAMS + 1] = params
+        keys[:, :, NPARAMS + 1:] = per_object
+        return keys.reshape((kinds.size, NPARAMS + 7))
+
+    j, i = np.unravel_index(select, kinds.shape)
+    return np.column_stack([kinds[j, i], params[j, i], per_object[i]])
+
+
+def _unique_rows(array):
+    """Find the distinct rows of a 2-d float array, compared bitwise.
+
+    Returns
+    -------
+    index : `~numpy.ndarray` (int)
+        Index of a row of ``array`` for each distinct row.
+    inverse : `~numpy.ndarray` (int)
+        Index in ``index`` of each row of ``array``.
+    """
+
+    # Hash the rows (FNV-1a on 64-bit words), and check for collisions.
+    bits = np.ascontiguousarray(array).view(np.uint64)
+    hashes = np.empty(len(bits), dtype=np.uint64)
+    hashes.fill(np.uint64(14695981039346656037))
+    for column in bits.T:
+        hashes ^= column
+        hashes *= np.uint64(1099511628211)
+    index, inverse = np.unique(hashes, return_index=True,
+                               return_inverse=True)[1:]
+
+    # Rows that collide with another row are kept on their own.
+    collisions = np.nonzero(np.any(bits[index][inverse] != bits, axis=1))[0]
+    if len(collisions) > 0:
+        inverse[collisions] = len(index) + np.arange(len(collisions))
+        index = np.concatenate([index, collisions])
+
+    return index, inverse
+
+
+def _object_chunks(n_obj, n_jobs, per_job=4):
+    """Split ``n_obj`` objects into slices, giving each of ``n_jobs``
+    workers several chunks so that they stay busy when some objects are
+    more expensive than others."""
+    n_chunks = max(min(n_obj, n_jobs * per_job), 1)
+    edges = np.linspace(0, n_obj, n_chunks + 1).astype(int)
+    return [slice(start, stop) for start, stop in zip(edges[:-1], edges[1:])]
 
 
 def aperture_circular(data, xc, yc, r, error=None, gain=None, mask=None,
@@ -703,15 +2777,10 @@ def aperture_circular(data, xc, yc, r, error=None, gain=None, mask=None,
     --------
     aperture_photometry
     """
-    r = np.asarray(r)
-    if r.ndim > 0:
-        apertures = np.empty(r.shape, dtype=object)
-        for index in np.ndindex(*r.shape):
-            apertures[index] = CircularAperture(r[index])
-    else:
-        apertures = CircularAperture(r)
+    apertures = CircularApertureArray(r)
     return aperture_photometry(data, xc, yc, apertures, error=error,
-                               gain=gain, mask=mask, subpixels=subpixels,
+                               gain=gain, mask=mask, method=method,
+                               subpixels=subpixels,
                                pixelwise_errors=pixelwise_errors)
 
 
@@ -803,15 +2872,10 @@ def aperture_elliptical(data, xc, yc, a, b, theta, error=None, gain=None,
     aperture_photometry
     """
 
-    a, b, theta = np.broadcast_arrays(a, b, theta)
-    if a.ndim > 0:
-        apertures = np.empty(a.shape, dtype=object)
-        for index in np.ndindex(*a.shape):
-            apertures[index] = EllipticalAperture(a[index], b[index], theta[index])
-    else:
-        apertures = EllipticalAperture(a, b, theta)
+    apertures = EllipticalApertureArray(a, b, theta)
     return aperture_photometry(data, xc, yc, apertures, error=error,
-                               gain=gain, mask=mask, subpixels=subpixels,
+                               gain=gain, mask=mask, method=method,
+                               subpixels=subpixels,
                                pixelwise_errors=pixelwise_errors)
 
 
@@ -902,15 +2966,10 @@ def annulus_circular(data, xc, yc, r_in, r_out, error=None, gain=None,
     aperture_photometry
     """
 
-    r_in, r_out = np.broadcast_arrays(r_in, r_out)
-    if r_in.ndim > 0:
-        apertures = np.empty(r_in.shape, dtype=object)
-        for index in np.ndindex(*r_in.shape):
-            apertures[index] = CircularAnnulus(r_in[index], r_out[index])
-    else:
-        apertures = CircularAnnulus(r_in, r_out)
+    apertures = CircularAnnulusArray(r_in, r_out)
     return aperture_photometry(data, xc, yc, apertures, error=error,
-                               gain=gain, mask=mask, subpixels=subpixels,
+                               gain=gain, mask=mask, method=method,
+                               subpixels=subpixels,
                                pixelwise_errors=pixelwise_errors)
 
 
@@ -1002,15 +3061,8 @@ def annulus_elliptical(data, xc, yc, a_in, a_out, b_out, theta,
     aperture_photometry
     """
 
-    a_in, a_out, b_out, theta = \
-        np.broadcast_arrays(a_in, a_out, b_out, theta)
-    if a_in.ndim > 0:
-        apertures = np.empty(a_in.shape, dtype=object)
-        for index in np.ndindex(*a_in.shape):
-            apertures[index] = EllipticalAnnulus(a_in[index], a_out[index],
-                                                 b_out[index], theta[index])
-    else:
-        apertures = EllipticalAnnulus(a_in, a_out, b_out, theta)
+    apertures = EllipticalAnnulusArray(a_in, a_out, b_out, theta)
     return aperture_photometry(data, xc, yc, apertures, error=error,
-                               gain=gain, mask=mask, subpixels=subpixels,
+                               gain=gain, mask=mask, method=method,
+                               subpixels=subpixels,
                                pixelwise_errors=pixelwise_errors)
@@ -0,0 +1,1463 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+
+# Compiled engine that performs aperture photometry for many objects and
+# apertures in a single call, without going through Python for each object.
+#
+# The fraction of each pixel covered by an aperture is computed with the
+# same kernels, and the same arithmetic, as the `encloses` methods of the
+# built-in aperture classes. It is written into a scratch buffer that is
+# reused for every aperture, and the weighted sums use the same pairwise
+# summation as `numpy.sum`, so that the results are identical to those of
+# the per-object loop in `aperture_photometry`.
+
+from __future__ import division
+import numpy as np
+cimport numpy as np
+cimport cython
+
+from libc.math cimport sin, cos, floor, ceil, sqrt, isfinite
+from libc.stdlib cimport malloc, free
+from libc.string cimport memset
+
+from photutils.circular_overlap cimport _circular_overlap_grid, \
+    _circular_annulus_overlap_grid, _overlap_single_exact, \
+    _overlap_single_subpixel
+from photutils.elliptical_exact cimport _elliptical_overlap_grid, \
+    _elliptical_annulus_overlap_grid, _elliptical_half_widths, \
+    _elliptical_element_class, _elliptical_overlap_single
+
+DTYPE = np.float64
+ctypedef np.float64_t DTYPE_t
+
+# Number of parameters stored per aperture (see `ApertureKind`).
+cdef enum:
+    _NPARAMS = 5
+NPARAMS = _NPARAMS
+
+
+# A circle or an ellipse on the pixel grid of an object, for the 'exact'
+# method of `prefix_photometry` (see `_exact_outlines`).
+ctypedef struct _Outline:
+    bint ellipse
+    # Circles: radius, and the grid as in _circular_overlap_grid.
+    double r, x_lo, y_lo, dx, dy, pixrad
+    # Ellipses: axes, position angle, bounding box half-widths, ordinate
+    # of the rightmost point and pixel edges.
+    double a, b, theta, cos_m_theta, sin_m_theta, x_half, y_half, y_right
+    const double* xs
+    const double* ys
+
+
+# Kinds of aperture known to the engine. The parameters of each kind are
+# stored in this order:
+#
+#   CIRCULAR            r
+#   CIRCULAR_ANNULUS    r_in, r_out
+#   ELLIPTICAL          a, b, theta
+#   ELLIPTICAL_ANNULUS  a_in, b_in, a_out, b_out, theta
+cpdef enum ApertureKind:
+    CIRCULAR = 0
+    CIRCULAR_ANNULUS = 1
+    ELLIPTICAL = 2
+    ELLIPTICAL_ANNULUS = 3
+
+
+# Methods for determining the overlap of apertures and pixels.
+cpdef enum Method:
+    CENTER = 0
+    SUBPIXEL = 1
+    EXACT = 2
+
+
+METHODS = {'center': CENTER, 'subpixel': SUBPIXEL, 'exact': EXACT}
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+def batch_photometry(const double[:, :] data, error, gain,
+                     const double[:] xc, const double[:] yc,
+                     const int[:, :] kinds, const double[:, :, :] params,
+                     const Py_ssize_t[:, :] bounds, int method, int subpixels,
+                     double[:, :] flux, double[:, :] fluxvar,
+                     const double[:] bank=None,
+                     const Py_ssize_t[:, :] offsets=None, variance=None,
+                     counts=None):
+    """Sum flux (and variance) within apertures for many objects at once.
+
+    Parameters
+    ----------
+    data : `~numpy.ndarray` (float)
+        The 2-d array on which to perform photometry.
+    error, gain : `~numpy.ndarray` (float) or `None`
+        Arrays with the same shape as ``data`` (they may be broadcast
+        views). If ``error`` is given, the variance of each pixel is
+        summed within the apertures. ``gain`` requires ``error``.
+    xc, yc : `~numpy.ndarray` (float)
+        Object centers, of length N_objects.
+    kinds : `~numpy.ndarray` (int)
+        (N_apertures, N_objects) array of `ApertureKind` values.
+    params : `~numpy.ndarray` (float)
+        (N_apertures, N_objects, NPARAMS) array of aperture parameters.
+    bounds : `~numpy.ndarray` (int)
+        (N_objects, 4) array giving the x_min, x_max, y_min, y_max
+        indices of the sub-array of ``data`` used for each object. Objects
+        with x_min >= x_max are skipped.
+    method : int
+        A `Method` value.
+    subpixels : int
+        Subsampling factor for the subpixel method.
+    flux, fluxvar : `~numpy.ndarray` (float)
+        (N_apertures, N_objects) output arrays. ``fluxvar`` is only filled
+        if ``error`` is not `None`.
+    bank, offsets : `~numpy.ndarray` or `None`, optional
+        Precomputed fraction arrays (see `fraction_masks`): if given, the
+        fraction array of aperture j of object i is the C-ordered array
+        of the size of the object's sub-array starting at
+        ``bank[offsets[j, i]]``, and the kinds and parameters of the
+        apertures are not used.
+    variance : `~numpy.ndarray` (float) or `None`, optional
+        Variance of each pixel, summed instead of that computed from
+        ``error`` and ``gain`` (which must then be `None`).
+    counts : `~numpy.ndarray` (int64) or `None`, optional
+        If given, the numbers of pixels of the fraction arrays that are
+        fully covered (fraction of 1), not covered (0) and on the boundary
+        of an aperture are added to its 3 elements.
+    """
+
+    cdef int n_aper = kinds.shape[0]
+    cdef Py_ssize_t n_obj = kinds.shape[1]
+    cdef bint has_variance = variance is not None
+    cdef bint has_error = error is not None or has_variance
+    cdef bint has_gain = gain is not None
+    cdef bint use_bank = bank is not None
+    cdef bint has_counts = counts is not None
+    cdef const double[:, :] error_view = error
+    cdef const double[:, :] gain_view = gain
+    cdef const double[:, :] variance_view = variance
+    cdef np.int64_t[::1] counts_view = counts
+    cdef np.int64_t n_full = 0, n_empty = 0, n_boundary = 0
+    cdef Py_ssize_t i, k, nxy, max_nxy = 1
+    cdef int j, x_min, y_min, nx, ny, row, col
+    cdef int max_nx = 1, max_ny = 1, nsub
+    cdef double x_lo, x_hi, y_lo, y_hi, value
+    cdef double p[_NPARAMS]
+    cdef double *frac
+    cdef const double *mask
+    cdef double *prod
+    cdef double *xs
+    cdef double *ys
+
+    if params.shape[2] != _NPARAMS:
+        raise ValueError('params must have {0} values per aperture'
+                         .format(_NPARAMS))
+
+    # Size the scratch buffers for the largest sub-array.
+    for i in range(n_obj):
+        nx = bounds[i, 1] - bounds[i, 0]
+        ny = bounds[i, 3] - bounds[i, 2]
+        if nx > 0 and ny > 0:
+            max_nx = max(max_nx, nx)
+            max_ny = max(max_ny, ny)
+            max_nxy = max(max_nxy, <Py_ssize_t>nx * ny)
+    nsub = subpixels if method == SUBPIXEL and subpixels > 1 else 1
+
+    frac = <double *>malloc(max_nxy * sizeof(double))
+    prod = <double *>malloc(max_nxy * sizeof(double))
+    xs = <double *>malloc((max_nx * nsub + 1) * sizeof(double))
+    ys = <double *>malloc((max_ny * nsub + 1) * sizeof(double))
+    if frac == NULL or prod == NULL or xs == NULL or ys == NULL:
+        free(frac)
+        free(prod)
+        free(xs)
+        free(ys)
+        raise MemoryError()
+
+    try:
+        with nogil:
+            for i in range(n_obj):
+
+                x_min = bounds[i, 0]
+                y_min = bounds[i, 2]
+                nx = bounds[i, 1] - x_min
+                ny = bounds[i, 3] - y_min
+                if nx <= 0 or ny <= 0:
+                    continue
+                nxy = <Py_ssize_t>nx * ny
+
+                # Edges of the sub-array relative to the object center.
+                x_lo = x_min - xc[i] - 0.5
+                x_hi = bounds[i, 1] - xc[i] - 0.5
+                y_lo = y_min - yc[i] - 0.5
+                y_hi = bounds[i, 3] - yc[i] - 0.5
+
+                for j in range(n_aper):
+
+                    if use_bank:
+                        mask = &bank[offsets[j, i]]
+                    else:
+                        for k in range(_NPARAMS):
+                            p[k] = params[j, i, k]
+                        _fill_fraction(kinds[j, i], p, method, subpixels,
+                                       x_lo, x_hi, y_lo, y_hi, nx, ny, frac,
+                                       xs, ys)
+                        mask = frac
+
+                    if has_counts:
+                        for k in range(nxy):
+                            if mask[k] == 1.:
+                                n_full += 1
+                            elif mask[k] == 0.:
+                                n_empty += 1
+                            else:
+                                n_boundary += 1
+
+                    k = 0
+                    for row in range(ny):
+                        for col in range(nx):
+                            prod[k] = data[y_min + row, x_min + col] * mask[k]
+                            k += 1
+                    flux[j, i] = _pairwise_sum(prod, nxy)
+
+                    if not has_error:
+                        continue
+
+                    k = 0
+                    for row in range(ny):
+                        for col in range(nx):
+                            if has_variance:
+                                value = variance_view[y_min + row,
+                                                      x_min + col]
+                            else:
+                                value = error_view[y_min + row, x_min + col]
+                                value = value * value
+                            if has_gain:
+                                value = value + (
+                                    data[y_min + row, x_min + col] /
+                                    gain_view[y_min + row, x_min + col])
+                            prod[k] = value * mask[k]
+                            k += 1
+                    fluxvar[j, i] = _pairwise_sum(prod, nxy)
+    finally:
+        free(frac)
+        free(prod)
+        free(xs)
+        free(ys)
+
+    if has_counts:
+        counts_view[0] += n_full
+        counts_view[1] += n_empty
+        counts_view[2] += n_boundary
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def fraction_masks(const int[:] kinds, const double[:, :] params,
+                   const double[:, :] edges, const Py_ssize_t[:, :] shapes,
+                   int method, int subpixels, double[:] bank,
+                   const Py_ssize_t[:] offsets):
+    """Compute the fraction arrays of several apertures.
+
+    Parameters
+    ----------
+    kinds : `~numpy.ndarray` (int)
+        `ApertureKind` values of the N apertures.
+    params : `~numpy.ndarray` (float)
+        (N, NPARAMS) array of aperture parameters.
+    edges : `~numpy.ndarray` (float)
+        (N, 4) array giving the x_min, x_max, y_min, y_max coordinates of
+        the outer edges of each array, relative to the aperture center
+        (as for the `encloses` methods).
+    shapes : `~numpy.ndarray` (int)
+        (N, 2) array giving the (ny, nx) shape of each array.
+    method : int
+        A `Method` value.
+    subpixels : int
+        Subsampling factor for the subpixel method.
+    bank : `~numpy.ndarray` (float)
+        Output array, in which the fraction array of aperture n is stored
+        (in C order) starting at ``offsets[n]``.
+    offsets : `~numpy.ndarray` (int)
+        Offsets of the N arrays in ``bank``.
+    """
+
+    cdef Py_ssize_t n, k
+    cdef int nx, ny, max_nx = 1, max_ny = 1, nsub
+    cdef double p[_NPARAMS]
+    cdef double *xs
+    cdef double *ys
+
+    if params.shape[1] != _NPARAMS:
+        raise ValueError('params must have {0} values per aperture'
+                         .format(_NPARAMS))
+
+    for n in range(kinds.shape[0]):
+        ny = shapes[n, 0]
+        nx = shapes[n, 1]
+        if offsets[n] < 0 or offsets[n] + <Py_ssize_t>nx * ny > bank.shape[0]:
+            raise ValueError('bank is too small for the fraction arrays')
+        max_nx = max(max_nx, nx)
+        max_ny = max(max_ny, ny)
+    nsub = subpixels if method == SUBPIXEL and subpixels > 1 else 1
+
+    xs = <double *>malloc((max_nx * nsub + 1) * sizeof(double))
+    ys = <double *>malloc((max_ny * nsub + 1) * sizeof(double))
+    if xs == NULL or ys == NULL:
+        free(xs)
+        free(ys)
+        raise MemoryError()
+
+    try:
+        with nogil:
+            for n in range(kinds.shape[0]):
+                if shapes[n, 0] <= 0 or shapes[n, 1] <= 0:
+                    continue
+                for k in range(_NPARAMS):
+                    p[k] = params[n, k]
+                _fill_fraction(kinds[n], p, method, subpixels, edges[n, 0],
+                               edges[n, 1], edges[n, 2], edges[n, 3],
+                               shapes[n, 1], shapes[n, 0],
+                               &bank[offsets[n]], xs, ys)
+    finally:
+        free(xs)
+        free(ys)
+
+
+def elliptical_sampled_grid(double x_min, double x_max, double y_min,
+                            double y_max, int nx, int ny, double a_in,
+                            double b_in, double a_out, double b_out,
+                            double theta, int subpixels):
+    """Fraction of the subpixels of each pixel of a grid whose centers are
+    within an ellipse (or an elliptical annulus, if a_in and b_in are
+    non-zero), as used by the 'center' (``subpixels=1``) and 'subpixel'
+    methods of the elliptical apertures.
+
+    The subpixels are sampled one row at a time, so that besides the
+    (ny, nx) output only the subpixel coordinates are stored.
+    """
+
+    cdef np.ndarray[DTYPE_t, ndim=2, mode='c'] frac = \
+        np.zeros([ny, nx], dtype=DTYPE)
+    cdef double *xs
+    cdef double *ys
+
+    # Shortcut to avoid divide-by-zero errors.
+    if nx <= 0 or ny <= 0 or a_out == 0. or b_out == 0.:
+        return frac
+    if subpixels < 1:
+        raise ValueError('subpixels must be a positive integer')
+
+    xs = <double *>malloc(<Py_ssize_t>nx * subpixels * sizeof(double))
+    ys = <double *>malloc(<Py_ssize_t>ny * subpixels * sizeof(double))
+    if xs == NULL or ys == NULL:
+        free(xs)
+        free(ys)
+        raise MemoryError()
+
+    try:
+        with nogil:
+            _elliptical_sampled(x_min, x_max, y_min, y_max, nx, ny, a_in,
+                                b_in, a_out, b_out, theta, subpixels,
+                                &frac[0, 0], xs, ys)
+    finally:
+        free(xs)
+        free(ys)
+
+    return frac
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+def phase_photometry(const double[:, :] data, error, gain,
+                     const double[:] xc, const double[:] yc,
+                     const Py_ssize_t[:, :] index, const double[:] bank,
+                     const Py_ssize_t[:] offsets, const int[:] nphase,
+                     const int[:] half, bint bilinear,
+                     double[:, :] flux, double[:, :] fluxvar,
+                     variance=None):
+    """Sum flux (and variance) within apertures using precomputed fraction
+    arrays on a grid of sub-pixel phases.
+
+    The phase (fx, fy) of an object is the position of its center within
+    its pixel, in [0, 1) along each axis, with 0 at the lower pixel edge.
+    For each distinct aperture d, the bank holds the fraction arrays of
+    the (2 * half[d] + 1, 2 * half[d] + 1) window of pixels around the
+    pixel containing the center, for phases (a / n, b / n) with
+    n = nphase[d] and a, b = 0 ... n. The array for phase (a / n, b / n)
+    starts at ``bank[offsets[d] + (b * (n + 1) + a) * window_size]``.
+    Each object uses the array of the nearest phase, or the bilinear
+    interpolation of the four surrounding ones.
+
+    Parameters
+    ----------
+    data, error, gain, xc, yc, flux, fluxvar, variance
+        See `batch_photometry`.
+    index : `~numpy.ndarray` (int)
+        (N_apertures, N_objects) array giving the distinct aperture used
+        by each aperture of each object.
+    bank : `~numpy.ndarray` (float)
+        1-d array holding the fraction arrays of all distinct apertures.
+    offsets, nphase, half : `~numpy.ndarray` (int)
+        Offset in ``bank``, phase resolution and half-size of the window
+        of each distinct aperture.
+    bilinear : bool
+        Whether to interpolate between phases, rather than using the
+        nearest one.
+    """
+
+    cdef int n_aper = index.shape[0]
+    cdef Py_ssize_t n_obj = index.shape[1]
+    cdef int ny_data = data.shape[0], nx_data = data.shape[1]
+    cdef bint has_variance = variance is not None
+    cdef bint has_error = error is not None or has_variance
+    cdef bint has_gain = gain is not None
+    cdef const double[:, :] error_view = error
+    cdef const double[:, :] gain_view = gain
+    cdef const double[:, :] variance_view = variance
+    cdef Py_ssize_t i, d, k, nw, nxy
+    cdef int j, n, h, w, max_w = 1, row, col, x0, y0, a, b
+    cdef int col_min, col_max, row_min, row_max
+    cdef double cx, cy, tx, ty, wx, wy, value, fraction
+    cdef double w00, w01, w10, w11
+    cdef const double *m00
+    cdef const double *m01
+    cdef const double *m10
+    cdef const double *m11
+    cdef double *prod
+
+    for d in range(half.shape[0]):
+        max_w = max(max_w, 2 * half[d] + 1)
+    prod = <double *>malloc(<Py_ssize_t>max_w * max_w * sizeof(double))
+    if prod == NULL:
+        raise MemoryError()
+
+    try:
+        with nogil:
+            for i in range(n_obj):
+
+                # Pixel containing the center, and phase within it.
+                cx = floor(xc[i] + 0.5)
+                cy = floor(yc[i] + 0.5)
+
+                for j in range(n_aper):
+
+                    d = index[j, i]
+                    n = nphase[d]
+                    h = half[d]
+                    w = 2 * h + 1
+                    nw = <Py_ssize_t>w * w
+
+                    # Window of pixels, limited to be within the image.
+                    if (cx - h >= nx_data or cx + h < 0 or
+                            cy - h >= ny_data or cy + h < 0):
+                        continue
+                    x0 = <int>cx - h
+                    y0 = <int>cy - h
+                    col_min = max(0, -x0)
+                    col_max = min(w, nx_data - x0)
+                    row_min = max(0, -y0)
+                    row_max = min(w, ny_data - y0)
+
+                    tx = (xc[i] + 0.5 - cx) * n
+                    ty = (yc[i] + 0.5 - cy) * n
+                    if bilinear:
+                        a = min(<int>tx, n - 1)
+                        b = min(<int>ty, n - 1)
+                        wx = tx - a
+                        wy = ty - b
+                    else:
+                        a = min(<int>(tx + 0.5), n)
+                        b = min(<int>(ty + 0.5), n)
+                        wx = wy = 0.
+                    w00 = (1. - wx) * (1. - wy)
+                    w01 = wx * (1. - wy)
+                    w10 = (1. - wx) * wy
+                    w11 = wx * wy
+                    m00 = &bank[offsets[d] + (b * (n + 1) + a) * nw]
+                    m01 = m00 + nw
+                    m10 = m00 + (n + 1) * nw
+                    m11 = m10 + nw
+
+                    k = 0
+                    for row in range(row_min, row_max):
+                        for col in range(col_min, col_max):
+                            fraction = w00 * m00[row * w + col]
+                            if bilinear:
+                                fraction = (fraction +
+                                            w01 * m01[row * w + col] +
+                                            w10 * m10[row * w + col] +
+                                            w11 * m11[row * w + col])
+                            prod[k] = data[y0 + row, x0 + col] * fraction
+                            k += 1
+                    nxy = k
+                    flux[j, i] = _pairwise_sum(prod, nxy)
+
+                    if not has_error:
+                        continue
+
+                    k = 0
+                    for row in range(row_min, row_max):
+                        for col in range(col_min, col_max):
+                            fraction = w00 * m00[row * w + col]
+                            if bilinear:
+                                fraction = (fraction +
+                                            w01 * m01[row * w + col] +
+                                            w10 * m10[row * w + col] +
+                                            w11 * m11[row * w + col])
+                            if has_variance:
+                                value = variance_view[y0 + row, x0 + col]
+                            else:
+                                value = error_view[y0 + row, x0 + col]
+                                value = value * value
+                            if has_gain:
+                                value = value + (data[y0 + row, x0 + col] /
+                                                 gain_view[y0 + row, x0 + col])
+                            prod[k] = value * fraction
+                            k += 1
+                    fluxvar[j, i] = _pairwise_sum(prod, nxy)
+    finally:
+        free(prod)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+def growth_photometry(const double[:, :] data, error, gain,
+                      const double[:] xc, const double[:] yc,
+                      const double[:] radii, const Py_ssize_t[:, :] bounds,
+                      int method, int subpixels, double[:, :] flux,
+                      double[:, :] fluxvar, variance=None):
+    """Sum flux (and variance) within concentric circles of several radii
+    for many objects, in a single pass over the pixels of each object.
+
+    The fraction of a pixel covered by a circle is 1 for the radii above
+    some value, 0 for those below another, and only needs computing for
+    the radii between them, which are found by bisection. The fractions
+    are the same as for separate circular apertures, but the flux is
+    summed in a different order. As with `batch_photometry`, a
+    non-finite value anywhere in the sub-array of an object also enters
+    the circles that do not cover its pixel, as NaN (0 * NaN).
+
+    Parameters
+    ----------
+    data, error, gain, xc, yc, bounds, method, subpixels, flux, fluxvar,
+    variance
+        See `batch_photometry`.
+    radii : `~numpy.ndarray` (float)
+        Non-negative radii of the circles, in increasing order (one for
+        each row of ``flux``), shared by all objects.
+    """
+
+    cdef int n_aper = radii.shape[0]
+    cdef Py_ssize_t n_obj = xc.shape[0]
+    cdef bint has_variance = variance is not None
+    cdef bint has_error = error is not None or has_variance
+    cdef bint has_gain = gain is not None
+    cdef const double[:, :] error_view = error
+    cdef const double[:, :] gain_view = gain
+    cdef const double[:, :] variance_view = variance
+    cdef Py_ssize_t i
+    cdef int j, k, lo, hi, x_min, y_min, nx, ny, row, col
+    cdef int max_nx = 1, max_ny = 1, k_first = 0, k_part, k_full
+    cdef double x_lo, x_hi, y_lo, y_hi, dx, dy, pixrad, x, y, d, r
+    cdef double value, pixel_var, fraction
+    cdef bint finite
+    cdef double *rsq
+    cdef double *full
+    cdef double *fullvar
+    cdef double *xs
+    cdef double *ys
+
+    for i in range(n_obj):
+        max_nx = max(max_nx, bounds[i, 1] - bounds[i, 0])
+        max_ny = max(max_ny, bounds[i, 3] - bounds[i, 2])
+
+    rsq = <double *>malloc((n_aper + 1) * sizeof(double))
+    full = <double *>malloc((n_aper + 1) * sizeof(double))
+    fullvar = <double *>malloc((n_aper + 1) * sizeof(double))
+    xs = <double *>malloc(max_nx * sizeof(double))
+    ys = <double *>malloc(max_ny * sizeof(double))
+    if (rsq == NULL or full == NULL or fullvar == NULL or xs == NULL or
+            ys == NULL):
+        free(rsq)
+        free(full)
+        free(fullvar)
+        free(xs)
+        free(ys)
+        raise MemoryError()
+
+    try:
+        with nogil:
+            for j in range(n_aper):
+                rsq[j] = radii[j] * radii[j]
+                # Circles of zero radius do not overlap any pixel.
+                if radii[j] <= 0. and method != CENTER:
+                    k_first = j + 1
+
+            for i in range(n_obj):
+
+                for j in range(n_aper):
+                    flux[j, i] = 0.
+                    if has_error:
+                        fluxvar[j, i] = 0.
+                memset(full, 0, (n_aper + 1) * sizeof(double))
+                memset(fullvar, 0, (n_aper + 1) * sizeof(double))
+
+                x_min = bounds[i, 0]
+                y_min = bounds[i, 2]
+                nx = bounds[i, 1] - x_min
+                ny = bounds[i, 3] - y_min
+                if nx <= 0 or ny <= 0:
+                    continue
+
+                # Pixel grid relative to the object center, computed as in
+                # _circular_overlap_grid and _circular_center.
+                x_lo = x_min - xc[i] - 0.5
+                x_hi = bounds[i, 1] - xc[i] - 0.5
+                y_lo = y_min - yc[i] - 0.5
+                y_hi = bounds[i, 3] - yc[i] - 0.5
+                dx = (x_hi - x_lo) / nx
+                dy = (y_hi - y_lo) / ny
+                pixrad = 0.5 * sqrt(dx * dx + dy * dy)
+                if method == CENTER:
+                    _arange(x_lo + dx / 2., dx, nx, xs)
+                    _arange(y_lo + dy / 2., dy, ny, ys)
+
+                for row in range(ny):
+                    if method == CENTER:
+                        y = ys[row]
+                    else:
+                        y = y_lo + (row + 0.5) * dy
+                    for col in range(nx):
+
+                        value = data[y_min + row, x_min + col]
+                        if has_variance:
+                            pixel_var = variance_view[y_min + row,
+                                                      x_min + col]
+                        elif has_error:
+                            pixel_var = error_view[y_min + row, x_min + col]
+                            pixel_var = pixel_var * pixel_var
+                            if has_gain:
+                                pixel_var = pixel_var + (
+                                    value /
+                                    gain_view[y_min + row, x_min + col])
+
+                        # The other kernels multiply the whole sub-array by
+                        # the fractions, so that a non-finite value gives
+                        # NaN for the circles that do not cover its pixel.
+                        finite = isfinite(value) and (
+                            not has_error or isfinite(pixel_var))
+
+                        if method == CENTER:
+                            d = xs[col] * xs[col] + y * y
+                            # First radius whose circle contains the
+                            # pixel center.
+                            lo = k_first
+                            hi = n_aper
+                            while lo < hi:
+                                k = (lo + hi) // 2
+                                if d < rsq[k]:
+                                    hi = k
+                                else:
+                                    lo = k + 1
+                            full[lo] += value
+                            if has_error:
+                                fullvar[lo] += pixel_var
+                            if not finite:
+                                for k in range(lo):
+                                    flux[k, i] += value * 0.
+                                    if has_error:
+                                        fluxvar[k, i] += pixel_var * 0.
+                            continue
+
+                        x = x_lo + (col + 0.5) * dx
+                        d = sqrt(x * x + y * y)
+
+                        # First radius for which the pixel is fully
+                        # covered, and first one (not after the former)
+                        # for which it may be partially covered.
+                        lo = k_first
+                        hi = n_aper
+                        while lo < hi:
+                            k = (lo + hi) // 2
+                            if d < radii[k] - pixrad:
+                                hi = k
+                            else:
+                                lo = k + 1
+                        k_full = lo
+                        lo = k_first
+                        while lo < hi:
+                            k = (lo + hi) // 2
+                            if d < radii[k] + pixrad:
+                                hi = k
+                            else:
+                                lo = k + 1
+                        k_part = lo
+
+                        full[k_full] += value
+                        if has_error:
+                            fullvar[k_full] += pixel_var
+                        if not finite:
+                            for k in range(k_part):
+                                flux[k, i] += value * 0.
+                                if has_error:
+                                    fluxvar[k, i] += pixel_var * 0.
+
+                        for k in range(k_part, k_full):
+                            r = radii[k]
+                            if (x <= -r - 0.5 * dx or x >= r + 0.5 * dx or
+                                    y <= -r - 0.5 * dy or y >= r + 0.5 * dy):
+                                if finite:
+                                    continue
+                                fraction = 0.
+                            elif method == EXACT:
+                                fraction = _overlap_single_exact(
+                                    x - 0.5 * dx, y - 0.5 * dy,
+                                    x + 0.5 * dx, y + 0.5 * dy, r) / (dx * dy)
+                            else:
+                                fraction = _overlap_single_subpixel(
+                                    x - 0.5 * dx, y - 0.5 * dy,
+                                    x + 0.5 * dx, y + 0.5 * dy, r, subpixels)
+                            flux[k, i] += value * fraction
+                            if has_error:
+                                fluxvar[k, i] += pixel_var * fraction
+
+                # Add the fully covered pixels to all larger radii.
+                value = 0.
+                pixel_var = 0.
+                for j in range(n_aper):
+                    value += full[j]
+                    flux[j, i] += value
+                    if has_error:
+                        pixel_var += fullvar[j]
+                        fluxvar[j, i] += pixel_var
+    finally:
+        free(rsq)
+        free(full)
+        free(fullvar)
+        free(xs)
+        free(ys)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+def prefix_photometry(const double[:, :] data, error, gain,
+                      const double[:, :] cumdata, cumvar,
+                      const double[:] xc, const double[:] yc,
+                      const int[:, :] kinds, const double[:, :, :] params,
+                      const Py_ssize_t[:, :] bounds, int method,
+                      double[:, :] flux, double[:, :] fluxvar,
+                      variance=None):
+    """Sum flux (and variance) within apertures with the 'center' or
+    'exact' method, using row-wise cumulative sums of the data (and
+    variance).
+
+    With the 'center' method, the pixels of each row whose centers are
+    within an aperture form a contiguous span (or, for an annulus, a span
+    minus the span of its hole), so that its flux in the row is the
+    difference of two values of the cumulative sums. The ends of the spans
+    are estimated analytically and then adjusted with the same inclusion
+    test as `batch_photometry`, so that the same pixels are selected; only
+    the summation differs.
+
+    With the 'exact' method, the pixels of each row that are entirely
+    within an aperture (or within the outer boundary or the hole of an
+    annulus) are likewise summed as a span of the cumulative sums, and the
+    exact overlap is only computed for the pixels crossed by the boundary,
+    whose number is proportional to the perimeter of the aperture. The
+    pixels are classified with the same tests as the overlap grid
+    functions, so that the fractions are the same as with
+    `batch_photometry`.
+
+    Parameters
+    ----------
+    data, error, gain, variance
+        See `batch_photometry`. Only used for the boundary pixels with
+        the 'exact' method.
+    cumdata : `~numpy.ndarray` (float)
+        (ny, nx + 1) array of cumulative sums of the data along rows, with
+        ``cumdata[:, 0] == 0``.
+    cumvar : `~numpy.ndarray` (float) or `None`
+        Cumulative sums of the variance of the data, with the same layout.
+        ``fluxvar`` is only filled if given.
+    xc, yc, kinds, params, bounds, flux, fluxvar
+        See `batch_photometry`.
+    method : int
+        `Method` (CENTER or EXACT).
+    """
+
+    cdef int n_aper = kinds.shape[0]
+    cdef Py_ssize_t n_obj = kinds.shape[1]
+    cdef bint has_var = cumvar is not None
+    cdef bint has_gain = gain is not None
+    cdef bint has_variance = variance is not None
+    cdef const double[:, :] cumvar_view = cumvar
+    cdef const double[:, :] error_view = error
+    cdef const double[:, :] gain_view = gain
+    cdef const double[:, :] variance_view = variance
+    cdef Py_ssize_t i
+    cdef int j, k, kind, row, x_min, y_min, nx, ny, max_nx = 1, max_ny = 1
+    cdef int c0, c1, h0, h1, f0, f1, col, n_shape, sign, pixel_class
+    cdef int part, start, stop
+    cdef bint ellipse, annulus
+    cdef double x_size, y_size, r0, r1, h_r0, h_r1, theta
+    cdef double cos_theta, sin_theta, x_lo, x_hi, y_lo, y_hi
+    cdef double total, total_var, fraction, value
+    cdef double p[_NPARAMS]
+    cdef _Outline shapes[2]
+    cdef double *xs
+    cdef double *ys
+
+    if params.shape[2] != _NPARAMS:
+        raise ValueError('params must have {0} values per aperture'
+                         .format(_NPARAMS))
+    if method != CENTER and method != EXACT:
+        raise ValueError('prefix_photometry supports the center and exact '
+                         'methods only')
+    if method == EXACT and has_var and error is None and variance is None:
+        raise ValueError('error or variance is required for the variance '
+                         'with the exact method')
+
+    for i in range(n_obj):
+        max_nx = max(max_nx, bounds[i, 1] - bounds[i, 0])
+        max_ny = max(max_ny, bounds[i, 3] - bounds[i, 2])
+    xs = <double *>malloc((max_nx + 1) * sizeof(double))
+    ys = <double *>malloc((max_ny + 1) * sizeof(double))
+    if xs == NULL or ys == NULL:
+        free(xs)
+        free(ys)
+        raise MemoryError()
+
+    try:
+        with nogil:
+            for i in range(n_obj):
+
+                x_min = bounds[i, 0]
+                y_min = bounds[i, 2]
+                nx = bounds[i, 1] - x_min
+                ny = bounds[i, 3] - y_min
+                if nx <= 0 or ny <= 0:
+                    continue
+
+                if method == EXACT:
+                    # Edges of the sub-array relative to the object center,
+                    # and pixel edges as in _fill_fraction.
+                    x_lo = x_min - xc[i] - 0.5
+                    x_hi = bounds[i, 1] - xc[i] - 0.5
+                    y_lo = y_min - yc[i] - 0.5
+                    y_hi = bounds[i, 3] - yc[i] - 0.5
+                    _linspace(x_lo, x_hi, nx + 1, xs)
+                    _linspace(y_lo, y_hi, ny + 1, ys)
+                    for j in range(n_aper):
+                        for k in range(_NPARAMS):
+                            p[k] = params[j, i, k]
+                        n_shape = _exact_outlines(kinds[j, i], p, x_lo, x_hi,
+                                                  y_lo, y_hi, nx, ny, xs, ys,
+                                                  shapes)
+                        total = 0.
+                        total_var = 0.
+                        for row in range(ny):
+                            for k in range(n_shape):
+                                # Add the outer boundary and subtract the
+                                # hole of an annulus.
+                                sign = 1 if k == 0 else -1
+                                _exact_spans(&shapes[k], row, nx, &c0, &f0,
+                                             &f1, &c1)
+                                if c0 == c1:
+                                    continue
+                                total += sign * (
+                                    cumdata[y_min + row, x_min + f1] -
+                                    cumdata[y_min + row, x_min + f0])
+                                if has_var:
+                                    total_var += sign * (
+                                        cumvar_view[y_min + row, x_min + f1] -
+                                        cumvar_view[y_min + row, x_min + f0])
+                                # The boundary pixels, [c0, f0) and
+                                # [f1, c1).
+                                for part in range(2):
+                                    start = c0 if part == 0 else f1
+                                    stop = f0 if part == 0 else c1
+                                    for col in range(start, stop):
+                                        pixel_class = _exact_class(
+                                            &shapes[k], col, row)
+                                        if pixel_class == 0:
+                                            continue
+                                        fraction = 1.
+                                        if pixel_class < 0:
+                                            fraction = _exact_fraction(
+                                                &shapes[k], col, row)
+                                        total += sign * (
+                                            data[y_min + row, x_min + col] *
+                                            fraction)
+                                        if not has_var:
+                                            continue
+                                        if has_variance:
+                                            value = variance_view[
+                                                y_min + row, x_min + col]
+                                        else:
+                                            value = error_view[y_min + row,
+                                                               x_min + col]
+                                            value = value * value
+                                        if has_gain:
+                                            value = value + (
+                                                data[y_min + row,
+                                                     x_min + col] /
+                                                gain_view[y_min + row,
+                                                          x_min + col])
+                                        total_var += sign * value * fraction
+                        flux[j, i] = total
+                        if has_var:
+                            fluxvar[j, i] = total_var
+                    continue
+
+                # Pixel centers relative to the object center, as in
+                # _circular_center and _elliptical_sampled.
+                x_size = ((bounds[i, 1] - xc[i] - 0.5) -
+                          (x_min - xc[i] - 0.5)) / nx
+                y_size = ((bounds[i, 3] - yc[i] - 0.5) -
+                          (y_min - yc[i] - 0.5)) / ny
+                _arange((x_min - xc[i] - 0.5) + x_size / 2., x_size, nx, xs)
+                _arange((y_min - yc[i] - 0.5) + y_size / 2., y_size, ny, ys)
+
+                for j in range(n_aper):
+
+                    # The aperture (and its hole, if any) as a circle of
+                    # squared radius r0 or an ellipse of axes r0, r1.
+                    kind = kinds[j, i]
+                    ellipse = kind == ELLIPTICAL or kind == ELLIPTICAL_ANNULUS
+                    annulus = False
+                    cos_theta = sin_theta = 0.
+                    r1 = h_r1 = 0.
+                    if kind == CIRCULAR:
+                        r0 = params[j, i, 0] * params[j, i, 0]
+                    elif kind == CIRCULAR_ANNULUS:
+                        r0 = params[j, i, 1] * params[j, i, 1]
+                        h_r0 = params[j, i, 0] * params[j, i, 0]
+                        annulus = True
+                    else:
+                        if kind == ELLIPTICAL:
+                            r0 = params[j, i, 0]
+                            r1 = params[j, i, 1]
+                            theta = params[j, i, 2]
+                        else:
+                            r0 = params[j, i, 2]
+                            r1 = params[j, i, 3]
+                            h_r0 = params[j, i, 0]
+                            h_r1 = params[j, i, 1]
+                            theta = params[j, i, 4]
+                            annulus = h_r0 != 0. and h_r1 != 0.
+                        cos_theta = cos(theta)
+                        sin_theta = sin(theta)
+
+                    total = 0.
+                    total_var = 0.
+                    # Shortcut to avoid divide-by-zero errors.
+                    if not ellipse or (r0 != 0. and r1 != 0.):
+                        for row in range(ny):
+                            _center_span(ellipse, r0, r1, cos_theta,
+                                         sin_theta, False, xs, nx, x_size,
+                                         ys[row], &c0, &c1)
+                            if c0 == c1:
+                                continue
+                            if annulus:
+                                _center_span(ellipse, h_r0, h_r1, cos_theta,
+                                             sin_theta, True, xs, nx, x_size,
+                                             ys[row], &h0, &h1)
+                                h0 = min(max(h0, c0), c1)
+                                h1 = min(max(h1, h0), c1)
+                            else:
+                                h0 = h1 = c0
+                            total += (
+                                (cumdata[y_min + row, x_min + c1] -
+                                 cumdata[y_min + row, x_min + h1]) +
+                                (cumdata[y_min + row, x_min + h0] -
+                                 cumdata[y_min + row, x_min + c0]))
+                            if has_var:
+                                total_var += (
+                                    (cumvar_view[y_min + row, x_min + c1] -
+                                     cumvar_view[y_min + row, x_min + h1]) +
+                                    (cumvar_view[y_min + row, x_min + h0] -
+                                     cumvar_view[y_min + row, x_min + c0]))
+
+                    flux[j, i] = total
+                    if has_var:
+                        fluxvar[j, i] = total_var
+    finally:
+        free(xs)
+        free(ys)
+
+
+@cython.cdivision(True)
+cdef void _fill_fraction(int kind, const double* p, int method, int subpixels,
+                         double x_lo, double x_hi, double y_lo, double y_hi,
+                         int nx, int ny, double* frac, double* xs,
+                         double* ys) nogil:
+    """Fill ``frac`` with the (ny, nx) fraction array that the `encloses`
+    method of the aperture would return. ``xs`` and ``ys`` are scratch
+    buffers of at least nx * subpixels + 1 and ny * subpixels + 1
+    elements."""
+
+    cdef Py_ssize_t nxy = <Py_ssize_t>nx * ny
+
+    memset(frac, 0, nxy * sizeof(double))
+
+    if kind == CIRCULAR:
+        if method == CENTER:
+            _circular_center(x_lo, x_hi, y_lo, y_hi, nx, ny, 0., p[0] * p[0],
+                             0, frac, xs, ys)
+        elif p[0] > 0.:
+            _circular_overlap_grid(x_lo, x_hi, y_lo, y_hi, nx, ny, p[0],
+                                   method == EXACT, subpixels, frac)
+
+    elif kind == CIRCULAR_ANNULUS:
+        if method == CENTER:
+            _circular_center(x_lo, x_hi, y_lo, y_hi, nx, ny, p[0] * p[0],
+                             p[1] * p[1], 1, frac, xs, ys)
+        elif p[1] > 0.:
+            _circular_annulus_overlap_grid(x_lo, x_hi, y_lo, y_hi, nx, ny,
+                                           p[0], p[1], method == EXACT,
+                                           subpixels, frac)
+
+    elif kind == ELLIPTICAL:
+        # Shortcut to avoid divide-by-zero errors.
+        if p[0] == 0. or p[1] == 0.:
+            return
+        if method == EXACT:
+            _linspace(x_lo, x_hi, nx + 1, xs)
+            _linspace(y_lo, y_hi, ny + 1, ys)
+            _elliptical_overlap_grid(xs, ys, nx, ny, p[0], p[1], p[2], frac)
+        else:
+            _elliptical_sampled(x_lo, x_hi, y_lo, y_hi, nx, ny, 0., 0., p[0],
+                                p[1], p[2], subpixels if method == SUBPIXEL
+                                else 1, frac, xs, ys)
+
+    elif kind == ELLIPTICAL_ANNULUS:
+        # Shortcut to avoid divide-by-zero errors.
+        if p[2] == 0. or p[3] == 0.:
+            return
+        if method == EXACT:
+            _linspace(x_lo, x_hi, nx + 1, xs)
+            _linspace(y_lo, y_hi, ny + 1, ys)
+            _elliptical_annulus_overlap_grid(xs, ys, nx, ny, p[0], p[1],
+                                             p[2], p[3], p[4], frac)
+        else:
+            _elliptical_sampled(x_lo, x_hi, y_lo, y_hi, nx, ny, p[0], p[1],
+                                p[2], p[3], p[4], subpixels
+                                if method == SUBPIXEL else 1, frac, xs, ys)
+
+
+cdef inline bint _center_in(bint ellipse, double r0, double r1, double c,
+                            double s, bint closed, double x,
+                            double y) nogil:
+    """Whether the point (x, y) is within a circle of squared radius r0 or
+    an ellipse of axes r0, r1 with position angle cosine and sine c, s,
+    with the same arithmetic as _circular_center and _elliptical_sampled.
+    The boundary is included if ``closed``."""
+    cdef double q, t1, t2, limit
+    if ellipse:
+        t1 = (x * c + y * s) / r0
+        t2 = (y * c - x * s) / r1
+        q = t1 * t1 + t2 * t2
+        limit = 1.
+    else:
+        q = x * x + y * y
+        limit = r0
+    if closed:
+        return not q > limit
+    return q < limit
+
+
+@cython.cdivision(True)
+cdef void _center_span(bint ellipse, double r0, double r1, double c,
+                       double s, bint closed, const double* xs, int nx,
+                       double x_size, double y, int* c0, int* c1) nogil:
+    """Find the span [c0, c1) of the pixels of a row (with pixel centers
+    ``xs`` and ordinate y) that are within a circle or an ellipse (see
+    `_center_in`); c0 == c1 if there are none."""
+
+    cdef double a, b, q, vertex, half
+    cdef int lo, hi
+
+    # Solve for the abscissae of the boundary, a x^2 + b x + q = 0.
+    if ellipse:
+        a = (c / r0) * (c / r0) + (s / r1) * (s / r1)
+        b = 2. * y * c * s * (1. / (r0 * r0) - 1. / (r1 * r1))
+        q = y * y * ((s / r0) * (s / r0) + (c / r1) * (c / r1)) - 1.
+    else:
+        a = 1.
+        b = 0.
+        q = y * y - r0
+    vertex = -b / (2. * a)
+    half = b * b - 4. * a * q
+    half = sqrt(half) / (2. * a) if half > 0. else 0.
+
+    lo = <int>max(min(ceil((vertex - half - xs[0]) / x_size), <double>nx),
+                  0.)
+    hi = <int>max(min(floor((vertex + half - xs[0]) / x_size) + 1.,
+                      <double>nx), 0.)
+    if lo >= hi:
+        # At most the pixel nearest to the vertex.
+        lo = <int>max(min(floor((vertex - xs[0]) / x_size + 0.5),
+                          <double>(nx - 1)), 0.)
+        hi = lo + 1
+
+    # Adjust the estimate to the inclusion test of the pixel centers.
+    while lo > 0 and _center_in(ellipse, r0, r1, c, s, closed, xs[lo - 1], y):
+        lo -= 1
+    while hi < nx and _center_in(ellipse, r0, r1, c, s, closed, xs[hi], y):
+        hi += 1
+    while lo < hi and not _center_in(ellipse, r0, r1, c, s, closed, xs[lo],
+                                     y):
+        lo += 1
+    while hi > lo and not _center_in(ellipse, r0, r1, c, s, closed,
+                                     xs[hi - 1], y):
+        hi -= 1
+    c0[0] = lo
+    c1[0] = hi
+
+
+@cython.cdivision(True)
+cdef int _exact_outlines(int kind, const double* p, double x_lo, double x_hi,
+                         double y_lo, double y_hi, int nx, int ny,
+                         const double* xs, const double* ys,
+                         _Outline* out) nogil:
+    """Set up the outer boundary of an aperture (and the hole of an
+    annulus, if any) in ``out``, for `prefix_photometry` with the 'exact'
+    method. Returns the number of outlines, 0 for an empty aperture. ``xs``
+    and ``ys`` are the pixel edges."""
+
+    cdef int k, n = 0
+    cdef double c, s
+
+    if kind == CIRCULAR or kind == CIRCULAR_ANNULUS:
+        if p[kind == CIRCULAR_ANNULUS] <= 0.:
+            return 0
+        out[0].r = p[kind == CIRCULAR_ANNULUS]
+        out[1].r = p[0]
+        n = 2 if kind == CIRCULAR_ANNULUS and p[0] > 0. else 1
+        for k in range(n):
+            out[k].ellipse = False
+            out[k].x_lo = x_lo
+            out[k].y_lo = y_lo
+            out[k].dx = (x_hi - x_lo) / nx
+            out[k].dy = (y_hi - y_lo) / ny
+            out[k].pixrad = 0.5 * sqrt(out[k].dx * out[k].dx +
+                                       out[k].dy * out[k].dy)
+        return n
+
+    # Shortcut to avoid divide-by-zero errors.
+    if kind == ELLIPTICAL:
+        if p[0] == 0. or p[1] == 0.:
+            return 0
+        out[0].a = p[0]
+        out[0].b = p[1]
+        out[0].theta = p[2]
+        n = 1
+    else:
+        if p[2] == 0. or p[3] == 0.:
+            return 0
+        out[0].a = p[2]
+        out[0].b = p[3]
+        out[1].a = p[0]
+        out[1].b = p[1]
+        out[0].theta = out[1].theta = p[4]
+        n = 2 if p[0] > 0. and p[1] > 0. else 1
+    for k in range(n):
+        out[k].ellipse = True
+        out[k].cos_m_theta = cos(-out[k].theta)
+        out[k].sin_m_theta = sin(-out[k].theta)
+        _elliptical_half_widths(out[k].a, out[k].b, out[k].theta,
+                                &out[k].x_half, &out[k].y_half)
+        # Ordinate of the rightmost point of the ellipse.
+        c = cos(out[k].theta)
+        s = sin(out[k].theta)
+        out[k].y_right = ((out[k].a * out[k].a - out[k].b * out[k].b) *
+                          c * s / out[k].x_half)
+        out[k].x_lo = x_lo
+        out[k].dx = (x_hi - x_lo) / nx
+        out[k].xs = xs
+        out[k].ys = ys
+    return n
+
+
+@cython.cdivision(True)
+cdef int _exact_class(_Outline* o, int col, int row) nogil:
+    """Classify pixel (col, row) relative to an outline with the tests of
+    `_circular_overlap_grid` and `_elliptical_overlap_grid`: 1 if it is
+    (well) within it, -1 if the exact overlap is needed and 0 if it is
+    outside."""
+
+    cdef double x, y, d
+
+    if o.ellipse:
+        if not (o.xs[col] < o.x_half and o.xs[col + 1] > - o.x_half and
+                o.ys[row] < o.y_half and o.ys[row + 1] > - o.y_half):
+            return 0
+        return _elliptical_element_class(o.xs[col], o.ys[row],
+                                         o.xs[col + 1], o.ys[row + 1],
+                                         o.a, o.b, o.cos_m_theta,
+                                         o.sin_m_theta)
+
+    x = o.x_lo + (col + 0.5) * o.dx
+    y = o.y_lo + (row + 0.5) * o.dy
+    if not (x > -o.r - 0.5 * o.dx and x < o.r + 0.5 * o.dx and
+            y > -o.r - 0.5 * o.dy and y < o.r + 0.5 * o.dy):
+        return 0
+    d = sqrt(x * x + y * y)
+    if d < o.r - o.pixrad:
+        return 1
+    if d < o.r + o.pixrad:
+        return -1
+    return 0
+
+
+@cython.cdivision(True)
+cdef double _exact_fraction(_Outline* o, int col, int row) nogil:
+    """Exact overlap of an outline with pixel (col, row), as computed by
+    `_circular_overlap_grid` and `_elliptical_overlap_grid`."""
+
+    cdef double x, y
+
+    if o.ellipse:
+        return _elliptical_overlap_single(
+            o.xs[col], o.ys[row], o.xs[col + 1], o.ys[row + 1], o.a, o.b,
+            o.theta) / (o.xs[col + 1] - o.xs[col]) / (o.ys[row + 1] -
+                                                      o.ys[row])
+
+    x = o.x_lo + (col + 0.5) * o.dx
+    y = o.y_lo + (row + 0.5) * o.dy
+    return _overlap_single_exact(x - 0.5 * o.dx, y - 0.5 * o.dy,
+                                 x + 0.5 * o.dx, y + 0.5 * o.dy,
+                                 o.r) / (o.dx * o.dy)
+
+
+@cython.cdivision(True)
+cdef void _chord(_Outline* o, double y, double* x0, double* x1) nogil:
+    """Abscissae x0 <= x1 of the intersections of the line at ordinate y
+    with an elliptical outline (or of the point nearest to it)."""
+
+    cdef double c = o.cos_m_theta, s = - o.sin_m_theta
+    cdef double a, b, q, vertex, half
+
+    a = (c / o.a) * (c / o.a) + (s / o.b) * (s / o.b)
+    b = 2. * y * c * s * (1. / (o.a * o.a) - 1. / (o.b * o.b))
+    q = y * y * ((s / o.a) * (s / o.a) + (c / o.b) * (c / o.b)) - 1.
+    vertex = -b / (2. * a)
+    half = b * b - 4. * a * q
+    half = sqrt(half) / (2. * a) if half > 0. else 0.
+    x0[0] = vertex - half
+    x1[0] = vertex + half
+
+
+@cython.cdivision(True)
+cdef void _exact_spans(_Outline* o, int row, int nx, int* c0, int* f0,
+                       int* f1, int* c1) nogil:
+    """Find the span [c0, c1) of the pixels of a row that overlap an
+    outline and the span [f0, f1) within it of those that are within the
+    outline, according to `_exact_class`. c0 == c1 if there are none, and
+    f0 == f1 == c1 if no pixel is within the outline.
+
+    The ends of the spans are estimated analytically and then adjusted
+    with `_exact_class`; the latter span may miss pixels within the
+    outline when they are very few, but those are still classified as
+    such when the pixels of [c0, f0) and [f1, c1) are."""
+
+    cdef double y, w, y0, y1, x0, x1, left, right, lo_f, hi_f, mid
+    cdef double full_lo = 0., full_hi = -1.
+    cdef int lo, hi
+
+    if o.ellipse:
+        # Pixels overlapping the part of the ellipse within the row, and
+        # pixels within the chords at both edges of the row.
+        y0 = max(o.ys[row], - o.y_half)
+        y1 = min(o.ys[row + 1], o.y_half)
+        mid = 0.
+        lo_f = hi_f = 0.
+        if y0 <= y1:
+            _chord(o, y0, &left, &right)
+            _chord(o, y1, &x0, &x1)
+            left = - o.x_half if y0 <= - o.y_right <= y1 else min(left, x0)
+            right = o.x_half if y0 <= o.y_right <= y1 else max(right, x1)
+            lo_f = floor((left - o.x_lo) / o.dx)
+            hi_f = ceil((right - o.x_lo) / o.dx)
+            mid = 0.5 * (lo_f + hi_f)
+            if o.ys[row] > - o.y_half and o.ys[row + 1] < o.y_half:
+                _chord(o, o.ys[row], &left, &right)
+                _chord(o, o.ys[row + 1], &x0, &x1)
+                full_lo = ceil((max(left, x0) - o.x_lo) / o.dx)
+                full_hi = floor((min(right, x1) - o.x_lo) / o.dx)
+    else:
+        # Pixel centers within a circle of radius r + pixrad (or r -
+        # pixrad for the pixels within the outline).
+        y = o.y_lo + (row + 0.5) * o.dy
+        mid = - o.x_lo / o.dx - 0.5
+        w = (o.r + o.pixrad) * (o.r + o.pixrad) - y * y
+        w = min(sqrt(w) if w > 0. else 0., o.r + 0.5 * o.dx)
+        lo_f = floor(mid - w / o.dx) + 1.
+        hi_f = ceil(mid + w / o.dx)
+        w = (o.r - o.pixrad) * (o.r - o.pixrad) - y * y
+        if o.r > o.pixrad and w > 0.:
+            w = sqrt(w)
+            full_lo = floor(mid - w / o.dx) + 1.
+            full_hi = ceil(mid + w / o.dx)
+
+    lo = <int>max(min(lo_f, <double>nx), 0.)
+    hi = <int>max(min(hi_f, <double>nx), 0.)
+    if lo >= hi:
+        # At most the pixel nearest to the middle.
+        lo = <int>max(min(floor(mid + 0.5), <double>(nx - 1)), 0.)
+        hi = lo + 1
+    while lo > 0 and _exact_class(o, lo - 1, row) != 0:
+        lo -= 1
+    while hi < nx and _exact_class(o, hi, row) != 0:
+        hi += 1
+    while lo < hi and _exact_class(o, lo, row) == 0:
+        lo += 1
+    while hi > lo and _exact_class(o, hi - 1, row) == 0:
+        hi -= 1
+    c0[0] = lo
+    c1[0] = hi
+
+    f0[0] = f1[0] = hi
+    lo = <int>max(min(full_lo, <double>hi), <double>c0[0])
+    hi = <int>max(min(full_hi, <double>hi), <double>c0[0])
+    if lo >= hi:
+        return
+    while lo > c0[0] and _exact_class(o, lo - 1, row) == 1:
+        lo -= 1
+    while hi < c1[0] and _exact_class(o, hi, row) == 1:
+        hi += 1
+    while lo < hi and _exact_class(o, lo, row) != 1:
+        lo += 1
+    while hi > lo and _exact_class(o, hi - 1, row) != 1:
+        hi -= 1
+    if lo < hi:
+        f0[0] = lo
+        f1[0] = hi
+
+
+cdef void _arange(double start, double step, int n, double* out) nogil:
+    """Fill ``out`` with the n values of ``np.arange(start, stop, step)``."""
+    cdef int i
+    cdef double delta
+    if n > 0:
+        out[0] = start
+    if n > 1:
+        out[1] = start + step
+    delta = (start + step) - start
+    for i in range(2, n):
+        out[i] = start + i * delta
+
+
+@cython.cdivision(True)
+cdef void _linspace(double start, double stop, int num, double* out) nogil:
+    """Fill ``out`` with the num (> 1) values of
+    ``np.linspace(start, stop, num)``."""
+    cdef int i
+    cdef double step = (stop - start) / (num - 1)
+    for i in range(num - 1):
+        out[i] = i * step + start
+    out[num - 1] = stop
+
+
+@cython.cdivision(True)
+cdef void _circular_center(double x_lo, double x_hi, double y_lo, double y_hi,
+                           int nx, int ny, double r_in_sq, double r_out_sq,
+                           bint annulus, double* frac, double* xs,
+                           double* ys) nogil:
+    """Pixels whose centers are within a circle (or circular annulus)."""
+    cdef int i, j
+    cdef double x_size, y_size, dist_sq
+
+    x_size = (x_hi - x_lo) / nx
+    y_size = (y_hi - y_lo) / ny
+    _arange(x_lo + x_size / 2., x_size, nx, xs)
+    _arange(y_lo + y_size / 2., y_size, ny, ys)
+
+    for j in range(ny):
+        for i in range(nx):
+            dist_sq = xs[i] * xs[i] + ys[j] * ys[j]
+            if dist_sq < r_out_sq and (not annulus or dist_sq > r_in_sq):
+                frac[j * nx + i] = 1.
+
+
+@cython.cdivision(True)
+cdef void _elliptical_sampled(double x_lo, double x_hi, double y_lo,
+                              double y_hi, int nx, int ny, double a_in,
+                              double b_in, double a_out, double b_out,
+                              double theta, int subpixels, double* frac,
+                              double* xs, double* ys) nogil:
+    """Fraction of subpixels whose centers are within an ellipse (or an
+    elliptical annulus, if a_in and b_in are non-zero)."""
+    cdef int i, j
+    cdef double x_size, y_size, cos_theta, sin_theta
+    cdef double numerator1, numerator2, t1, t2
+    cdef bint annulus = a_in != 0. and b_in != 0.
+    cdef bint in_aper
+    cdef Py_ssize_t k
+
+    x_size = (x_hi - x_lo) / (nx * subpixels)
+    y_size = (y_hi - y_lo) / (ny * subpixels)
+    _arange(x_lo + x_size / 2., x_size, nx * subpixels, xs)
+    _arange(y_lo + y_size / 2., y_size, ny * subpixels, ys)
+    cos_theta = cos(theta)
+    sin_theta = sin(theta)
+
+    for j in range(ny * subpixels):
+        for i in range(nx * subpixels):
+            numerator1 = xs[i] * cos_theta + ys[j] * sin_theta
+            numerator2 = ys[j] * cos_theta - xs[i] * sin_theta
+            t1 = numerator1 / a_out
+            t2 = numerator2 / b_out
+            in_aper = t1 * t1 + t2 * t2 < 1.
+            if in_aper and annulus:
+                t1 = numerator1 / a_in
+                t2 = numerator2 / b_in
+                in_aper = t1 * t1 + t2 * t2 > 1.
+            if in_aper:
+                frac[(j // subpixels) * nx + i // subpixels] += 1.
+
+    if subpixels > 1:
+        for k in range(<Py_ssize_t>nx * ny):
+            frac[k] /= subpixels * subpixels
+
+
+cdef double _pairwise_sum(double* a, Py_ssize_t n) nogil:
+    """Sum of n values, using the same pairwise summation as `numpy.sum`
+    so that results are identical to the latter."""
+    cdef Py_ssize_t i, n2
+    cdef double res
+    cdef double r[8]
+
+    if n < 8:
+        res = 0.
+        for i in range(n):
+            res += a[i]
+        return res
+    elif n <= 128:
+        for i in range(8):
+            r[i] = a[i]
+        i = 8
+        while i < n - (n % 8):
+            r[0] += a[i + 0]
+            r[1] += a[i + 1]
+            r[2] += a[i + 2]
+            r[3] += a[i + 3]
+            r[4] += a[i + 4]
+            r[5] += a[i + 5]
+            r[6] += a[i + 6]
+            r[7] += a[i + 7]
+            i += 8
+        res = ((r[0] + r[1]) + (r[2] + r[3])) + \
+              ((r[4] + r[5]) + (r[6] + r[7]))
+        while i < n:
+            res += a[i]
+            i += 1
+        return res
+    else:
+        # Divide by two, but avoid non-multiples of the unroll factor.
+        n2 = n // 2
+        n2 -= n2 % 8
+        return _pairwise_sum(a, n2) + _pairwise_sum(a + n2, n - n2)
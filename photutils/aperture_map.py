@@ -0,0 +1,254 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+
+"""Aperture photometry centered on every pixel of an image."""
+
+from __future__ import division
+
+import math
+
+import numpy as np
+
+from .aperture import Aperture
+
+__all__ = ["aperture_photometry_map"]
+
+
+# Above this number of non-zero kernel values per output value, 'auto'
+# convolution uses FFTs rather than shifted sums.
+_FFT_THRESHOLD = 25
+
+
+def aperture_photometry_map(data, aperture, error=None, gain=None,
+                            method='exact', subpixels=5,
+                            pixelwise_errors=True, step=1,
+                            convolution='auto', tile_size=1024):
+    """Sum flux within an aperture centered on every pixel of an image.
+
+    The fraction of each pixel covered by the aperture does not depend on
+    the pixel it is centered on, so the flux map is the correlation of the
+    image with a kernel made once by the aperture's ``encloses`` method.
+    The correlation is done either directly, as a sum of shifted images
+    weighted by the non-zero kernel values, or with FFTs, whose cost does
+    not depend on the size of the aperture. Large images are processed in
+    tiles (with margins for the size of the aperture), so that the memory
+    used is bounded.
+
+    Parameters
+    ----------
+    data : array_like
+        The 2-d array on which to perform photometry. It can be a
+        memory-mapped array, of which only a tile at a time is read.
+    aperture : `Aperture`
+        The aperture, centered on each pixel.
+    error, gain, method, subpixels, pixelwise_errors
+        See `aperture_photometry`.
+    step : int, optional
+        Only center the aperture on every ``step``-th pixel along each
+        axis, starting from pixel (0, 0).
+    convolution : {'auto', 'direct', 'fft'}, optional
+        How to compute the correlation. 'auto' uses FFTs for apertures
+        with more than a few tens of pixels (per output value, if
+        ``step`` > 1). FFTs spread the rounding errors of the whole tile,
+        whose relative size is about 1e-15 of its largest values, to
+        every value, and non-finite values to the whole tile.
+    tile_size : int, optional
+        Size of the (square) tiles of output pixel positions, in pixels.
+        It is rounded up to a multiple of ``step``.
+
+    Returns
+    -------
+    flux : `~numpy.ndarray`
+        Enclosed flux, of shape ``(ceil(ny / step), ceil(nx / step))``
+        for an image of shape ``(ny, nx)``: ``flux[j, i]`` is the flux in
+        the aperture centered on pixel ``(i * step, j * step)``, as given
+        by ``aperture_photometry(data, i * step, j * step, aperture)``
+        to the rounding errors of the sums.
+    fluxerr : `~numpy.ndarray`
+        Uncertainty in flux values. Only returned if error is not `None`.
+    """
+
+    data = np.asanyarray(data)
+    if data.ndim != 2:
+        raise ValueError('{0}-d array not supported. '
+                         'Only 2-d arrays supported.'.format(data.ndim))
+    if not isinstance(aperture, Aperture):
+        raise TypeError("'aperture' must be an instance of Aperture.")
+    step = int(step)
+    if step < 1:
+        raise ValueError('step: an integer greater than 0 is required')
+    tile_size = int(tile_size)
+    if tile_size < 1:
+        raise ValueError('tile_size: an integer greater than 0 is required')
+    tile_size = -(-tile_size // step) * step
+    if convolution not in ('auto', 'direct', 'fft'):
+        raise ValueError("convolution must be 'auto', 'direct' or 'fft'")
+    if method == 'subpixel':
+        subpixels = int(subpixels)
+        if subpixels < 1:
+            raise ValueError('subpixels: an integer greater than 0 is '
+                             'required')
+
+    # Check error and gain as aperture_photometry does.
+    if ((error is None) or
+        (np.isscalar(error) and gain is None) or
+        (np.isscalar(error) and np.isscalar(gain))):
+        pixelwise_errors = False
+    if error is not None:
+        if np.isscalar(error):
+            error = np.broadcast_to(error, data.shape)
+        if error.shape != data.shape:
+            raise ValueError('shapes of error array and data array must'
+                             ' match')
+    if gain is not None:
+        if error is None:
+            raise ValueError('gain requires error')
+        if np.isscalar(gain):
+            gain = np.broadcast_to(gain, data.shape)
+        if gain.shape != data.shape:
+            raise ValueError('shapes of gain array and data array must match')
+
+    kernel, x_lo, y_lo = _aperture_kernel(aperture, method, subpixels)
+    if convolution == 'auto':
+        nonzero = np.count_nonzero(kernel)
+        convolution = ('fft' if nonzero > _FFT_THRESHOLD * step * step
+                       else 'direct')
+
+    ny, nx = data.shape
+    flux = np.zeros((-(-ny // step), -(-nx // step)), dtype=np.float64)
+    fluxvar = None
+    if pixelwise_errors:
+        fluxvar = np.zeros(flux.shape, dtype=np.float64)
+
+    kernel_ffts = {}
+    for y0 in range(0, ny, tile_size):
+        y1 = min(y0 + tile_size, ny)
+        for x0 in range(0, nx, tile_size):
+            x1 = min(x0 + tile_size, nx)
+
+            # The tile of the image needed for the output positions [x0,
+            # x1) x [y0, y1), padded with zeros outside the image.
+            edges = (x0 + x_lo, x1 + x_lo + kernel.shape[1] - 1,
+                     y0 + y_lo, y1 + y_lo + kernel.shape[0] - 1)
+            tile = _padded_tile(data, *edges)
+            if pixelwise_errors:
+                variance = _padded_tile(error, *edges)
+                variance *= variance
+                if gain is not None:
+                    variance += tile / _padded_tile(gain, *edges, fill=1.)
+
+            out = (slice(y0 // step, -(-y1 // step)),
+                   slice(x0 // step, -(-x1 // step)))
+            if convolution == 'fft':
+                flux[out] = _correlate_fft(tile, kernel, step, kernel_ffts)
+                if pixelwise_errors:
+                    fluxvar[out] = _correlate_fft(variance, kernel, step,
+                                                  kernel_ffts)
+            else:
+                flux[out] = _correlate_direct(tile, kernel, step)
+                if pixelwise_errors:
+                    fluxvar[out] = _correlate_direct(variance, kernel, step)
+
+    if error is None:
+        return flux
+
+    if not pixelwise_errors:
+        # Assume error and gain are constant over whole aperture.
+        local_error = np.asarray(error[::step, ::step], dtype=np.float64)
+        if hasattr(aperture, 'area'):
+            area = aperture.area()
+        else:
+            area = kernel.sum()
+        fluxvar = local_error ** 2 * area
+        if gain is not None:
+            fluxvar += flux / gain[::step, ::step]
+
+    # Make sure variance is > 0 when converting to st. dev.
+    return flux, np.sqrt(np.where(0. > fluxvar, 0., fluxvar))
+
+
+def _aperture_kernel(aperture, method, subpixels):
+    """The fractions of the pixels covered by ``aperture`` centered on a
+    pixel, as a 2-d array trimmed of its zero edges, and the offsets of
+    its first column and row from the center pixel."""
+
+    # Sub-array bounds as in aperture_photometry, for an integer center.
+    extent = aperture.extent()
+    x_lo = int(math.floor(extent[0] + 0.5))
+    x_hi = int(math.floor(extent[1] + 1.5))
+    y_lo = int(math.floor(extent[2] + 0.5))
+    y_hi = int(math.floor(extent[3] + 1.5))
+    kernel = aperture.encloses(x_lo - 0.5, x_hi - 0.5, y_lo - 0.5,
+                               y_hi - 0.5, x_hi - x_lo, y_hi - y_lo,
+                               method=method, subpixels=subpixels)
+    kernel = np.asarray(kernel, dtype=np.float64)
+
+    rows = np.flatnonzero(kernel.any(axis=1))
+    cols = np.flatnonzero(kernel.any(axis=0))
+    if rows.size == 0:
+        return np.zeros((1, 1)), 0, 0
+    kernel = kernel[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+    return kernel, x_lo + cols[0], y_lo + rows[0]
+
+
+def _padded_tile(array, x0, x1, y0, y1, fill=0.):
+    """A float64 copy of ``array[y0:y1, x0:x1]``, with ``fill`` for the
+    pixels outside ``array``."""
+    tile = np.full((y1 - y0, x1 - x0), fill, dtype=np.float64)
+    ny, nx = array.shape
+    ys = slice(max(y0, 0), min(y1, ny))
+    xs = slice(max(x0, 0), min(x1, nx))
+    if ys.start < ys.stop and xs.start < xs.stop:
+        tile[ys.start - y0:ys.stop - y0,
+             xs.start - x0:xs.stop - x0] = array[ys, xs]
+    return tile
+
+
+def _correlate_direct(tile, kernel, step):
+    """Correlate ``tile`` with ``kernel``, keeping every ``step``-th value
+    of the part that does not depend on values beyond the tile, as a sum
+    of shifted tiles."""
+
+    ky, kx = kernel.shape
+    ny = tile.shape[0] - ky + 1
+    nx = tile.shape[1] - kx + 1
+    out = np.zeros((-(-ny // step), -(-nx // step)), dtype=np.float64)
+    for j, i in zip(*np.nonzero(kernel)):
+        out += kernel[j, i] * tile[j:j + ny:step, i:i + nx:step]
+    return out
+
+
+def _correlate_fft(tile, kernel, step, kernel_ffts):
+    """Same as `_correlate_direct`, with FFTs. The transforms of the
+    kernel are kept in the dict ``kernel_ffts`` for tiles of the same
+    size."""
+
+    ky, kx = kernel.shape
+    ny = tile.shape[0] - ky + 1
+    nx = tile.shape[1] - kx + 1
+    shape = (_fft_size(tile.shape[0]), _fft_size(tile.shape[1]))
+    if shape not in kernel_ffts:
+        # Correlation is convolution with the flipped kernel.
+        kernel_ffts[shape] = np.fft.rfft2(kernel[::-1, ::-1], shape)
+
+    # The circular convolution equals the linear one past the first
+    # ky - 1 rows and kx - 1 columns.
+    result = np.fft.irfft2(np.fft.rfft2(tile, shape) * kernel_ffts[shape],
+                           shape)
+    return result[ky - 1:ky - 1 + ny:step, kx - 1:kx - 1 + nx:step]
+
+
+def _fft_size(n):
+    """The smallest integer >= n with no prime factors other than 2, 3 and
+    5, for which FFTs are fast."""
+    best = 2 ** int(math.ceil(math.log(max(n, 1), 2)))
+    p5 = 1
+    while p5 < best:
+        p35 = p5
+        while p35 < best:
+            size = p35
+            while size < n:
+                size *= 2
+            best = min(best, size)
+            p35 *= 3
+        p5 *= 5
+    return best
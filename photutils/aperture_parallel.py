@@ -0,0 +1,154 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+
+"""Aperture photometry of large catalogs with a pool of processes."""
+
+from __future__ import division
+
+import os
+import shutil
+import tempfile
+import multiprocessing
+
+import numpy as np
+
+from .aperture import (aperture_photometry, _check_apertures,
+                       _broadcast_apertures)
+
+__all__ = ["aperture_photometry_parallel"]
+
+
+# Arrays shared with the worker processes, set by `_init_worker`.
+_shared = {}
+
+
+def aperture_photometry_parallel(data, xc, yc, apertures, error=None,
+                                 gain=None, mask=None, method='exact',
+                                 subpixels=5, pixelwise_errors=True,
+                                 processes=None, min_objects=20000):
+    """Sum flux within aperture(s), using a pool of processes.
+
+    This function takes the same arguments and returns the same results as
+    `aperture_photometry`, but partitions the objects between several
+    processes. The ``data``, ``error``, ``gain`` and ``mask`` arrays are
+    written once to memory-mapped files that all the processes read,
+    instead of being sent to each of them.
+
+    Parameters
+    ----------
+    data, xc, yc, apertures, error, gain, mask, method, subpixels,
+    pixelwise_errors
+        See `aperture_photometry`.
+    processes : int, optional
+        Number of worker processes. By default, the number of CPUs.
+    min_objects : int, optional
+        If there are fewer objects than this, or a single process, the
+        photometry is done serially in this process with
+        `aperture_photometry`, since it is then faster than starting the
+        pool of processes.
+
+    Returns
+    -------
+    flux : float or `~numpy.ndarray`
+        Enclosed flux in aperture(s). See `aperture_photometry`.
+    fluxerr : float or `~numpy.ndarray`
+        Uncertainty in flux values. Only returned if error is not `None`.
+    """
+
+    kwargs = dict(method=method, subpixels=subpixels,
+                  pixelwise_errors=pixelwise_errors)
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    processes = int(processes)
+    if processes < 1:
+        raise ValueError('processes: an integer greater than 0 is required')
+
+    # Small catalogs (and invalid object centers, for which
+    # aperture_photometry raises the appropriate exception) are done
+    # serially.
+    scalar_obj_centers = np.isscalar(xc) and np.isscalar(yc)
+    xc_1d = np.atleast_1d(xc)
+    yc_1d = np.atleast_1d(yc)
+    if (processes == 1 or xc_1d.shape[0] < min_objects or
+            xc_1d.ndim != 1 or yc_1d.shape != xc_1d.shape):
+        return aperture_photometry(data, xc, yc, apertures, error=error,
+                                   gain=gain, mask=mask, **kwargs)
+    xc, yc = xc_1d, yc_1d
+    n_obj = xc.shape[0]
+
+    # Broadcast the apertures to (N_apertures, N_objects) so that they can
+    # be split between the processes along with the objects.
+    apertures = _check_apertures(apertures, n_obj)
+    n_aper = apertures.shape[0]
+    apertures = _broadcast_apertures(apertures, (n_aper, n_obj))
+
+    # Scalars are sent to the workers as they are, arrays are shared.
+    tmpdir = tempfile.mkdtemp(prefix='photutils-')
+    try:
+        shared = {}
+        for name, array in [('data', data), ('error', error), ('gain', gain),
+                            ('mask', mask)]:
+            if array is None or np.isscalar(array):
+                kwargs[name] = array
+            else:
+                shared[name] = os.path.join(tmpdir, name + '.npy')
+                np.save(shared[name], np.asarray(array))
+
+        edges = np.linspace(0, n_obj, min(n_obj, processes * 4) + 1)
+        edges = edges.astype(int)
+        chunks = [(xc[start:stop], yc[start:stop],
+                   apertures[:, start:stop], kwargs)
+                  for start, stop in zip(edges[:-1], edges[1:])]
+
+        pool = multiprocessing.Pool(processes, initializer=_init_worker,
+                                    initargs=(shared,))
+        try:
+            results = pool.map(_photometry_chunk, chunks)
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    flux = np.concatenate([result[0] for result in results], axis=1)
+    if error is not None:
+        fluxerr = np.concatenate([result[1] for result in results], axis=1)
+
+    # Return scalars, 1-d or 2-d arrays, as aperture_photometry does.
+    if scalar_obj_centers and n_aper == 1:
+        flux = flux[0, 0]
+        if error is not None:
+            fluxerr = fluxerr[0, 0]
+    elif n_aper == 1:
+        flux = flux[0]
+        if error is not None:
+            fluxerr = fluxerr[0]
+
+    if error is None:
+        return flux
+    else:
+        return flux, fluxerr
+
+
+def _init_worker(shared):
+    """Open the shared arrays (read-only memory maps) in a worker."""
+    _shared.clear()
+    for name, filename in shared.items():
+        _shared[name] = np.load(filename, mmap_mode='r')
+
+
+def _photometry_chunk(args):
+    """Photometry of a chunk of objects in a worker. Returns 2-d flux and
+    fluxerr arrays (the latter is `None` if there is no error)."""
+
+    xc, yc, apertures, kwargs = args
+    kwargs = dict(kwargs)
+    kwargs.update(_shared)
+    result = aperture_photometry(kwargs.pop('data'), xc, yc, apertures,
+                                 **kwargs)
+
+    shape = apertures.shape
+    if kwargs['error'] is None:
+        return np.reshape(result, shape), None
+    else:
+        return np.reshape(result[0], shape), np.reshape(result[1], shape)
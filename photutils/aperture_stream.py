@@ -0,0 +1,111 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+
+"""Aperture photometry of catalogs read in chunks from an iterable."""
+
+from __future__ import division
+
+from itertools import islice
+
+import numpy as np
+
+from .aperture import Aperture, aperture_photometry
+
+__all__ = ["iter_aperture_photometry"]
+
+
+def iter_aperture_photometry(data, sources, apertures=None,
+                             chunk_size=10000, **kwargs):
+    """Sum flux within aperture(s) for chunks of objects read from an
+    iterable.
+
+    The objects are read ``chunk_size`` at a time, and the results of each
+    chunk are yielded before the next one is read, so that the memory used
+    does not depend on the number of objects.
+
+    Parameters
+    ----------
+    data : array_like
+        The 2-d array on which to perform photometry (see
+        `aperture_photometry`; it may be a memory-mapped array).
+    sources : iterable or `~numpy.ndarray`
+        The objects. Each item is a sequence ``(x, y)`` of the coordinates
+        of an object center, or ``(x, y, aperture)`` where ``aperture`` is
+        an `Aperture` or a sequence of N_apertures `Aperture` objects (the
+        same number for all objects), such as the rows of a CSV reader
+        after conversion. A (N_objects, 2) array (e.g., a memory-mapped
+        ``.npy`` file) is sliced directly into chunks.
+    apertures : `Aperture` object or array of `Aperture` objects, optional
+        The apertures used for all objects, of shape ``()``, ``(1,)`` or
+        ``(N_apertures, 1)`` (see `aperture_photometry`). Required if the
+        items of ``sources`` do not give the apertures.
+    chunk_size : int, optional
+        Number of objects measured at a time.
+    kwargs
+        Other keyword arguments of `aperture_photometry` (``error``,
+        ``gain``, ``mask``, ``method``, etc.). For repeated calls on the
+        same image, ``prefix_sums`` should be a `PrefixSums` instance
+        rather than True, which would compute the sums for each chunk.
+
+    Yields
+    ------
+    flux or (flux, fluxerr) : `~numpy.ndarray`
+        The results of `aperture_photometry` for each chunk of objects, in
+        the order of ``sources``: 1-d arrays of length (at most)
+        ``chunk_size`` if there is a single aperture per object, and
+        (N_apertures, chunk_size) arrays otherwise.
+    """
+
+    chunk_size = int(chunk_size)
+    if chunk_size < 1:
+        raise ValueError('chunk_size: an integer greater than 0 is required')
+
+    if isinstance(sources, np.ndarray):
+        if apertures is None:
+            raise ValueError('apertures are required for an array of '
+                             'object centers')
+        if sources.ndim != 2 or sources.shape[1] != 2:
+            raise ValueError('an array of object centers must have a shape '
+                             '(N_objects, 2)')
+        for start in range(0, sources.shape[0], chunk_size):
+            centers = np.asarray(sources[start:start + chunk_size],
+                                 dtype=np.float64)
+            yield aperture_photometry(data, centers[:, 0], centers[:, 1],
+                                      apertures, **kwargs)
+        return
+
+    sources = iter(sources)
+    while True:
+        rows = list(islice(sources, chunk_size))
+        if not rows:
+            return
+        xc = np.array([row[0] for row in rows], dtype=np.float64)
+        yc = np.array([row[1] for row in rows], dtype=np.float64)
+        if apertures is not None:
+            chunk_apertures = apertures
+        else:
+            chunk_apertures = _row_apertures(rows)
+        yield aperture_photometry(data, xc, yc, chunk_apertures, **kwargs)
+
+
+def _row_apertures(rows):
+    """(N_apertures, N_objects) object array of the apertures given by the
+    third item of each row."""
+
+    n_aper = None
+    result = None
+    for i, row in enumerate(rows):
+        if len(row) < 3:
+            raise ValueError('each source must give its apertures if '
+                             '`apertures` is not given')
+        row_apertures = row[2]
+        if isinstance(row_apertures, Aperture):
+            row_apertures = [row_apertures]
+        if result is None:
+            n_aper = len(row_apertures)
+            result = np.empty((n_aper, len(rows)), dtype=object)
+        if len(row_apertures) != n_aper:
+            raise ValueError('all sources must have the same number of '
+                             'apertures')
+        for j, aperture in enumerate(row_apertures):
+            result[j, i] = aperture
+    return result
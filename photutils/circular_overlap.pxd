@@ -0,0 +1,21 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+
+# C-level interface to circular_overlap.pyx, for use by other Cython modules.
+
+cdef void _circular_overlap_grid(double xmin, double xmax, double ymin,
+                                 double ymax, int nx, int ny, double R,
+                                 int use_exact, int subpixels,
+                                 double* frac) nogil
+
+cdef void _circular_annulus_overlap_grid(double xmin, double xmax,
+                                         double ymin, double ymax, int nx,
+                                         int ny, double R_in, double R_out,
+                                         int use_exact, int subpixels,
+                                         double* frac) nogil
+
+cdef double _overlap_single_subpixel(double x0, double y0, double x1,
+                                     double y1, double R,
+                                     int subpixels) nogil
+
+cdef double _overlap_single_exact(double xmin, double ymin, double xmax,
+                                  double ymax, double r) nogil
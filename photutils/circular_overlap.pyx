@@ -2,6 +2,10 @@
 
 # The functions defined here allow one to determine the exact area of
 # overlap of a rectangle and a circle (written by Thomas Robitaille).
+#
+# The computation is done by C-level functions (prefixed with an
+# underscore) that do not require the GIL. The Python-level functions of
+# the same name are thin wrappers around them, kept for testing.
 
 from __future__ import division
 import numpy as np
@@ -9,15 +13,19 @@ cimport numpy as np
 
 cdef extern from "math.h":
 
-    double asin(double x)
-    double sin(double x)
-    double sqrt(double x)
+    double asin(double x) nogil
+    double sin(double x) nogil
+    double sqrt(double x) nogil
+    double fabs(double x) nogil
 
 DTYPE = np.float64
 ctypedef np.float64_t DTYPE_t
 
+cimport cython
+
+
 def distance(double x1, double y1, double x2, double y2):
-    return sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
+    return _distance(x1, y1, x2, y2)
 
 
 def area_arc(double x1, double y1, double x2, double y2, double R):
@@ -27,18 +35,14 @@ def area_arc(double x1, double y1, double x2, double y2, double R):
     ----------
     http://mathworld.wolfram.com/CircularSegment.html
     """
-
-    cdef double a, theta
-    a = distance(x1, y1, x2, y2)
-    theta = 2. * asin(0.5 * a / R)
-    return 0.5 * R * R * (theta - sin(theta))
+    return _area_arc(x1, y1, x2, y2, R)
 
 
 def area_triangle(double x1, double y1, double x2, double y2, double x3,
                   double y3):
     """Area of a triangle defined by three vertices.
     """
-    return 0.5 * abs(x1 * (y2 - y3) + x2 * (y3 - y1) + x3 * (y1 - y2))
+    return _area_triangle(x1, y1, x2, y2, x3, y3)
 
 
 def circular_overlap_grid(double xmin, double xmax, double ymin, double ymax,
@@ -48,11 +52,95 @@ def circular_overlap_grid(double xmin, double xmax, double ymin, double ymax,
     a given grid of pixels, using either an exact overlap method, or by
     subsampling a pixel."""
 
-    cdef unsigned int i, j
-    cdef double x, y, dx, dy, d, pixrad, xlim0, xlim1, ylim0, ylim1
+    # Output array
+    cdef np.ndarray[DTYPE_t, ndim=2, mode='c'] frac = \
+        np.zeros([ny, nx], dtype=DTYPE)
+
+    # A circle of zero radius does not overlap any pixel.
+    if nx > 0 and ny > 0 and R > 0.:
+        with nogil:
+            _circular_overlap_grid(xmin, xmax, ymin, ymax, nx, ny, R,
+                                   use_exact, subpixels, &frac[0, 0])
+
+    return frac
+
+
+def circular_annulus_overlap_grid(double xmin, double xmax, double ymin,
+                                  double ymax, int nx, int ny, double R_in,
+                                  double R_out, int use_exact,
+                                  int subpixels):
+    """For a circular annulus of radii R_in and R_out, find the area of
+    overlap in each element on a given grid of pixels, using either an
+    exact overlap method, or by subsampling a pixel. This gives the same
+    result as subtracting the grids of the two circles."""
 
     # Output array
-    cdef np.ndarray[DTYPE_t, ndim=2] frac = np.zeros([ny, nx], dtype=DTYPE)
+    cdef np.ndarray[DTYPE_t, ndim=2, mode='c'] frac = \
+        np.zeros([ny, nx], dtype=DTYPE)
+
+    if nx > 0 and ny > 0 and R_out > 0.:
+        with nogil:
+            _circular_annulus_overlap_grid(xmin, xmax, ymin, ymax, nx, ny,
+                                           R_in, R_out, use_exact, subpixels,
+                                           &frac[0, 0])
+
+    return frac
+
+
+def overlap_single_subpixel(double x0, double y0, double x1, double y1,
+                            double R, int subpixels):
+    """Return the fraction of overlap between a circle and a single pixel
+    with given extent, using a sub-pixel sampling method."""
+    return _overlap_single_subpixel(x0, y0, x1, y1, R, subpixels)
+
+
+def overlap_single_exact(double xmin, double ymin, double xmax, double ymax,
+                         double r):
+    '''
+    Area of overlap of a rectangle and a circle
+    '''
+    return _overlap_single_exact(xmin, ymin, xmax, ymax, r)
+
+
+def circular_overlap_core(double xmin, double ymin, double xmax, double ymax,
+                          double R):
+    """Assumes that the center of the circle is <= xmin,
+    ymin (can always modify input to conform to this).
+    """
+    return _circular_overlap_core(xmin, ymin, xmax, ymax, R)
+
+
+@cython.cdivision(True)
+cdef inline double _distance(double x1, double y1, double x2,
+                             double y2) nogil:
+    return sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
+
+
+@cython.cdivision(True)
+cdef inline double _area_arc(double x1, double y1, double x2, double y2,
+                             double R) nogil:
+    cdef double a, theta
+    a = _distance(x1, y1, x2, y2)
+    theta = 2. * asin(0.5 * a / R)
+    return 0.5 * R * R * (theta - sin(theta))
+
+
+@cython.cdivision(True)
+cdef inline double _area_triangle(double x1, double y1, double x2, double y2,
+                                  double x3, double y3) nogil:
+    return 0.5 * fabs(x1 * (y2 - y3) + x2 * (y3 - y1) + x3 * (y1 - y2))
+
+
+@cython.cdivision(True)
+cdef void _circular_overlap_grid(double xmin, double xmax, double ymin,
+                                 double ymax, int nx, int ny, double R,
+                                 int use_exact, int subpixels,
+                                 double* frac) nogil:
+    """Fill ``frac``, a zero-initialized C-contiguous (ny, nx) buffer, with
+    the fraction of each grid element overlapped by a circle of radius R."""
+
+    cdef int i, j
+    cdef double x, y, dx, dy, d, pixrad, xlim0, xlim1, ylim0, ylim1
 
     # Width of each element in x and y
     dx = (xmax - xmin) / nx
@@ -77,35 +165,104 @@ def circular_overlap_grid(double xmin, double xmax, double ymin, double ymax,
 
                     # If pixel center is "well within" circle, count full pixel.
                     if d < R - pixrad:
-                        frac[j, i] = 1.
+                        frac[j * nx + i] = 1.
 
                     # If pixel center is "close" to circle border, find overlap.
                     elif d < R + pixrad:
 
                         # Either do exact calculation...
                         if use_exact:
-                            frac[j, i] = overlap_single_exact(x - 0.5 * dx, \
-                                y - 0.5 * dy, x + 0.5 * dx, y + 0.5 * dy, R) \
-                                / (dx * dy)
+                            frac[j * nx + i] = _overlap_single_exact(
+                                x - 0.5 * dx, y - 0.5 * dy,
+                                x + 0.5 * dx, y + 0.5 * dy, R) / (dx * dy)
 
                         # or use subpixel samping.
                         else:
-                            frac[j, i] = overlap_single_subpixel(x - 0.5 * dx, \
-                                y - 0.5 * dy, x + 0.5 * dx, y + 0.5 * dy, R,
-                                subpixels)
+                            frac[j * nx + i] = _overlap_single_subpixel(
+                                x - 0.5 * dx, y - 0.5 * dy,
+                                x + 0.5 * dx, y + 0.5 * dy, R, subpixels)
 
                         # Otherwise, it is fully outside circle.
                         # No action needed.
 
-    return frac
 
+@cython.cdivision(True)
+cdef void _circular_annulus_overlap_grid(double xmin, double xmax,
+                                         double ymin, double ymax, int nx,
+                                         int ny, double R_in, double R_out,
+                                         int use_exact, int subpixels,
+                                         double* frac) nogil:
+    """Fill ``frac``, a zero-initialized C-contiguous (ny, nx) buffer, with
+    the fraction of each grid element overlapped by a circular annulus
+    (R_in <= R_out), in a single pass over the grid.
 
-def overlap_single_subpixel(double x0, double y0, double x1, double y1,
-                            double R, int subpixels):
-    """Return the fraction of overlap between a circle and a single pixel
-    with given extent, using a sub-pixel sampling method."""
+    Each element is either in the hole or outside (left at 0), fully
+    within the ring (1), or crossed by one or both of the circles, in
+    which case the overlap with each of them is found as in
+    `_circular_overlap_grid`, and the inner one subtracted."""
+
+    cdef int i, j
+    cdef double x, y, dx, dy, d, pixrad, outer, inner
 
-    cdef unsigned int i, j
+    # Width of each element in x and y
+    dx = (xmax - xmin) / nx
+    dy = (ymax - ymin) / ny
+    pixrad = 0.5 * sqrt(dx * dx + dy * dy)  # Radius of a single pixel
+
+    for i in range(nx):
+        x = xmin + (i + 0.5) * dx  # x coordinate of pixel center
+        if x > -R_out - 0.5 * dx and x < R_out + 0.5 * dx:
+            for j in range(ny):
+                y = ymin + (j + 0.5) * dy  # y coordinate of pixel center
+                if y > -R_out - 0.5 * dy and y < R_out + 0.5 * dy:
+
+                    d = sqrt(x * x + y * y)
+
+                    # Outside the annulus, or "well within" the hole.
+                    if d >= R_out + pixrad or d < R_in - pixrad:
+                        continue
+
+                    # "Well within" the ring.
+                    if d < R_out - pixrad and d >= R_in + pixrad:
+                        frac[j * nx + i] = 1.
+                        continue
+
+                    outer = _circle_element(x, y, dx, dy, d, pixrad, R_out,
+                                            use_exact, subpixels)
+                    inner = 0.
+                    if R_in > 0.:
+                        inner = _circle_element(x, y, dx, dy, d, pixrad,
+                                                R_in, use_exact, subpixels)
+                    frac[j * nx + i] = outer - inner
+
+
+@cython.cdivision(True)
+cdef inline double _circle_element(double x, double y, double dx, double dy,
+                                   double d, double pixrad, double R,
+                                   int use_exact, int subpixels) nogil:
+    """Overlap of a circle of radius R with the grid element centered on
+    (x, y), at distance d, as computed by `_circular_overlap_grid`."""
+
+    if (x <= -R - 0.5 * dx or x >= R + 0.5 * dx or
+            y <= -R - 0.5 * dy or y >= R + 0.5 * dy):
+        return 0.
+    if d < R - pixrad:
+        return 1.
+    if d >= R + pixrad:
+        return 0.
+    if use_exact:
+        return _overlap_single_exact(x - 0.5 * dx, y - 0.5 * dy,
+                                     x + 0.5 * dx, y + 0.5 * dy, R) / (dx * dy)
+    return _overlap_single_subpixel(x - 0.5 * dx, y - 0.5 * dy,
+                                    x + 0.5 * dx, y + 0.5 * dy, R, subpixels)
+
+
+@cython.cdivision(True)
+cdef double _overlap_single_subpixel(double x0, double y0, double x1,
+                                     double y1, double R,
+                                     int subpixels) nogil:
+
+    cdef int i, j
     cdef double x, y, dx, dy, R_squared
     cdef double frac = 0.  # Accumulator.
 
@@ -125,46 +282,44 @@ def overlap_single_subpixel(double x0, double y0, double x1, double y1,
     return frac / (subpixels * subpixels)
 
 
-def overlap_single_exact(double xmin, double ymin, double xmax, double ymax,
-                         double r):
-    '''
-    Area of overlap of a rectangle and a circle
-    '''
+@cython.cdivision(True)
+cdef double _overlap_single_exact(double xmin, double ymin, double xmax,
+                                  double ymax, double r) nogil:
+    # Not inline, since it recurses to split the rectangle into quadrants.
     if 0. <= xmin:
         if 0. <= ymin:
-            return circular_overlap_core(xmin, ymin, xmax, ymax, r)
+            return _circular_overlap_core(xmin, ymin, xmax, ymax, r)
         elif 0. >= ymax:
-            return circular_overlap_core(-ymax, xmin, -ymin, xmax, r)
+            return _circular_overlap_core(-ymax, xmin, -ymin, xmax, r)
         else:
-            return overlap_single_exact(xmin, ymin, xmax, 0., r) \
-                 + overlap_single_exact(xmin, 0., xmax, ymax, r)
+            return _overlap_single_exact(xmin, ymin, xmax, 0., r) \
+                 + _overlap_single_exact(xmin, 0., xmax, ymax, r)
     elif 0. >= xmax:
         if 0. <= ymin:
-            return circular_overlap_core(-xmax, ymin, -xmin, ymax, r)
+            return _circular_overlap_core(-xmax, ymin, -xmin, ymax, r)
         elif 0. >= ymax:
-            return circular_overlap_core(-xmax, -ymax, -xmin, -ymin, r)
+            return _circular_overlap_core(-xmax, -ymax, -xmin, -ymin, r)
         else:
-            return overlap_single_exact(xmin, ymin, xmax, 0., r) \
-                 + overlap_single_exact(xmin, 0., xmax, ymax, r)
+            return _overlap_single_exact(xmin, ymin, xmax, 0., r) \
+                 + _overlap_single_exact(xmin, 0., xmax, ymax, r)
     else:
         if 0. <= ymin:
-            return overlap_single_exact(xmin, ymin, 0., ymax, r) \
-                 + overlap_single_exact(0., ymin, xmax, ymax, r)
+            return _overlap_single_exact(xmin, ymin, 0., ymax, r) \
+                 + _overlap_single_exact(0., ymin, xmax, ymax, r)
         if 0. >= ymax:
-            return overlap_single_exact(xmin, ymin, 0., ymax, r) \
-                 + overlap_single_exact(0., ymin, xmax, ymax, r)
+            return _overlap_single_exact(xmin, ymin, 0., ymax, r) \
+                 + _overlap_single_exact(0., ymin, xmax, ymax, r)
         else:
-            return overlap_single_exact(xmin, ymin, 0., 0., r) \
-                 + overlap_single_exact(0., ymin, xmax, 0., r) \
-                 + overlap_single_exact(xmin, 0., 0., ymax, r) \
-                 + overlap_single_exact(0., 0., xmax, ymax, r)
+            return _overlap_single_exact(xmin, ymin, 0., 0., r) \
+                 + _overlap_single_exact(0., ymin, xmax, 0., r) \
+                 + _overlap_single_exact(xmin, 0., 0., ymax, r) \
+                 + _overlap_single_exact(0., 0., xmax, ymax, r)
 
 
-def circular_overlap_core(double xmin, double ymin, double xmax, double ymax,
-                          double R):
-    """Assumes that the center of the circle is <= xmin,
-    ymin (can always modify input to conform to this).
-    """
+@cython.cdivision(True)
+cdef inline double _circular_overlap_core(double xmin, double ymin,
+                                          double xmax, double ymax,
+                                          double R) nogil:
 
     cdef double area, d1, d2, x1, x2, y1, y2
 
@@ -179,18 +334,18 @@ def circular_overlap_core(double xmin, double ymin, double xmax, double ymax,
         if d1 < R and d2 < R:
             x1, y1 = sqrt(R * R - ymax * ymax), ymax
             x2, y2 = xmax, sqrt(R * R - xmax * xmax)
-            area = (xmax - xmin) * (ymax - ymin) - area_triangle(x1, y1, x2, y2, xmax, ymax) + area_arc(x1, y1, x2, y2, R)
+            area = (xmax - xmin) * (ymax - ymin) - _area_triangle(x1, y1, x2, y2, xmax, ymax) + _area_arc(x1, y1, x2, y2, R)
         elif d1 < R:
             x1, y1 = xmin, sqrt(R * R - xmin * xmin)
             x2, y2 = xmax, sqrt(R * R - xmax * xmax)
-            area = area_arc(x1, y1, x2, y2, R) + area_triangle(x1, y1, x1, ymin, xmax, ymin) + area_triangle(x1, y1, x2, ymin, x2, y2)
+            area = _area_arc(x1, y1, x2, y2, R) + _area_triangle(x1, y1, x1, ymin, xmax, ymin) + _area_triangle(x1, y1, x2, ymin, x2, y2)
         elif d2 < R:
             x1, y1 = sqrt(R * R - ymin * ymin), ymin
             x2, y2 = sqrt(R * R - ymax * ymax), ymax
-            area = area_arc(x1, y1, x2, y2, R) + area_triangle(x1, y1, xmin, y1, xmin, ymax) + area_triangle(x1, y1, xmin, y2, x2, y2)
+            area = _area_arc(x1, y1, x2, y2, R) + _area_triangle(x1, y1, xmin, y1, xmin, ymax) + _area_triangle(x1, y1, xmin, y2, x2, y2)
         else:
             x1, y1 = sqrt(R * R - ymin * ymin), ymin
             x2, y2 = xmin, sqrt(R * R - xmin * xmin)
-            area = area_arc(x1, y1, x2, y2, R) + area_triangle(x1, y1, x2, y2, xmin, ymin)
+            area = _area_arc(x1, y1, x2, y2, R) + _area_triangle(x1, y1, x2, y2, xmin, ymin)
 
     return area
@@ -0,0 +1,25 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+
+# C-level interface to elliptical_exact.pyx, for use by other Cython modules.
+
+cdef void _elliptical_overlap_grid(double* x, double* y, int nx, int ny,
+                                   double dx, double dy, double theta,
+                                   double* frac) nogil
+
+cdef void _elliptical_annulus_overlap_grid(double* x, double* y, int nx,
+                                           int ny, double dx_in,
+                                           double dy_in, double dx_out,
+                                           double dy_out, double theta,
+                                           double* frac) nogil
+
+cdef void _elliptical_half_widths(double dx, double dy, double theta,
+                                  double* x_half, double* y_half) nogil
+
+cdef int _elliptical_element_class(double xmin, double ymin, double xmax,
+                                   double ymax, double dx, double dy,
+                                   double cos_m_theta,
+                                   double sin_m_theta) nogil
+
+cdef double _elliptical_overlap_single(double xmin, double ymin, double xmax,
+                                       double ymax, double dx, double dy,
+                                       double theta) nogil
@@ -5,6 +5,11 @@
 # The approach is to divide the rectangle into two triangles, and
 # reproject these so that the ellipse is a unit circle, then compute the
 # intersection of a triagnel with a unit circle.
+#
+# The computation is done by C-level functions (prefixed with an
+# underscore) that do not require the GIL and that pass points around as
+# structs rather than tuples. The Python-level functions of the same name
+# are thin wrappers around them, kept for testing.
 
 from __future__ import division
 import numpy as np
@@ -12,21 +17,32 @@ cimport numpy as np
 
 cdef extern from "math.h":
 
-    double asin(double x)
-    double sin(double x)
-    double cos(double x)
-    double sqrt(double x)
-
-from cpython cimport bool
+    double asin(double x) nogil
+    double sin(double x) nogil
+    double cos(double x) nogil
+    double sqrt(double x) nogil
+    double fabs(double x) nogil
 
 DTYPE = np.float64
 ctypedef np.float64_t DTYPE_t
 
 cimport cython
 
+cdef double PI = np.pi
+
+
+ctypedef struct point:
+    double x
+    double y
+
+
+ctypedef struct intersections:
+    point p1
+    point p2
+
 
 def distance(double x1, double y1, double x2, double y2):
-    return sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
+    return _distance(x1, y1, x2, y2)
 
 
 def area_arc_unit(double x1, double y1, double x2, double y2):
@@ -37,23 +53,291 @@ def area_arc_unit(double x1, double y1, double x2, double y2):
     ----------
     http://mathworld.wolfram.com/CircularSegment.html
     '''
-    cdef double a, theta
-    a = distance(x1, y1, x2, y2)
-    theta = 2. * asin(0.5 * a)
-    return 0.5 * (theta - sin(theta))
+    return _area_arc_unit(x1, y1, x2, y2)
 
 
 def area_triangle(double x1, double y1, double x2, double y2, double x3, double y3):
     '''
     Area of a triangle defined by three vertices
     '''
-    return 0.5 * abs(x1 * (y2 - y3) + x2 * (y3 - y1) + x3 * (y1 - y2))
+    return _area_triangle(x1, y1, x2, y2, x3, y3)
 
 
 def in_triangle(double x, double y, double x1, double y1, double x2, double y2, double x3, double y3):
     '''
     Check if a point (x,y) is inside a triangle
     '''
+    return _in_triangle(x, y, x1, y1, x2, y2, x3, y3) == 1
+
+
+def circle_line(double x1, double y1, double x2, double y2):
+    '''Intersection of a line defined by two points with a unit circle'''
+    cdef intersections inter = _circle_line(x1, y1, x2, y2)
+    return inter.p1.x, inter.p1.y, inter.p2.x, inter.p2.y
+
+
+def circle_segment_single2(double x1, double y1, double x2, double y2):
+    '''
+    The intersection of a line with the unit circle. The intersection the
+    closest to (x2, y2) is chosen.
+    '''
+    cdef point pt = _circle_segment_single2(x1, y1, x2, y2)
+    return pt.x, pt.y
+
+
+def circle_segment(double x1, double y1, double x2, double y2):
+    '''
+    Intersection(s) of a segment with the unit circle. Discard any
+    solution not on the segment.
+    '''
+    cdef intersections inter = _circle_segment(x1, y1, x2, y2)
+    return inter.p1.x, inter.p1.y, inter.p2.x, inter.p2.y
+
+
+def overlap_area_triangle_unit_circle(double x1, double y1, double x2, double y2, double x3, double y3):
+    '''
+    Given a triangle defined by three points (x1, y1), (x2, y2), and
+    (x3, y3), find the area of overlap with the unit circle.
+    '''
+    return _overlap_area_triangle_unit_circle(x1, y1, x2, y2, x3, y3)
+
+
+def elliptical_overlap_single(double xmin, double ymin, double xmax, double ymax, double dx, double dy, double theta):
+    '''
+    Given a rectangle defined by (xmin, ymin, xmax, ymax) and an ellipse with major and minor axes dx and dy
+    respectively, position angle theta, and centered at the origin, find the area of overlap
+    '''
+    return _elliptical_overlap_single(xmin, ymin, xmax, ymax, dx, dy, theta)
+
+
+def elliptical_overlap_grid(np.ndarray[DTYPE_t, ndim=1] x,
+                            np.ndarray[DTYPE_t, ndim=1] y,
+                            double dx, double dy, double theta):
+    '''
+    Given a grid with walls set by x, y, find the fraction of overlap in
+    each with an ellipse with major and minor axes dx and dy
+    respectively, position angle theta, and centered at the origin.
+    '''
+
+    cdef np.ndarray[DTYPE_t, ndim=1, mode='c'] xc = np.ascontiguousarray(x)
+    cdef np.ndarray[DTYPE_t, ndim=1, mode='c'] yc = np.ascontiguousarray(y)
+    cdef int nx = xc.shape[0]
+    cdef int ny = yc.shape[0]
+    cdef np.ndarray[DTYPE_t, ndim=2, mode='c'] frac = \
+        np.zeros([ny - 1, nx - 1], dtype=DTYPE)
+
+    # An ellipse with a zero axis does not overlap any pixel.
+    if nx > 1 and ny > 1 and dx > 0. and dy > 0.:
+        with nogil:
+            _elliptical_overlap_grid(&xc[0], &yc[0], nx - 1, ny - 1,
+                                     dx, dy, theta, &frac[0, 0])
+
+    return frac
+
+
+def elliptical_annulus_overlap_grid(np.ndarray[DTYPE_t, ndim=1] x,
+                                    np.ndarray[DTYPE_t, ndim=1] y,
+                                    double dx_in, double dy_in,
+                                    double dx_out, double dy_out,
+                                    double theta):
+    '''
+    Given a grid with walls set by x, y, find the fraction of overlap in
+    each with an elliptical annulus between the ellipses with major and
+    minor axes dx_in, dy_in and dx_out, dy_out, position angle theta, and
+    centered at the origin. The inner ellipse must be within the outer one.
+    '''
+
+    cdef np.ndarray[DTYPE_t, ndim=1, mode='c'] xc = np.ascontiguousarray(x)
+    cdef np.ndarray[DTYPE_t, ndim=1, mode='c'] yc = np.ascontiguousarray(y)
+    cdef int nx = xc.shape[0]
+    cdef int ny = yc.shape[0]
+    cdef np.ndarray[DTYPE_t, ndim=2, mode='c'] frac = \
+        np.zeros([ny - 1, nx - 1], dtype=DTYPE)
+
+    if nx > 1 and ny > 1 and dx_out > 0. and dy_out > 0.:
+        with nogil:
+            _elliptical_annulus_overlap_grid(&xc[0], &yc[0], nx - 1, ny - 1,
+                                             dx_in, dy_in, dx_out, dy_out,
+                                             theta, &frac[0, 0])
+
+    return frac
+
+
+@cython.cdivision(True)
+cdef void _elliptical_overlap_grid(double* x, double* y, int nx, int ny,
+                                   double dx, double dy, double theta,
+                                   double* frac) nogil:
+    """Fill ``frac``, a zero-initialized C-contiguous (ny, nx) buffer, with
+    the fraction of each grid element overlapped by the ellipse. ``x`` and
+    ``y`` hold the nx + 1 and ny + 1 walls of the grid."""
+
+    cdef int i, j, element_class
+    cdef double x_half, y_half
+    cdef double cos_m_theta = cos(-theta)
+    cdef double sin_m_theta = sin(-theta)
+
+    # Find the bounding box of the rotated ellipse
+    _elliptical_half_widths(dx, dy, theta, &x_half, &y_half)
+
+    # Only the elements crossed by the ellipse need the exact overlap.
+    for i in range(nx):
+        if x[i] < x_half and x[i + 1] > - x_half:
+            for j in range(ny):
+                if y[j] < y_half and y[j + 1] > - y_half:
+                    element_class = _elliptical_element_class(
+                        x[i], y[j], x[i + 1], y[j + 1], dx, dy,
+                        cos_m_theta, sin_m_theta)
+                    if element_class == 1:
+                        frac[j * nx + i] = 1.
+                    elif element_class < 0:
+                        frac[j * nx + i] = _elliptical_overlap_single(
+                            x[i], y[j], x[i + 1], y[j + 1], dx, dy, theta) \
+                            / (x[i + 1] - x[i]) / (y[j + 1] - y[j])
+
+
+cdef void _elliptical_half_widths(double dx, double dy, double theta,
+                                  double* x_half, double* y_half) nogil:
+    """Half-widths of the bounding box of an ellipse with major and minor
+    axes dx and dy and position angle theta."""
+    cdef double c = cos(theta), s = sin(theta)
+    x_half[0] = sqrt(dx * dx * c * c + dy * dy * s * s)
+    y_half[0] = sqrt(dx * dx * s * s + dy * dy * c * c)
+
+
+@cython.cdivision(True)
+cdef void _elliptical_annulus_overlap_grid(double* x, double* y, int nx,
+                                           int ny, double dx_in,
+                                           double dy_in, double dx_out,
+                                           double dy_out, double theta,
+                                           double* frac) nogil:
+    """Fill ``frac``, a zero-initialized C-contiguous (ny, nx) buffer, with
+    the fraction of each grid element overlapped by the elliptical annulus,
+    in a single pass over the grid. Elements entirely outside the outer
+    ellipse or inside the inner one are left at 0, those entirely within
+    the ring are set to 1, and the exact overlap is only computed with
+    the ellipses that cross an element. An inner ellipse with a zero axis
+    is ignored."""
+
+    cdef int i, j, outer_class, inner_class
+    cdef bint has_inner = dx_in > 0. and dy_in > 0.
+    cdef double x_half, y_half, outer, inner
+    cdef double cos_m_theta = cos(-theta)
+    cdef double sin_m_theta = sin(-theta)
+
+    # Find the bounding box of the rotated outer ellipse
+    _elliptical_half_widths(dx_out, dy_out, theta, &x_half, &y_half)
+
+    for i in range(nx):
+        if x[i] < x_half and x[i + 1] > - x_half:
+            for j in range(ny):
+                if y[j] < y_half and y[j + 1] > - y_half:
+
+                    outer_class = _elliptical_element_class(
+                        x[i], y[j], x[i + 1], y[j + 1], dx_out, dy_out,
+                        cos_m_theta, sin_m_theta)
+                    if outer_class == 0:
+                        continue
+                    inner_class = 0
+                    if has_inner:
+                        inner_class = _elliptical_element_class(
+                            x[i], y[j], x[i + 1], y[j + 1], dx_in, dy_in,
+                            cos_m_theta, sin_m_theta)
+                        if inner_class == 1:
+                            continue
+
+                    outer = 1.
+                    if outer_class < 0:
+                        outer = _elliptical_overlap_single(
+                            x[i], y[j], x[i + 1], y[j + 1], dx_out, dy_out,
+                            theta) / (x[i + 1] - x[i]) / (y[j + 1] - y[j])
+                    inner = 0.
+                    if inner_class < 0:
+                        inner = _elliptical_overlap_single(
+                            x[i], y[j], x[i + 1], y[j + 1], dx_in, dy_in,
+                            theta) / (x[i + 1] - x[i]) / (y[j + 1] - y[j])
+                    frac[j * nx + i] = outer - inner
+
+
+@cython.cdivision(True)
+cdef int _elliptical_element_class(double xmin, double ymin, double xmax,
+                                   double ymax, double dx, double dy,
+                                   double cos_m_theta,
+                                   double sin_m_theta) nogil:
+    """Classify a rectangle relative to an ellipse with major and minor axes
+    dx and dy, centered at the origin, with the rotation given by the
+    cosine and sine of minus its position angle.
+
+    Returns 1 if the rectangle is entirely inside the ellipse, 0 if it is
+    entirely outside and -1 if the ellipse boundary crosses it.
+    """
+
+    cdef point p[4]
+    cdef int k, n_inside = 0, n_left = 0
+    cdef double ex, ey, t, qx, qy, d_sq = 2.
+
+    # Reproject rectangle to frame of reference in which ellipse is a unit
+    # circle, as in _elliptical_overlap_single.
+    p[0].x = (xmin * cos_m_theta - ymin * sin_m_theta) / dx
+    p[0].y = (xmin * sin_m_theta + ymin * cos_m_theta) / dy
+    p[1].x = (xmax * cos_m_theta - ymin * sin_m_theta) / dx
+    p[1].y = (xmax * sin_m_theta + ymin * cos_m_theta) / dy
+    p[2].x = (xmax * cos_m_theta - ymax * sin_m_theta) / dx
+    p[2].y = (xmax * sin_m_theta + ymax * cos_m_theta) / dy
+    p[3].x = (xmin * cos_m_theta - ymax * sin_m_theta) / dx
+    p[3].y = (xmin * sin_m_theta + ymax * cos_m_theta) / dy
+
+    # The unit circle is convex, so it contains the (parallelogram) image
+    # of the rectangle if it contains its corners.
+    for k in range(4):
+        if p[k].x * p[k].x + p[k].y * p[k].y < 1.:
+            n_inside += 1
+    if n_inside == 4:
+        return 1
+    if n_inside > 0:
+        return -1
+
+    # Otherwise, the two are disjoint if the origin is outside the
+    # parallelogram and at least at unit distance from all of its sides.
+    for k in range(4):
+        ex = p[(k + 1) % 4].x - p[k].x
+        ey = p[(k + 1) % 4].y - p[k].y
+        if ex * p[k].y - ey * p[k].x < 0.:
+            n_left += 1
+        t = -(p[k].x * ex + p[k].y * ey) / (ex * ex + ey * ey)
+        t = 0. if t < 0. else (1. if t > 1. else t)
+        qx = p[k].x + t * ex
+        qy = p[k].y + t * ey
+        if qx * qx + qy * qy < d_sq:
+            d_sq = qx * qx + qy * qy
+    if n_left == 0 or n_left == 4 or d_sq <= 1.:
+        return -1
+    return 0
+
+
+@cython.cdivision(True)
+cdef inline double _distance(double x1, double y1, double x2,
+                             double y2) nogil:
+    return sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
+
+
+@cython.cdivision(True)
+cdef inline double _area_arc_unit(double x1, double y1, double x2,
+                                  double y2) nogil:
+    cdef double a, theta
+    a = _distance(x1, y1, x2, y2)
+    theta = 2. * asin(0.5 * a)
+    return 0.5 * (theta - sin(theta))
+
+
+cdef inline double _area_triangle(double x1, double y1, double x2, double y2,
+                                  double x3, double y3) nogil:
+    return 0.5 * fabs(x1 * (y2 - y3) + x2 * (y3 - y1) + x3 * (y1 - y2))
+
+
+@cython.cdivision(True)
+cdef inline int _in_triangle(double x, double y, double x1, double y1,
+                             double x2, double y2, double x3,
+                             double y3) nogil:
     cdef int c = 0
 
     c += ((y1 > y) != (y2 > y) and x < (x2 - x1) * (y - y1) / (y2 - y1) + x1)
@@ -63,21 +347,27 @@ def in_triangle(double x, double y, double x1, double y1, double x2, double y2,
     return c % 2 == 1
 
 
-def circle_line(double x1, double y1, double x2, double y2):
-    '''Intersection of a line defined by two points with a unit circle'''
+@cython.cdivision(True)
+cdef intersections _circle_line(double x1, double y1, double x2,
+                                double y2) nogil:
 
     cdef double a, b, delta, dx, dy
-    cdef double xi1, yi1, xi2, yi2
+    cdef intersections inter
+
+    # No solution is flagged by values > 1
+    inter.p1.x = 2.
+    inter.p1.y = 2.
+    inter.p2.x = 2.
+    inter.p2.y = 2.
 
     dx = x2 - x1
     dy = y2 - y1
 
+    if fabs(dx) < 1.e-10 and fabs(dy) < 1.e-10:
 
-    if abs(dx) < 1.e-10 and abs(dy) < 1.e-10:
-
-        return 2., 2., 2., 2.
+        return inter
 
-    if abs(dx) > abs(dy):
+    if fabs(dx) > fabs(dy):
 
         # Find the slope and intercept of the line
         a = dy / dx
@@ -88,13 +378,10 @@ def circle_line(double x1, double y1, double x2, double y2):
 
         if delta > 0.:  # solutions exist
             delta = sqrt(delta)
-            xi1 = (- a * b - delta) / (1. + a * a)
-            yi1 = a * xi1 + b
-            xi2 = (- a * b + delta) / (1. + a * a)
-            yi2 = a * xi2 + b
-            return xi1, yi1, xi2, yi2
-        else:  # no solution, return values > 1
-            return 2., 2., 2., 2.
+            inter.p1.x = (- a * b - delta) / (1. + a * a)
+            inter.p1.y = a * inter.p1.x + b
+            inter.p2.x = (- a * b + delta) / (1. + a * a)
+            inter.p2.y = a * inter.p2.x + b
 
     else:
 
@@ -107,104 +394,103 @@ def circle_line(double x1, double y1, double x2, double y2):
 
         if delta > 0.:  # solutions exist
             delta = sqrt(delta)
-            yi1 = (- a * b - delta) / (1. + a * a)
-            xi1 = a * yi1 + b
-            yi2 = (- a * b + delta) / (1. + a * a)
-            xi2 = a * yi2 + b
-            return xi1, yi1, xi2, yi2
-        else:  # no solution, return values > 1
-            return 2., 2., 2., 2.
+            inter.p1.y = (- a * b - delta) / (1. + a * a)
+            inter.p1.x = a * inter.p1.y + b
+            inter.p2.y = (- a * b + delta) / (1. + a * a)
+            inter.p2.x = a * inter.p2.y + b
 
+    return inter
 
-def circle_segment_single2(double x1, double y1, double x2, double y2):
-    '''
-    The intersection of a line with the unit circle. The intersection the
-    closest to (x2, y2) is chosen.
-    '''
 
-    cdef double xi1, yi1, xi2, yi2
+cdef point _circle_segment_single2(double x1, double y1, double x2,
+                                   double y2) nogil:
+
     cdef double dx1, dy1, dx2, dy2
+    cdef intersections inter
 
-    xi1, yi1, xi2, yi2 = circle_line(x1, y1, x2, y2)
+    inter = _circle_line(x1, y1, x2, y2)
 
-    # Can be optimized, but just checking for correctness right now
-    dx1 = abs(xi1 - x2)
-    dy1 = abs(yi1 - y2)
-    dx2 = abs(xi2 - x2)
-    dy2 = abs(yi2 - y2)
+    dx1 = fabs(inter.p1.x - x2)
+    dy1 = fabs(inter.p1.y - y2)
+    dx2 = fabs(inter.p2.x - x2)
+    dy2 = fabs(inter.p2.y - y2)
 
     if dx1 > dy1:  # compare based on x-axis
         if dx1 > dx2:
-            return xi2, yi2
+            return inter.p2
         else:
-            return xi1, yi1
+            return inter.p1
     else:
         if dy1 > dy2:
-            return xi2, yi2
+            return inter.p2
         else:
-            return xi1, yi1
+            return inter.p1
 
 
-def circle_segment(double x1, double y1, double x2, double y2):
-    '''
-    Intersection(s) of a segment with the unit circle. Discard any
-    solution not on the segment.
-    '''
+cdef intersections _circle_segment(double x1, double y1, double x2,
+                                   double y2) nogil:
 
-    cdef double xi1, yi1, xi2, yi2
+    cdef intersections inter, inter_new
+    cdef point pt1, pt2
 
-    xi1, yi1, xi2, yi2 = circle_line(x1, y1, x2, y2)
+    inter = _circle_line(x1, y1, x2, y2)
+    pt1 = inter.p1
+    pt2 = inter.p2
 
-    if (xi1 > x1 and xi1 > x2) or (xi1 < x1 and xi1 < x2) or (yi1 > y1 and yi1 > y2) or (yi1 < y1 and yi1 < y2):
-        xi1, yi1 = 2., 2.
-    if (xi2 > x1 and xi2 > x2) or (xi2 < x1 and xi2 < x2) or (yi2 > y1 and yi2 > y2) or (yi2 < y1 and yi2 < y2):
-        xi2, yi2 = 2., 2.
+    if (pt1.x > x1 and pt1.x > x2) or (pt1.x < x1 and pt1.x < x2) or (pt1.y > y1 and pt1.y > y2) or (pt1.y < y1 and pt1.y < y2):
+        pt1.x, pt1.y = 2., 2.
+    if (pt2.x > x1 and pt2.x > x2) or (pt2.x < x1 and pt2.x < x2) or (pt2.y > y1 and pt2.y > y2) or (pt2.y < y1 and pt2.y < y2):
+        pt2.x, pt2.y = 2., 2.
 
-    if xi1 > 1. and xi2 < 2.:
-        return xi1, yi1, xi2, yi2
+    if pt1.x > 1. and pt2.x < 2.:
+        inter_new.p1 = pt1
+        inter_new.p2 = pt2
     else:
-        return xi2, yi2, xi1, yi1
+        inter_new.p1 = pt2
+        inter_new.p2 = pt1
 
+    return inter_new
 
-def overlap_area_triangle_unit_circle(double x1, double y1, double x2, double y2, double x3, double y3):
-    '''
-    Given a triangle defined by three points (x1, y1), (x2, y2), and
-    (x3, y3), find the area of overlap with the unit circle.
-    '''
+
+cdef double _overlap_area_triangle_unit_circle(double x1, double y1,
+                                               double x2, double y2,
+                                               double x3, double y3) nogil:
 
     cdef double d1, d2, d3
-    cdef bool in1, in2, in3
-    cdef double xc1, yc1
-    cdef double xc2, yc2
-    cdef double xc3, yc3
-    cdef double xc4, yc4
+    cdef bint in1, in2, in3
+    cdef bint on1, on2, on3
+    cdef bint intersect13, intersect23
     cdef double area
-    cdef double PI = np.pi
+    cdef point p1, p2, p3, tmp
+    cdef point pc1, pc2, pc3, pc4, pp
+    cdef intersections inter, inter1, inter2, inter3
+
+    p1.x, p1.y = x1, y1
+    p2.x, p2.y = x2, y2
+    p3.x, p3.y = x3, y3
 
     # Find distance of all vertices to circle center
     d1 = x1 * x1 + y1 * y1
     d2 = x2 * x2 + y2 * y2
     d3 = x3 * x3 + y3 * y3
 
-    # Order vertices by distance from origin
+    # Order vertices by distance from origin. Every branch leaves the
+    # vertices sorted, so no further check is needed.
     if d1 < d2:
         if d2 < d3:
             pass
         elif d1 < d3:
-            x2, y2, d2, x3, y3, d3 = x3, y3, d3, x2, y2, d2
+            p2, d2, p3, d3 = p3, d3, p2, d2
         else:
-            x1, y1, d1, x2, y2, d2, x3, y3, d3 = x3, y3, d3, x1, y1, d1, x2, y2, d2
+            p1, d1, p2, d2, p3, d3 = p3, d3, p1, d1, p2, d2
 
     else:
         if d1 < d3:
-            x1, y1, d1, x2, y2, d2 = x2, y2, d2, x1, y1, d1
+            p1, d1, p2, d2 = p2, d2, p1, d1
         elif d2 < d3:
-            x1, y1, d1, x2, y2, d2, x3, y3, d3 = x2, y2, d2, x3, y3, d3, x1, y1, d1
+            p1, d1, p2, d2, p3, d3 = p2, d2, p3, d3, p1, d1
         else:
-            x1, y1, d1, x2, y2, d2, x3, y3, d3 = x3, y3, d3, x2, y2, d2, x1, y1, d1
-
-    if d1 > d2 or d2 > d3 or d1 > d3:
-        raise Exception("ERROR: vertices did not sort correctly")
+            p1, d1, p2, d2, p3, d3 = p3, d3, p2, d2, p1, d1
 
     # Determine number of vertices inside circle
     in1 = d1 < 1
@@ -212,76 +498,81 @@ def overlap_area_triangle_unit_circle(double x1, double y1, double x2, double y2
     in3 = d3 < 1
 
     # Determine which vertices are on the circle
-    on1 = abs(d1 - 1) < 1.e-10
-    on2 = abs(d2 - 1) < 1.e-10
-    on3 = abs(d3 - 1) < 1.e-10
+    on1 = fabs(d1 - 1) < 1.e-10
+    on2 = fabs(d2 - 1) < 1.e-10
+    on3 = fabs(d3 - 1) < 1.e-10
 
     if on3 or in3:  # triangle is completely in circle
 
-        area = area_triangle(x1, y1, x2, y2, x3, y3)
+        area = _area_triangle(p1.x, p1.y, p2.x, p2.y, p3.x, p3.y)
 
     elif in2 or on2:
 
         # If vertex 1 or 2 are on the edge of the circle, then we use the dot
         # product to vertex 3 to determine whether an intersection takes place.
-        intersect13 = not on1 or x1 * (x3 - x1) + y1 * (y3 - y1) < 0.
-        intersect23 = not on2 or x2 * (x3 - x2) + y2 * (y3 - y2) < 0.
+        intersect13 = not on1 or p1.x * (p3.x - p1.x) + p1.y * (p3.y - p1.y) < 0.
+        intersect23 = not on2 or p2.x * (p3.x - p2.x) + p2.y * (p3.y - p2.y) < 0.
 
         if intersect13 and intersect23:
-            xc1, yc1 = circle_segment_single2(x1, y1, x3, y3)
-            xc2, yc2 = circle_segment_single2(x2, y2, x3, y3)
-            area = area_triangle(x1, y1, x2, y2, xc1, yc1) \
-                 + area_triangle(x2, y2, xc1, yc1, xc2, yc2) \
-                 + area_arc_unit(xc1, yc1, xc2, yc2)
+            pc1 = _circle_segment_single2(p1.x, p1.y, p3.x, p3.y)
+            pc2 = _circle_segment_single2(p2.x, p2.y, p3.x, p3.y)
+            area = _area_triangle(p1.x, p1.y, p2.x, p2.y, pc1.x, pc1.y) \
+                 + _area_triangle(p2.x, p2.y, pc1.x, pc1.y, pc2.x, pc2.y) \
+                 + _area_arc_unit(pc1.x, pc1.y, pc2.x, pc2.y)
         elif intersect13:
-            xc1, yc1 = circle_segment_single2(x1, y1, x3, y3)
-            area = area_triangle(x1, y1, x2, y2, xc1, yc1) \
-                 + area_arc_unit(x2, y2, xc1, yc1)
+            pc1 = _circle_segment_single2(p1.x, p1.y, p3.x, p3.y)
+            area = _area_triangle(p1.x, p1.y, p2.x, p2.y, pc1.x, pc1.y) \
+                 + _area_arc_unit(p2.x, p2.y, pc1.x, pc1.y)
         elif intersect23:
-            xc2, yc2 = circle_segment_single2(x2, y2, x3, y3)
-            area = area_triangle(x1, y1, x2, y2, xc2, yc2) \
-                 + area_arc_unit(x1, y1, xc2, yc2)
+            pc2 = _circle_segment_single2(p2.x, p2.y, p3.x, p3.y)
+            area = _area_triangle(p1.x, p1.y, p2.x, p2.y, pc2.x, pc2.y) \
+                 + _area_arc_unit(p1.x, p1.y, pc2.x, pc2.y)
         else:
-            area = area_arc_unit(x1, y1, x2, y2)
+            area = _area_arc_unit(p1.x, p1.y, p2.x, p2.y)
 
     elif in1:
         # Check for intersections of far side with circle
-        xc1, yc1, xc2, yc2 = circle_segment(x2, y2, x3, y3)
-        xc3, yc3 = circle_segment_single2(x1, y1, x2, y2)
-        xc4, yc4 = circle_segment_single2(x1, y1, x3, y3)
-        if xc1 > 1.:  # indicates no intersection
-            if in_triangle(0, 0, x1, y1, x2, y2, x3, y3) and not in_triangle(0, 0, x1, y1, xc3, yc3, xc4, yc4):
-                area = area_triangle(x1, y1, xc3, yc3, xc4, yc4) \
-                     + (PI - area_arc_unit(xc3, yc3, xc4, yc4))
+        inter = _circle_segment(p2.x, p2.y, p3.x, p3.y)
+        pc1 = inter.p1
+        pc2 = inter.p2
+        pc3 = _circle_segment_single2(p1.x, p1.y, p2.x, p2.y)
+        pc4 = _circle_segment_single2(p1.x, p1.y, p3.x, p3.y)
+        if pc1.x > 1.:  # indicates no intersection
+            if _in_triangle(0., 0., p1.x, p1.y, p2.x, p2.y, p3.x, p3.y) and not _in_triangle(0., 0., p1.x, p1.y, pc3.x, pc3.y, pc4.x, pc4.y):
+                area = _area_triangle(p1.x, p1.y, pc3.x, pc3.y, pc4.x, pc4.y) \
+                     + (PI - _area_arc_unit(pc3.x, pc3.y, pc4.x, pc4.y))
             else:
-                area = area_triangle(x1, y1, xc3, yc3, xc4, yc4) \
-                     + area_arc_unit(xc3, yc3, xc4, yc4)
+                area = _area_triangle(p1.x, p1.y, pc3.x, pc3.y, pc4.x, pc4.y) \
+                     + _area_arc_unit(pc3.x, pc3.y, pc4.x, pc4.y)
         else:
-            if abs(xc2 - x2) < abs(xc1 - x2):
-                xc1, yc1, xc2, yc2 = xc2, yc2, xc1, yc1
-            area = area_triangle(x1, y1, xc3, yc3, xc1, yc1) \
-                 + area_triangle(x1, y1, xc1, yc1, xc2, yc2) \
-                 + area_triangle(x1, y1, xc2, yc2, xc4, yc4) \
-                 + area_arc_unit(xc1, yc1, xc3, yc3) \
-                 + area_arc_unit(xc2, yc2, xc4, yc4)
+            if fabs(pc2.x - p2.x) < fabs(pc1.x - p2.x):
+                pc1, pc2 = pc2, pc1
+            area = _area_triangle(p1.x, p1.y, pc3.x, pc3.y, pc1.x, pc1.y) \
+                 + _area_triangle(p1.x, p1.y, pc1.x, pc1.y, pc2.x, pc2.y) \
+                 + _area_triangle(p1.x, p1.y, pc2.x, pc2.y, pc4.x, pc4.y) \
+                 + _area_arc_unit(pc1.x, pc1.y, pc3.x, pc3.y) \
+                 + _area_arc_unit(pc2.x, pc2.y, pc4.x, pc4.y)
     else:
-        xc1, yc1, xc2, yc2 = circle_segment(x1, y1, x2, y2)
-        xc3, yc3, xc4, yc4 = circle_segment(x2, y2, x3, y3)
-        xc5, yc5, xc6, yc6 = circle_segment(x3, y3, x1, y1)
-        if xc1 <= 1.:
-            xp, yp = 0.5 * (xc1 + xc2), 0.5 * (yc1 + yc2)
-            area = overlap_area_triangle_unit_circle(x1, y1, x3, y3, xp, yp) \
-                 + overlap_area_triangle_unit_circle(x2, y2, x3, y3, xp, yp)
-        elif xc3 <= 1.:
-            xp, yp = 0.5 * (xc3 + xc4), 0.5 * (yc3 + yc4)
-            area = overlap_area_triangle_unit_circle(x3, y3, x1, y1, xp, yp) \
-                 + overlap_area_triangle_unit_circle(x2, y2, x1, y1, xp, yp)
-        elif xc5 <= 1.:
-            xp, yp = 0.5 * (xc5 + xc6), 0.5 * (yc5 + yc6)
-            area = overlap_area_triangle_unit_circle(x1, y1, x2, y2, xp, yp) \
-                 + overlap_area_triangle_unit_circle(x3, y3, x2, y2, xp, yp)
+        inter1 = _circle_segment(p1.x, p1.y, p2.x, p2.y)
+        inter2 = _circle_segment(p2.x, p2.y, p3.x, p3.y)
+        inter3 = _circle_segment(p3.x, p3.y, p1.x, p1.y)
+        if inter1.p1.x <= 1.:
+            pp.x = 0.5 * (inter1.p1.x + inter1.p2.x)
+            pp.y = 0.5 * (inter1.p1.y + inter1.p2.y)
+            area = _overlap_area_triangle_unit_circle(p1.x, p1.y, p3.x, p3.y, pp.x, pp.y) \
+                 + _overlap_area_triangle_unit_circle(p2.x, p2.y, p3.x, p3.y, pp.x, pp.y)
+        elif inter2.p1.x <= 1.:
+            pp.x = 0.5 * (inter2.p1.x + inter2.p2.x)
+            pp.y = 0.5 * (inter2.p1.y + inter2.p2.y)
+            area = _overlap_area_triangle_unit_circle(p3.x, p3.y, p1.x, p1.y, pp.x, pp.y) \
+                 + _overlap_area_triangle_unit_circle(p2.x, p2.y, p1.x, p1.y, pp.x, pp.y)
+        elif inter3.p1.x <= 1.:
+            pp.x = 0.5 * (inter3.p1.x + inter3.p2.x)
+            pp.y = 0.5 * (inter3.p1.y + inter3.p2.y)
+            area = _overlap_area_triangle_unit_circle(p1.x, p1.y, p2.x, p2.y, pp.x, pp.y) \
+                 + _overlap_area_triangle_unit_circle(p3.x, p3.y, p2.x, p2.y, pp.x, pp.y)
         else:  # no intersections
-            if in_triangle(0., 0., x1, y1, x2, y2, x3, y3):
+            if _in_triangle(0., 0., p1.x, p1.y, p2.x, p2.y, p3.x, p3.y):
                 return PI
             else:
                 return 0.
@@ -289,15 +580,15 @@ def overlap_area_triangle_unit_circle(double x1, double y1, double x2, double y2
     return area
 
 
-def elliptical_overlap_single(double xmin, double ymin, double xmax, double ymax, double dx, double dy, double theta):
-    '''
-    Given a rectangle defined by (xmin, ymin, xmax, ymax) and an ellipse with major and minor axes dx and dy
-    respectively, position angle theta, and centered at the origin, find the area of overlap
-    '''
+@cython.cdivision(True)
+cdef double _elliptical_overlap_single(double xmin, double ymin, double xmax,
+                                       double ymax, double dx, double dy,
+                                       double theta) nogil:
 
     cdef double cos_m_theta = cos(-theta)
     cdef double sin_m_theta = sin(-theta)
     cdef double scale
+    cdef double x1, y1, x2, y2, x3, y3, x4, y4
 
     # Find scale by which the areas will be shrunk
     scale = dx * dy
@@ -309,34 +600,6 @@ def elliptical_overlap_single(double xmin, double ymin, double xmax, double ymax
     x4, y4 = (xmin * cos_m_theta - ymax * sin_m_theta) / dx, (xmin * sin_m_theta + ymax * cos_m_theta) / dy
 
     # Divide resulting quadrilateral into two triangles and find intersection with unit circle
-    return (overlap_area_triangle_unit_circle(x1, y1, x2, y2, x3, y3) \
-          + overlap_area_triangle_unit_circle(x1, y1, x4, y4, x3, y3)) \
+    return (_overlap_area_triangle_unit_circle(x1, y1, x2, y2, x3, y3) \
+          + _overlap_area_triangle_unit_circle(x1, y1, x4, y4, x3, y3)) \
           * scale
-
-
-def elliptical_overlap_grid(np.ndarray[DTYPE_t, ndim=1] x,
-                            np.ndarray[DTYPE_t, ndim=1] y,
-                            double dx, double dy, double theta):
-    '''
-    Given a grid with walls set by x, y, find the fraction of overlap in
-    each with an ellipse with major and minor axes dx and dy
-    respectively, position angle theta, and centered at the origin.
-    '''
-
-    cdef int nx = x.shape[0]
-    cdef int ny = y.shape[0]
-    cdef np.ndarray[DTYPE_t, ndim=2] frac = np.zeros([ny - 1, nx - 1], dtype=DTYPE)
-    cdef unsigned int i, j
-
-    # This could be sped up by finding a better bounding box for the ellipse
-
-    # Find bounding circle radius
-    R = max(dx, dy)
-
-    for i in range(nx - 1):
-        if x[i] < R and x[i + 1] > - R:
-            for j in range(ny - 1):
-                if y[j] < R and y[j + 1] > - R:
-                    frac[j, i] = elliptical_overlap_single(x[i], y[j], x[i + 1], y[j + 1], dx, dy, theta) / (x[i+1] - x[i]) / (y[j+1] - y[j])
-
-    return frac
@@ -0,0 +1,1023 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+
+# These tests check that the compiled engine used for the built-in aperture
+# classes gives the same results as the loop over objects, which is used
+# for any other Aperture subclass.
+
+from __future__ import division
+
+from multiprocessing.pool import ThreadPool
+
+import pytest
+import numpy as np
+from numpy.testing import assert_allclose, assert_array_equal
+
+from ..aperture import CircularAperture, CircularAnnulus, \
+                       EllipticalAperture, EllipticalAnnulus, \
+                       CircularApertureArray, CircularAnnulusArray, \
+                       EllipticalApertureArray, EllipticalAnnulusArray, \
+                       FractionCache, PhotometryPlan, PhotometryProfile, \
+                       PrefixSums, \
+                       aperture_photometry, fraction_cache
+
+TOL = 1.e-12
+
+
+# Subclasses are not handled by the engine, so these force the loop.
+class LoopCircularAperture(CircularAperture):
+    pass
+
+
+class LoopCircularAnnulus(CircularAnnulus):
+    pass
+
+
+class LoopEllipticalAperture(EllipticalAperture):
+    pass
+
+
+class LoopEllipticalAnnulus(EllipticalAnnulus):
+    pass
+
+
+def make_apertures(n_aper, n_obj, seed=0):
+    """Random apertures of each class, and their loop-only counterparts."""
+    rng = np.random.RandomState(seed)
+    engine = np.empty((n_aper, n_obj), dtype=object)
+    loop = np.empty((n_aper, n_obj), dtype=object)
+    for index in np.ndindex(n_aper, n_obj):
+        kind = rng.randint(4)
+        a = rng.uniform(0., 8.)
+        b = rng.uniform(0., 8.)
+        theta = rng.uniform(0., 2. * np.pi)
+        if kind == 0:
+            args = (a,)
+            classes = CircularAperture, LoopCircularAperture
+        elif kind == 1:
+            args = (min(a, b), max(a, b) + 0.5)
+            classes = CircularAnnulus, LoopCircularAnnulus
+        elif kind == 2:
+            args = (a, b, theta)
+            classes = EllipticalAperture, LoopEllipticalAperture
+        else:
+            args = (min(a, b), max(a, b) + 0.5, b, theta)
+            classes = EllipticalAnnulus, LoopEllipticalAnnulus
+        engine[index] = classes[0](*args)
+        loop[index] = classes[1](*args)
+    return engine, loop
+
+
+def setup_images(test, shape, n_obj, n_aper=0, seed=0, margin=10.):
+    """Set random ``data``, ``error`` and ``gain`` arrays of the given
+    shape (2-d, or 3-d for a cube), ``xc`` and ``yc`` object centers (up to
+    ``margin`` pixels outside the images, so that some objects are partly
+    or entirely outside) and, if ``n_aper`` > 0, ``engine`` and ``loop``
+    apertures (see `make_apertures`) as attributes of ``test``. Returns
+    the random generator, for further arrays."""
+    rng = np.random.RandomState(seed)
+    test.data = rng.uniform(1., 10., shape)
+    test.error = rng.uniform(0.5, 2., shape)
+    test.gain = rng.uniform(1., 3., shape)
+    test.xc = rng.uniform(-margin, shape[-1] + margin, n_obj)
+    test.yc = rng.uniform(-margin, shape[-2] + margin, n_obj)
+    if n_aper > 0:
+        test.engine, test.loop = make_apertures(n_aper, n_obj, seed=seed)
+    return rng
+
+
+# Concentric circles shared by all objects, done by growth_photometry.
+GROWTH = np.array([[CircularAperture(r)] for r in (2., 5., 3.)],
+                  dtype=object)
+
+
+class TestBatchMatchesLoop(object):
+
+    def setup_class(self):
+        setup_images(self, (40, 50), 30, 3, seed=12345)
+
+    def check(self, **kwargs):
+        xc, yc = self.xc, self.yc
+        if (np.isscalar(kwargs.get('error')) or
+                not kwargs.get('pixelwise_errors', True)):
+            # The error at the center of each object must be defined.
+            inside = (xc > 0.) & (xc < 49.) & (yc > 0.) & (yc < 39.)
+            xc, yc = xc[inside], yc[inside]
+            engine, loop = self.engine[:, inside], self.loop[:, inside]
+        else:
+            engine, loop = self.engine, self.loop
+        flux_engine = aperture_photometry(self.data, xc, yc, engine,
+                                          **kwargs)
+        flux_loop = aperture_photometry(self.data, xc, yc, loop, **kwargs)
+        assert_allclose(flux_engine, flux_loop, rtol=TOL, atol=TOL)
+
+    @pytest.mark.parametrize('method', ['center', 'subpixel', 'exact'])
+    def test_flux(self, method):
+        self.check(method=method)
+
+    @pytest.mark.parametrize('subpixels', [1, 2, 7])
+    def test_subpixels(self, subpixels):
+        self.check(method='subpixel', subpixels=subpixels)
+
+    @pytest.mark.parametrize('method', ['center', 'subpixel', 'exact'])
+    @pytest.mark.parametrize('pixelwise_errors', [True, False])
+    def test_error_gain(self, method, pixelwise_errors):
+        self.check(method=method, error=self.error,
+                   pixelwise_errors=pixelwise_errors)
+        self.check(method=method, error=self.error, gain=self.gain,
+                   pixelwise_errors=pixelwise_errors)
+        self.check(method=method, error=1.5, gain=2.,
+                   pixelwise_errors=pixelwise_errors)
+
+    def test_shared_apertures(self):
+        # A (N_apertures, 1) array is broadcast to all objects.
+        engine, loop = make_apertures(4, 1, seed=1)
+        for method in ['center', 'subpixel', 'exact']:
+            flux_engine = aperture_photometry(self.data, self.xc, self.yc,
+                                              engine, error=self.error,
+                                              method=method)
+            flux_loop = aperture_photometry(self.data, self.xc, self.yc,
+                                            loop, error=self.error,
+                                            method=method)
+            assert_allclose(flux_engine, flux_loop, rtol=TOL, atol=TOL)
+
+    @pytest.mark.parametrize('method', ['center', 'subpixel', 'exact'])
+    @pytest.mark.parametrize('pixelwise_errors', [True, False])
+    def test_growth_curve(self, method, pixelwise_errors):
+        # Concentric circles shared by all objects are done in one pass,
+        # with unsorted, repeated and zero radii.
+        radii = [3., 0.5, 7.25, 0., 1.2, 3., 5.9, 2.]
+        engine = np.array([[CircularAperture(r)] for r in radii])
+        loop = np.array([[LoopCircularAperture(r)] for r in radii])
+        if pixelwise_errors:
+            xc, yc = self.xc, self.yc
+        else:
+            inside = ((self.xc > 0.) & (self.xc < 49.) & (self.yc > 0.) &
+                      (self.yc < 39.))
+            xc, yc = self.xc[inside], self.yc[inside]
+        kwargs = dict(error=self.error, gain=self.gain, method=method,
+                      subpixels=3, pixelwise_errors=pixelwise_errors)
+        flux_engine, fluxerr_engine = aperture_photometry(
+            self.data, xc, yc, engine, **kwargs)
+        flux_loop, fluxerr_loop = aperture_photometry(self.data, xc, yc,
+                                                      loop, **kwargs)
+        assert_allclose(flux_engine, flux_loop, rtol=TOL, atol=TOL)
+        assert_allclose(fluxerr_engine, fluxerr_loop, rtol=TOL, atol=TOL)
+
+    @pytest.mark.parametrize('method', ['center', 'subpixel', 'exact'])
+    def test_growth_curve_nan(self, method):
+        # A NaN anywhere in the sub-array of an object makes all of its
+        # fluxes NaN, even if it is outside every circle.
+        radii = [3., 0.5, 7.25, 0., 1.2]
+        engine = np.array([[CircularAperture(r)] for r in radii])
+        loop = np.array([[LoopCircularAperture(r)] for r in radii])
+        data = self.data.copy()
+        data[::7, ::9] = np.nan
+        error = self.error.copy()
+        error[3::11, 4::6] = np.inf
+        flux_engine, fluxerr_engine = aperture_photometry(
+            data, self.xc, self.yc, engine, error=error, method=method)
+        flux_loop, fluxerr_loop = aperture_photometry(
+            data, self.xc, self.yc, loop, error=error, method=method)
+        assert np.any(np.isnan(flux_loop))
+        assert_allclose(flux_engine, flux_loop, rtol=TOL, atol=TOL)
+        assert_allclose(fluxerr_engine, fluxerr_loop, rtol=TOL, atol=TOL)
+
+    def test_integer_data(self):
+        data = np.arange(2000).reshape((40, 50))
+        flux_engine = aperture_photometry(data, self.xc, self.yc,
+                                          self.engine)
+        flux_loop = aperture_photometry(data, self.xc, self.yc, self.loop)
+        assert_allclose(flux_engine, flux_loop, rtol=TOL, atol=TOL)
+
+
+class TestThreads(object):
+
+    def setup_class(self):
+        setup_images(self, (60, 60), 200, 2, seed=54321, margin=5.)
+        self.apertures = self.engine
+
+    @pytest.mark.parametrize('n_jobs', [2, 3, 16, -1])
+    def test_n_jobs(self, n_jobs):
+        # Results must be identical, not just close, for any thread count.
+        flux1, fluxerr1 = aperture_photometry(self.data, self.xc, self.yc,
+                                              self.apertures,
+                                              error=self.error)
+        flux, fluxerr = aperture_photometry(self.data, self.xc, self.yc,
+                                            self.apertures, error=self.error,
+                                            n_jobs=n_jobs)
+        assert_array_equal(flux, flux1)
+        assert_array_equal(fluxerr, fluxerr1)
+
+    def test_executor(self):
+        flux1 = aperture_photometry(self.data, self.xc, self.yc,
+                                    self.apertures)
+        pool = ThreadPool(2)
+        try:
+            flux = aperture_photometry(self.data, self.xc, self.yc,
+                                       self.apertures, executor=pool)
+        finally:
+            pool.close()
+        assert_array_equal(flux, flux1)
+
+    def test_invalid_n_jobs(self):
+        with pytest.raises(ValueError):
+            aperture_photometry(self.data, self.xc, self.yc, self.apertures,
+                                n_jobs=0)
+
+
+class TestFractionCache(object):
+
+    def setup_class(self):
+        setup_images(self, (60, 60), 0, seed=97531)
+        # Gridded positions: the sub-pixel offsets repeat.
+        grid = np.arange(5., 55., 4.) + 0.25
+        xx, yy = np.meshgrid(grid, grid)
+        self.xc = xx.ravel()
+        self.yc = yy.ravel()
+        self.apertures = np.array([[CircularAperture(3.)],
+                                   [EllipticalAnnulus(1., 4., 3., 0.3)]])
+
+    @pytest.mark.parametrize('method', ['center', 'subpixel', 'exact'])
+    def test_cache_matches(self, method):
+        cache = FractionCache()
+        flux1 = aperture_photometry(self.data, self.xc, self.yc,
+                                    self.apertures, method=method,
+                                    cache=False)
+        flux = aperture_photometry(self.data, self.xc, self.yc,
+                                   self.apertures, method=method, cache=cache)
+        assert_array_equal(flux, flux1)
+        # All objects share the same two fraction arrays.
+        assert cache.misses == 2
+        assert len(cache) == 2
+
+        flux = aperture_photometry(self.data, self.xc, self.yc,
+                                   self.apertures, method=method, cache=cache)
+        assert_array_equal(flux, flux1)
+        assert cache.hits == 2
+        assert cache.misses == 2
+
+    def test_memory_limit(self):
+        cache = FractionCache(max_bytes=8 * 100)
+        xc = np.array([10., 20.1, 30.2, 40.3])
+        aperture_photometry(self.data, xc, xc, CircularAperture(3.),
+                            cache=cache)
+        # Each 7x7 fraction array takes 392 bytes, so only two are kept.
+        assert cache.misses == 4
+        assert len(cache) == 2
+        assert cache.nbytes <= cache.max_bytes
+
+        cache.clear()
+        assert len(cache) == 0
+        assert cache.nbytes == cache.hits == cache.misses == 0
+
+    def test_opt_out(self):
+        fraction_cache.clear()
+        aperture_photometry(self.data, self.xc, self.yc, self.apertures,
+                            cache=False)
+        assert len(fraction_cache) == 0
+        assert fraction_cache.misses == 0
+        aperture_photometry(self.data, self.xc, self.yc, self.apertures)
+        assert len(fraction_cache) == 2
+        fraction_cache.clear()
+
+
+class TestPhaseTolerance(object):
+
+    def setup_class(self):
+        setup_images(self, (60, 70), 500, seed=97531, margin=3.)
+        # Keep the values (and so the interpolation errors) at most 5.
+        self.data /= 2.
+        self.apertures = [CircularAperture(3.),
+                          CircularAnnulus(1.5, 4.2),
+                          EllipticalAperture(5., 2., 0.6),
+                          EllipticalAnnulus(2., 5.5, 3., 2.2)]
+
+    @pytest.mark.parametrize(('interpolation', 'tolerance'),
+                             [('bilinear', 1.e-3), ('bilinear', 1.e-4),
+                              ('nearest', 3.e-2)])
+    def test_error_bound(self, interpolation, tolerance):
+        for aperture in self.apertures:
+            bound = tolerance * aperture.area()
+            for data in [np.ones_like(self.data), self.data]:
+                exact = aperture_photometry(data, self.xc, self.yc, aperture,
+                                            cache=False)
+                flux = aperture_photometry(
+                    data, self.xc, self.yc, aperture,
+                    phase_tolerance=tolerance,
+                    phase_interpolation=interpolation)
+                assert np.all(np.abs(flux - exact) <= bound * data.max())
+
+    def test_error_gain(self):
+        error = np.sqrt(self.data)
+        apertures = np.array([self.apertures]).T
+        exact = aperture_photometry(self.data, self.xc, self.yc, apertures,
+                                    error=error, gain=2.)
+        result = aperture_photometry(self.data, self.xc, self.yc, apertures,
+                                     error=error, gain=2.,
+                                     phase_tolerance=1.e-3)
+        for r, e in zip(result, exact):
+            assert_allclose(r, e, rtol=0., atol=0.1)
+
+    def test_invalid(self):
+        aperture = CircularAperture(3.)
+        with pytest.raises(ValueError):
+            aperture_photometry(self.data, 10., 10., aperture,
+                                phase_tolerance=0.)
+        with pytest.raises(ValueError):
+            aperture_photometry(self.data, 10., 10., aperture,
+                                method='center', phase_tolerance=1.e-3)
+        with pytest.raises(ValueError):
+            aperture_photometry(self.data, 10., 10., aperture,
+                                phase_tolerance=1.e-3,
+                                phase_interpolation='cubic')
+        with pytest.raises(ValueError):
+            aperture_photometry(self.data, 10., 10., aperture,
+                                mask=np.zeros(self.data.shape, dtype=bool),
+                                phase_tolerance=1.e-3)
+        with pytest.raises(ValueError):
+            aperture_photometry(self.data, 10., 10.,
+                                LoopCircularAperture(3.),
+                                phase_tolerance=1.e-3)
+        # The bank needed for nearest phases at this tolerance is too large.
+        with pytest.raises(ValueError):
+            aperture_photometry(self.data, 10., 10., aperture,
+                                phase_tolerance=1.e-6,
+                                phase_interpolation='nearest')
+
+
+class TestPrefixSums(object):
+
+    def setup_class(self):
+        setup_images(self, (50, 60), 40, 4, seed=8642)
+        self.apertures = self.engine
+
+    @pytest.mark.parametrize('method', ['center', 'exact'])
+    def test_matches_engine(self, method):
+        for kwargs in [{}, dict(error=self.error),
+                       dict(error=self.error, gain=self.gain)]:
+            result = aperture_photometry(self.data, self.xc, self.yc,
+                                         self.apertures, method=method,
+                                         prefix_sums=True, **kwargs)
+            expected = aperture_photometry(self.data, self.xc, self.yc,
+                                           self.apertures, method=method,
+                                           **kwargs)
+            assert_allclose(result, expected, rtol=TOL, atol=TOL)
+
+    @pytest.mark.parametrize('method', ['center', 'exact'])
+    def test_nonfinite(self, method):
+        # Non-finite values only affect the objects whose sub-arrays
+        # contain them, as they do without the cumulative sums.
+        inside = np.flatnonzero((self.xc > 0.) & (self.xc < 59.) &
+                                (self.yc > 0.) & (self.yc < 49.))
+        iy = (self.yc[inside] + 0.5).astype(int)
+        ix = (self.xc[inside] + 0.5).astype(int)
+        data = self.data.copy()
+        data[10, 5] = np.nan
+        data[iy[0], ix[0]] = np.nan
+        data[iy[1], ix[1]] = -np.inf
+        error = self.error.copy()
+        error[iy[2], ix[2]] = np.inf
+        for kwargs in [{}, dict(error=error, gain=self.gain)]:
+            result = aperture_photometry(data, self.xc, self.yc,
+                                         self.apertures, method=method,
+                                         prefix_sums=True, **kwargs)
+            expected = aperture_photometry(data, self.xc, self.yc,
+                                           self.apertures, method=method,
+                                           **kwargs)
+            assert np.any(np.isnan(expected))
+            assert_allclose(result, expected, rtol=TOL, atol=TOL)
+
+        # An object to the right of a NaN on the same rows is not affected.
+        flux = aperture_photometry(data, [5., 40.], [10., 10.],
+                                   CircularAperture(3.), method=method,
+                                   prefix_sums=True)
+        assert np.isnan(flux[0])
+        assert_allclose(flux[1], aperture_photometry(
+            data, 40., 10., CircularAperture(3.), method=method),
+            rtol=TOL, atol=TOL)
+
+    def test_large_apertures(self):
+        # Centers and radii on the pixel grid put pixel centers exactly on
+        # the boundaries.
+        data = np.ones((300, 300))
+        apertures = np.array([[CircularAperture(100.)],
+                              [CircularAnnulus(0., 50.)],
+                              [CircularAnnulus(20., 120.)],
+                              [EllipticalAperture(120., 30., 0.3)],
+                              [EllipticalAnnulus(40., 110., 50., 2.)]])
+        for xc, yc in [(150., 150.), (150.5, 140.), (123.4, 201.7)]:
+            result = aperture_photometry(data, xc, yc, apertures,
+                                         method='center', prefix_sums=True)
+            expected = aperture_photometry(data, xc, yc, apertures,
+                                           method='center')
+            assert_array_equal(result, expected)
+
+    def test_large_apertures_exact(self):
+        # Include thin and tilted ellipses, whose rows have few pixels
+        # entirely within them, and apertures extending past the image.
+        rng = np.random.RandomState(97531)
+        data = rng.uniform(1., 10., (300, 300))
+        apertures = np.array([[CircularAperture(100.)],
+                              [CircularAnnulus(0., 50.)],
+                              [CircularAnnulus(20., 160.)],
+                              [EllipticalAperture(120., 30., 0.3)],
+                              [EllipticalAperture(140., 1.5, 2.9)],
+                              [EllipticalAperture(0.7, 0.4, 1.)],
+                              [EllipticalAnnulus(40., 110., 50., 2.)]])
+        for xc, yc in [(150., 150.), (150.5, 140.), (123.4, 201.7)]:
+            result = aperture_photometry(data, xc, yc, apertures,
+                                         error=data, gain=2.,
+                                         method='exact', prefix_sums=True)
+            expected = aperture_photometry(data, xc, yc, apertures,
+                                           error=data, gain=2.,
+                                           method='exact')
+            assert_allclose(result, expected, rtol=TOL, atol=TOL)
+
+    def test_precomputed(self):
+        prefix_sums = PrefixSums(self.data, self.error, self.gain)
+        for kwargs in [{}, dict(error=self.error, gain=self.gain)]:
+            result = aperture_photometry(self.data, self.xc, self.yc,
+                                         self.apertures, method='center',
+                                         prefix_sums=True, **kwargs)
+            reused = aperture_photometry(self.data, self.xc, self.yc,
+                                         self.apertures, method='center',
+                                         prefix_sums=prefix_sums, **kwargs)
+            assert_array_equal(reused, result)
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            aperture_photometry(self.data, 10., 10., CircularAperture(3.),
+                                method='subpixel', prefix_sums=True)
+        # Different shape, and no variance for the errors.
+        with pytest.raises(ValueError):
+            aperture_photometry(self.data, 10., 10., CircularAperture(3.),
+                                method='center',
+                                prefix_sums=PrefixSums(self.data[1:]))
+        with pytest.raises(ValueError):
+            aperture_photometry(self.data, 10., 10., CircularAperture(3.),
+                                error=self.error, method='center',
+                                prefix_sums=PrefixSums(self.data))
+        with pytest.raises(ValueError):
+            aperture_photometry(self.data, 10., 10.,
+                                LoopCircularAperture(3.), method='center',
+                                prefix_sums=True)
+
+
+class TestPhotometryPlan(object):
+
+    def setup_class(self):
+        setup_images(self, (45, 35), 50, 3, seed=97531)
+
+    @pytest.mark.parametrize('method', ['center', 'subpixel', 'exact'])
+    def test_matches_photometry(self, method):
+        for apertures in [self.engine, self.loop, self.engine[:1, :1],
+                          self.loop[:, :1]]:
+            plan = PhotometryPlan(self.data.shape, self.xc, self.yc,
+                                  apertures, method=method)
+            for kwargs in [{}, dict(error=self.error),
+                           dict(error=self.error, gain=self.gain)]:
+                result = plan.apply(self.data, **kwargs)
+                expected = aperture_photometry(self.data, self.xc, self.yc,
+                                               apertures, method=method,
+                                               **kwargs)
+                assert_allclose(result, expected, rtol=TOL, atol=TOL)
+
+            # Non-finite values propagate from the whole sub-array of an
+            # object, including the pixels outside its apertures.
+            data = self.data.copy()
+            data[::6, ::5] = np.nan
+            data[3, 4] = np.inf
+            error = self.error.copy()
+            error[::7, 2::9] = np.inf
+            for kwargs in [{}, dict(error=error, gain=self.gain)]:
+                result = plan.apply(data, **kwargs)
+                expected = aperture_photometry(data, self.xc, self.yc,
+                                               apertures, method=method,
+                                               **kwargs)
+                assert np.any(np.isnan(expected))
+                assert_allclose(result, expected, rtol=TOL, atol=TOL)
+
+    def test_scalar_errors(self):
+        # The local error and gain are taken at the object centers, which
+        # must be within the image.
+        xc = np.clip(self.xc, 0., 34.)
+        yc = np.clip(self.yc, 0., 44.)
+        for apertures in [self.engine, self.loop]:
+            plan = PhotometryPlan(self.data.shape, xc, yc, apertures)
+            for kwargs in [dict(error=1.5, gain=2.),
+                           dict(error=self.error, gain=self.gain,
+                                pixelwise_errors=False)]:
+                assert_allclose(plan.apply(self.data, **kwargs),
+                                aperture_photometry(self.data, xc, yc,
+                                                    apertures, **kwargs),
+                                rtol=TOL, atol=TOL)
+
+    def test_many_images(self):
+        plan = PhotometryPlan(self.data.shape, self.xc, self.yc,
+                              self.engine)
+        plan._chunk_size = 7
+        for scale in [1., 2.5]:
+            data = self.data * scale
+            assert_allclose(plan.apply(data),
+                            aperture_photometry(data, self.xc, self.yc,
+                                                self.engine),
+                            rtol=TOL, atol=TOL)
+
+    def test_scalar_center(self):
+        plan = PhotometryPlan(self.data.shape, 12.3, 20.1,
+                              CircularAperture(4.))
+        flux = plan.apply(self.data)
+        assert np.isscalar(flux)
+        assert_allclose(flux, aperture_photometry(self.data, 12.3, 20.1,
+                                                  CircularAperture(4.)),
+                        rtol=TOL)
+
+    def test_invalid(self):
+        plan = PhotometryPlan(self.data.shape, self.xc, self.yc,
+                              CircularAperture(4.))
+        with pytest.raises(ValueError):
+            plan.apply(self.data[1:])
+        with pytest.raises(ValueError):
+            plan.apply(self.data, error=self.error[1:])
+        with pytest.raises(ValueError):
+            plan.apply(self.data, gain=2.)
+        with pytest.raises(ValueError):
+            PhotometryPlan(self.data.shape, self.xc, self.yc[1:],
+                           CircularAperture(4.))
+
+
+class TestCube(object):
+
+    def setup_class(self):
+        setup_images(self, (4, 40, 30), 20, 2, seed=24680, margin=5.)
+        # The same gain for all frames.
+        self.gain = self.gain[0]
+
+    def frames(self, apertures, data=None, **kwargs):
+        # Photometry of each frame, stacked.
+        if data is None:
+            data = self.data
+        results = []
+        for k in range(data.shape[0]):
+            frame_kwargs = dict((name, array[k] if np.ndim(array) == 3
+                                 else array)
+                                for name, array in kwargs.items())
+            results.append(aperture_photometry(data[k], self.xc, self.yc,
+                                               apertures, **frame_kwargs))
+        if 'error' not in kwargs:
+            return np.array(results)
+        return (np.array([result[0] for result in results]),
+                np.array([result[1] for result in results]))
+
+    @pytest.mark.parametrize('method', ['center', 'subpixel', 'exact'])
+    def test_matches_frames(self, method):
+        for apertures in [self.engine, self.loop, self.engine[:1]]:
+            for kwargs in [{}, dict(error=self.error),
+                           dict(error=self.error[0]),
+                           dict(error=self.error, gain=self.gain)]:
+                result = aperture_photometry(self.data, self.xc, self.yc,
+                                             apertures, method=method,
+                                             **kwargs)
+                expected = self.frames(apertures, method=method, **kwargs)
+                assert_allclose(result, expected, rtol=TOL, atol=TOL)
+
+    @pytest.mark.parametrize('method', ['center', 'subpixel', 'exact'])
+    def test_nonfinite_frames(self, method):
+        # NaN pixels (e.g., cosmic rays flagged in a time series) give the
+        # same results as the photometry of each frame.
+        data = self.data.copy()
+        data[1, ::4, ::3] = np.nan
+        data[3, 20, 15] = np.inf
+        error = self.error.copy()
+        error[2, ::5, 1::4] = np.nan
+        for apertures in [self.engine, self.loop]:
+            for kwargs in [{}, dict(error=error, gain=self.gain)]:
+                result = aperture_photometry(data, self.xc, self.yc,
+                                             apertures, method=method,
+                                             **kwargs)
+                expected = self.frames(apertures, data=data, method=method,
+                                       **kwargs)
+                assert np.any(np.isnan(expected))
+                assert_allclose(result, expected, rtol=TOL, atol=TOL)
+
+    def test_scalar_center(self):
+        flux = aperture_photometry(self.data, 12.3, 20.1,
+                                   CircularAperture(4.))
+        assert flux.shape == (4,)
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            aperture_photometry(self.data, self.xc, self.yc, self.engine,
+                                error=self.error[:, 1:])
+        with pytest.raises(ValueError):
+            aperture_photometry(self.data, self.xc, self.yc, self.engine,
+                                mask=np.zeros((3, 40, 30), dtype=bool))
+        with pytest.raises(ValueError):
+            aperture_photometry(self.data[np.newaxis], self.xc, self.yc,
+                                self.engine)
+
+
+class LazyArray(object):
+    """Array-like object that is only read when sliced."""
+
+    def __init__(self, array):
+        self.array = array
+        self.shape = array.shape
+        self.dtype = array.dtype
+
+    def __getitem__(self, index):
+        return self.array[index].copy()
+
+
+class TestTiles(object):
+
+    def setup_class(self):
+        setup_images(self, (60, 50), 80, 2, seed=13579)
+        self.data = self.data.astype(np.float32)
+        self.mask = np.zeros((60, 50), dtype=bool)
+
+    @pytest.mark.parametrize('method', ['center', 'subpixel', 'exact'])
+    def test_matches_whole_image(self, method):
+        for apertures in [self.engine, self.loop, self.engine[:, :1]]:
+            for kwargs in [{}, dict(error=self.error),
+                           dict(error=self.error, gain=self.gain),
+                           dict(error=1.5, gain=self.gain)]:
+                expected = aperture_photometry(self.data, self.xc, self.yc,
+                                               apertures, method=method,
+                                               **kwargs)
+                for tile_size in [1, 8, 1000]:
+                    result = aperture_photometry(self.data, self.xc,
+                                                 self.yc, apertures,
+                                                 method=method,
+                                                 tile_size=tile_size,
+                                                 **kwargs)
+                    assert_allclose(result, expected, rtol=TOL, atol=TOL)
+
+    def test_single_object_groups(self):
+        # A tile holding one object with its own apertures must not be
+        # taken as apertures shared by all objects.
+        data = np.ones((100, 100))
+        data[4, 4] = np.nan
+        apertures = np.array([[CircularAperture(7.5)] * 2,
+                              [CircularAperture(3.)] * 2], dtype=object)
+        expected = aperture_photometry(data, [10., 80.], [10., 80.],
+                                       apertures)
+        result = aperture_photometry(data, [10., 80.], [10., 80.], apertures,
+                                     tile_size=32)
+        assert np.isnan(expected[0, 0])
+        assert_allclose(result, expected, rtol=TOL, atol=TOL)
+
+    def test_lazy_arrays(self, tmpdir):
+        filename = str(tmpdir.join('data.dat'))
+        memmap = np.memmap(filename, dtype=np.float32, mode='w+',
+                           shape=self.data.shape)
+        memmap[:] = self.data
+        memmap.flush()
+        memmap = np.memmap(filename, dtype=np.float32, mode='r',
+                           shape=self.data.shape)
+        expected = aperture_photometry(self.data, self.xc, self.yc,
+                                       self.engine, error=self.error,
+                                       mask=self.mask)
+        for data in [memmap, LazyArray(self.data)]:
+            result = aperture_photometry(data, self.xc, self.yc,
+                                         self.engine,
+                                         error=LazyArray(self.error),
+                                         mask=LazyArray(self.mask))
+            assert_allclose(result, expected, rtol=TOL, atol=TOL)
+        flux = aperture_photometry(memmap, 12.3, 20.1, CircularAperture(4.))
+        assert np.isscalar(flux)
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            aperture_photometry(self.data, self.xc, self.yc, self.engine,
+                                tile_size=-1)
+        with pytest.raises(ValueError):
+            aperture_photometry(LazyArray(self.data), self.xc, self.yc,
+                                self.engine, error=self.error[1:])
+
+
+class TestSortObjects(object):
+
+    def setup_class(self):
+        setup_images(self, (200, 150), 300, 2, seed=8642)
+
+    @pytest.mark.parametrize('method', ['center', 'subpixel', 'exact'])
+    def test_same_results(self, method):
+        for apertures in [self.engine, self.loop, GROWTH]:
+            for n_jobs in [1, 2]:
+                expected = aperture_photometry(
+                    self.data, self.xc, self.yc, apertures,
+                    error=self.error, method=method, n_jobs=n_jobs,
+                    sort_objects=False)
+                result = aperture_photometry(
+                    self.data, self.xc, self.yc, apertures,
+                    error=self.error, method=method, n_jobs=n_jobs,
+                    sort_objects=True)
+                assert_array_equal(result, expected)
+
+    def test_order(self):
+        from ..aperture import _spatial_order
+        order = _spatial_order(self.xc, self.yc)
+        assert_array_equal(np.sort(order), np.arange(len(self.xc)))
+        band = np.floor(self.yc[order] / 64.)
+        assert np.all(np.diff(band) >= 0)
+
+
+class TestVariance(object):
+
+    def setup_class(self):
+        # The centers are inside the image, for pixelwise_errors=False.
+        setup_images(self, (40, 30), 25, 2, seed=97531, margin=0.)
+        self.variance = self.error ** 2 + self.data / self.gain
+
+    @pytest.mark.parametrize('method', ['center', 'subpixel', 'exact'])
+    def test_matches_error_gain(self, method):
+        for apertures in [self.engine, self.loop, GROWTH]:
+            expected = aperture_photometry(self.data, self.xc, self.yc,
+                                           apertures, error=self.error,
+                                           gain=self.gain, method=method)
+            result = aperture_photometry(self.data, self.xc, self.yc,
+                                         apertures, variance=self.variance,
+                                         method=method)
+            assert_allclose(result, expected, rtol=TOL, atol=TOL)
+
+            # The variance at the center is used for the whole aperture.
+            expected = aperture_photometry(self.data, self.xc, self.yc,
+                                           apertures,
+                                           error=np.sqrt(self.variance),
+                                           method=method,
+                                           pixelwise_errors=False)
+            result = aperture_photometry(self.data, self.xc, self.yc,
+                                         apertures, variance=self.variance,
+                                         method=method,
+                                         pixelwise_errors=False)
+            assert_allclose(result, expected, rtol=TOL, atol=TOL)
+
+    @pytest.mark.parametrize('method', ['center', 'exact'])
+    def test_approximate_modes(self, method):
+        expected = aperture_photometry(self.data, self.xc, self.yc,
+                                       self.engine, error=self.error,
+                                       gain=self.gain, method=method)
+        for kwargs in [dict(prefix_sums=True),
+                       dict(prefix_sums=PrefixSums(self.data,
+                                                   variance=self.variance))]:
+            result = aperture_photometry(self.data, self.xc, self.yc,
+                                         self.engine, variance=self.variance,
+                                         method=method, **kwargs)
+            assert_allclose(result, expected, rtol=1.e-10, atol=1.e-10)
+        if method == 'exact':
+            result = aperture_photometry(self.data, self.xc, self.yc,
+                                         self.engine, variance=self.variance,
+                                         phase_tolerance=1.e-3)
+            expected = aperture_photometry(self.data, self.xc, self.yc,
+                                           self.engine, error=self.error,
+                                           gain=self.gain,
+                                           phase_tolerance=1.e-3)
+            assert_allclose(result, expected, rtol=TOL, atol=TOL)
+
+    def test_scalar_variance(self):
+        flux, fluxerr = aperture_photometry(self.data, self.xc, self.yc,
+                                            self.engine, variance=2.25)
+        assert_allclose(fluxerr, aperture_photometry(
+            self.data, self.xc, self.yc, self.engine, error=1.5)[1],
+            rtol=TOL, atol=TOL)
+
+    def test_cube_and_tiles(self):
+        expected = aperture_photometry(self.data, self.xc, self.yc,
+                                       self.engine, variance=self.variance)
+        cube = aperture_photometry(self.data[np.newaxis], self.xc, self.yc,
+                                   self.engine, variance=self.variance)
+        assert_allclose([cube[0][0], cube[1][0]], expected, rtol=TOL,
+                        atol=TOL)
+        tiles = aperture_photometry(self.data, self.xc, self.yc, self.engine,
+                                    variance=self.variance, tile_size=8)
+        assert_allclose(tiles, expected, rtol=TOL, atol=TOL)
+
+    def test_variance_image(self):
+        # Many large overlapping apertures: the variance image is built
+        # once by the engine, while the loop squares the errors of each
+        # object.
+        apertures = np.array([[CircularAperture(12.)],
+                              [CircularAnnulus(5., 15.)]], dtype=object)
+        loop = np.array([[LoopCircularAperture(12.)],
+                         [LoopCircularAnnulus(5., 15.)]], dtype=object)
+        for method in ['center', 'exact']:
+            assert_allclose(
+                aperture_photometry(self.data, self.xc, self.yc, apertures,
+                                    error=self.error, gain=self.gain,
+                                    method=method),
+                aperture_photometry(self.data, self.xc, self.yc, loop,
+                                    error=self.error, gain=self.gain,
+                                    method=method),
+                rtol=TOL, atol=TOL)
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            aperture_photometry(self.data, self.xc, self.yc, self.engine,
+                                error=self.error, variance=self.variance)
+        with pytest.raises(ValueError):
+            aperture_photometry(self.data, self.xc, self.yc, self.engine,
+                                variance=self.variance[1:])
+
+
+class LoopCircularApertureArray(CircularApertureArray):
+    aperture_class = LoopCircularAperture
+
+
+def make_aperture_arrays(shape, seed=0):
+    """Random arrays of apertures of each class."""
+    rng = np.random.RandomState(seed)
+    a = rng.uniform(0., 8., shape)
+    b = rng.uniform(0., 8., shape)
+    theta = rng.uniform(0., 2. * np.pi, shape)
+    return [CircularApertureArray(a),
+            CircularAnnulusArray(np.minimum(a, b), np.maximum(a, b) + 0.5),
+            EllipticalApertureArray(a, b, theta),
+            EllipticalAnnulusArray(np.minimum(a, b), np.maximum(a, b) + 0.5,
+                                   b, theta)]
+
+
+class TestApertureArray(object):
+
+    def setup_class(self):
+        rng = setup_images(self, (40, 50), 30, seed=24680)
+        self.mask = rng.uniform(size=(40, 50)) < 0.05
+
+    @pytest.mark.parametrize('method', ['center', 'subpixel', 'exact'])
+    @pytest.mark.parametrize('shape', [(), (30,), (3, 1), (3, 30)])
+    def test_matches_objects(self, method, shape):
+        for apertures in make_aperture_arrays(shape, seed=len(shape)):
+            objects = apertures.to_objects()
+            for kwargs in [dict(), dict(error=self.error, gain=self.gain),
+                           dict(mask=self.mask), dict(tile_size=16),
+                           dict(sort_objects=True)]:
+                expected = aperture_photometry(self.data, self.xc, self.yc,
+                                               objects, method=method,
+                                               **kwargs)
+                result = aperture_photometry(self.data, self.xc, self.yc,
+                                             apertures, method=method,
+                                             **kwargs)
+                assert_allclose(result, expected, rtol=TOL, atol=TOL)
+
+    def test_plan_and_cube(self):
+        for apertures in make_aperture_arrays((2, 30), seed=3):
+            objects = apertures.to_objects()
+            expected = aperture_photometry(self.data, self.xc, self.yc,
+                                           objects)
+            plan = PhotometryPlan(self.data.shape, self.xc, self.yc,
+                                  apertures)
+            assert_allclose(plan.apply(self.data), expected, rtol=TOL,
+                            atol=TOL)
+            cube = aperture_photometry(self.data[np.newaxis], self.xc,
+                                       self.yc, apertures)
+            assert_allclose(cube[0], expected, rtol=TOL, atol=TOL)
+
+    def test_loop_subclass(self):
+        # Arrays of other aperture classes go through the loop, with the
+        # apertures obtained by indexing.
+        r = np.linspace(1., 6., 30)
+        expected = aperture_photometry(self.data, self.xc, self.yc,
+                                       CircularApertureArray(r))
+        result = aperture_photometry(self.data, self.xc, self.yc,
+                                     LoopCircularApertureArray(r))
+        assert_allclose(result, expected, rtol=TOL, atol=TOL)
+
+    def test_indexing(self):
+        apertures = EllipticalAnnulusArray([[1.], [2.]], [3., 4., 5.], 2.,
+                                           0.5)
+        assert apertures.shape == (2, 3)
+        assert len(apertures) == 2
+        aperture = apertures[1, 2]
+        assert type(aperture) is EllipticalAnnulus
+        assert (aperture.a_in, aperture.a_out, aperture.b_out,
+                aperture.theta) == (2., 5., 2., 0.5)
+        assert apertures[0].shape == (3,)
+        assert apertures[:, 1:].shape == (2, 2)
+        assert apertures[..., 0].shape == (2,)
+        assert apertures[np.newaxis].shape == (1, 2, 3)
+        assert apertures.broadcast_to((4, 2, 3)).shape == (4, 2, 3)
+        assert CircularApertureArray(2.).atleast_2d().shape == (1, 1)
+        assert [a.r for a in CircularApertureArray([1., 2.])] == [1., 2.]
+
+    def test_extents_and_areas(self):
+        for apertures in make_aperture_arrays((2, 5), seed=4):
+            objects = apertures.to_objects()
+            assert_allclose(apertures.extents(),
+                            [[o.extent() for o in row] for row in objects],
+                            rtol=TOL, atol=TOL)
+            assert_allclose(apertures.areas(),
+                            [[o.area() for o in row] for row in objects],
+                            rtol=TOL, atol=TOL)
+
+    def test_pickle(self):
+        import pickle
+        for apertures in make_aperture_arrays((2, 5), seed=5):
+            for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+                result = pickle.loads(pickle.dumps(apertures, protocol))
+                assert type(result) is type(apertures)
+                assert_array_equal(result.params, apertures.params)
+
+    def test_invalid(self):
+        with pytest.raises(ValueError) as exc:
+            CircularApertureArray([1., -1.])
+        assert exc.value.args[0] == 'r must be non-negative'
+        with pytest.raises(ValueError) as exc:
+            CircularAnnulusArray([1., 3.], 2.)
+        assert exc.value.args[0] == 'r_out must be greater than r_in'
+        with pytest.raises(ValueError) as exc:
+            EllipticalApertureArray(1., [1., -1.], 0.)
+        assert exc.value.args[0] == 'a and b must be nonnegative.'
+        with pytest.raises(ValueError) as exc:
+            EllipticalAnnulusArray(-1., 2., 1., 0.)
+        assert exc.value.args[0] == 'a_in and b_out must be non-negative'
+        with pytest.raises(ValueError):
+            aperture_photometry(self.data, self.xc, self.yc,
+                                CircularApertureArray(np.ones(3)))
+        with pytest.raises(ValueError):
+            aperture_photometry(self.data, self.xc, self.yc,
+                                CircularApertureArray(np.ones((2, 2, 30))))
+
+
+class TestProfile(object):
+
+    def setup_class(self):
+        rng = setup_images(self, (40, 50), 30, 3, seed=13579)
+        self.mask = rng.uniform(size=(40, 50)) < 0.05
+        from ..aperture import _aperture_extents, _batch_bounds
+        bounds = _batch_bounds(self.xc, self.yc,
+                               _aperture_extents(self.engine), (40, 50))
+        self.n_inside = np.count_nonzero(bounds[:, 1] > 0)
+        self.n_pixels = 3 * np.sum((bounds[:, 1] - bounds[:, 0]) *
+                                   (bounds[:, 3] - bounds[:, 2]))
+
+    @pytest.mark.parametrize('method', ['center', 'subpixel', 'exact'])
+    def test_same_results(self, method):
+        for apertures in [self.engine, self.loop, GROWTH]:
+            for kwargs in [dict(), dict(error=self.error, gain=self.gain),
+                           dict(mask=self.mask), dict(tile_size=16),
+                           dict(n_jobs=2)]:
+                expected = aperture_photometry(self.data, self.xc, self.yc,
+                                               apertures, method=method,
+                                               **kwargs)
+                profile = PhotometryProfile()
+                result = aperture_photometry(self.data, self.xc, self.yc,
+                                             apertures, method=method,
+                                             profile=profile, **kwargs)
+                assert_array_equal(result, expected)
+                assert profile.calls >= 1
+                assert all(t >= 0. for t in profile.times.values())
+
+    def test_pixels_and_paths(self):
+        for apertures, path, stage in [(self.engine, 'batch', 'engine'),
+                                       (self.loop, 'loop', 'encloses')]:
+            profile = PhotometryProfile()
+            aperture_photometry(self.data, self.xc, self.yc, apertures,
+                                error=self.error, cache=False,
+                                profile=profile)
+            assert profile.calls == 1
+            assert list(profile.paths.items()) == [(path, self.n_inside)]
+            assert sum(profile.pixels.values()) == self.n_pixels
+            assert profile.pixels['boundary'] > 0
+            assert profile.times[stage] > 0.
+
+        # The cached fraction arrays are counted too.
+        profile = PhotometryProfile()
+        cache = FractionCache()
+        for k in range(2):
+            aperture_photometry(self.data, self.xc, self.yc, self.engine,
+                                cache=cache, profile=profile)
+        assert cache.hits > 0
+        assert profile.calls == 2
+        assert profile.paths['batch'] == 2 * self.n_inside
+        assert sum(profile.pixels.values()) == 2 * self.n_pixels
+
+    def test_cube_and_tiles(self):
+        profile = PhotometryProfile()
+        aperture_photometry(np.array([self.data, self.data]), self.xc,
+                            self.yc, self.engine, profile=profile)
+        assert list(profile.paths.items()) == [('plan', self.n_inside)]
+        assert profile.times['encloses'] > 0.
+        profile = PhotometryProfile()
+        aperture_photometry(self.data, self.xc, self.yc, self.engine,
+                            tile_size=16, profile=profile)
+        assert profile.calls > 1
+        assert profile.paths['batch'] == self.n_inside
+        assert profile.times['read'] > 0.
+
+    def test_report(self):
+        profile = PhotometryProfile()
+        aperture_photometry(self.data, self.xc, self.yc, self.loop,
+                            mask=self.mask, profile=profile)
+        report = profile.report()
+        assert list(report) == ['calls', 'total', 'stages', 'pixels',
+                                'paths']
+        assert list(report['stages']) == list(PhotometryProfile.stages)
+        assert_allclose(report['total'], sum(profile.times.values()))
+        assert_allclose(sum(stage['fraction']
+                            for stage in report['stages'].values()), 1.)
+        assert report['stages']['mask']['time'] > 0.
+        assert 'encloses' in str(profile)
+        profile.clear()
+        assert profile.calls == 0
+        assert sum(profile.pixels.values()) == 0
+        assert profile.report()['total'] == 0.
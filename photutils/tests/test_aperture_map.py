@@ -0,0 +1,86 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+
+from __future__ import division
+
+import pytest
+import numpy as np
+from numpy.testing import assert_allclose
+
+from ..aperture import CircularAperture, CircularAnnulus, \
+                       EllipticalAperture, EllipticalAnnulus, \
+                       aperture_photometry
+from ..aperture_map import aperture_photometry_map
+
+TOL = 1.e-10
+
+APERTURES = [CircularAperture(2.5), CircularAnnulus(1.5, 4.),
+             EllipticalAperture(5., 2., 0.6),
+             EllipticalAnnulus(1., 3.5, 2., -1.)]
+
+
+class TestMap(object):
+
+    def setup_class(self):
+        rng = np.random.RandomState(1357)
+        self.data = rng.uniform(1., 10., (23, 31))
+        self.error = rng.uniform(0.5, 2., (23, 31))
+        self.gain = rng.uniform(1., 3., (23, 31))
+
+    def expected(self, aperture, step=1, **kwargs):
+        y, x = np.mgrid[0:self.data.shape[0]:step, 0:self.data.shape[1]:step]
+        result = aperture_photometry(self.data, x.ravel().astype(float),
+                                     y.ravel().astype(float), aperture,
+                                     **kwargs)
+        if isinstance(result, tuple):
+            return tuple(np.reshape(r, x.shape) for r in result)
+        return np.reshape(result, x.shape)
+
+    @pytest.mark.parametrize('method', ['center', 'subpixel', 'exact'])
+    @pytest.mark.parametrize('convolution', ['direct', 'fft'])
+    def test_matches_photometry(self, method, convolution):
+        for aperture in APERTURES:
+            kwargs = dict(error=self.error, gain=self.gain, method=method)
+            flux, fluxerr = aperture_photometry_map(
+                self.data, aperture, convolution=convolution, **kwargs)
+            expected_flux, expected_err = self.expected(aperture, **kwargs)
+            assert_allclose(flux, expected_flux, rtol=TOL, atol=TOL)
+            assert_allclose(fluxerr, expected_err, rtol=TOL, atol=TOL)
+
+    @pytest.mark.parametrize('convolution', ['direct', 'fft'])
+    def test_tiles_and_step(self, convolution):
+        # Tiles smaller than the aperture, and a step that does not divide
+        # the image.
+        for aperture in APERTURES:
+            for step in [1, 2, 3]:
+                flux = aperture_photometry_map(self.data, aperture, step=step,
+                                               convolution=convolution,
+                                               tile_size=4)
+                assert_allclose(flux, self.expected(aperture, step=step),
+                                rtol=TOL, atol=TOL)
+
+    def test_scalar_errors(self):
+        aperture = CircularAperture(3.)
+        for kwargs in [dict(error=1.5), dict(error=1.5, gain=2.),
+                       dict(error=self.error, pixelwise_errors=False)]:
+            result = aperture_photometry_map(self.data, aperture, **kwargs)
+            expected = self.expected(aperture, **kwargs)
+            assert_allclose(result, expected, rtol=TOL, atol=TOL)
+
+    def test_auto(self):
+        # Large apertures use FFTs, small ones shifted sums.
+        for aperture in [CircularAperture(1.), CircularAperture(9.)]:
+            flux = aperture_photometry_map(self.data, aperture)
+            assert_allclose(flux, self.expected(aperture), rtol=TOL, atol=TOL)
+
+    def test_invalid(self):
+        aperture = CircularAperture(3.)
+        with pytest.raises(ValueError):
+            aperture_photometry_map(self.data[0], aperture)
+        with pytest.raises(TypeError):
+            aperture_photometry_map(self.data, 3.)
+        with pytest.raises(ValueError):
+            aperture_photometry_map(self.data, aperture, step=0)
+        with pytest.raises(ValueError):
+            aperture_photometry_map(self.data, aperture, convolution='fast')
+        with pytest.raises(ValueError):
+            aperture_photometry_map(self.data, aperture, gain=2.)
@@ -0,0 +1,60 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+
+from __future__ import division
+
+import pytest
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from ..aperture import CircularAperture, EllipticalAnnulus, \
+                       aperture_photometry
+from ..aperture_parallel import aperture_photometry_parallel
+
+
+class TestParallel(object):
+
+    def setup_class(self):
+        rng = np.random.RandomState(2468)
+        self.data = rng.uniform(1., 10., (80, 90))
+        self.error = rng.uniform(0.5, 2., (80, 90))
+        self.gain = rng.uniform(1., 3., (80, 90))
+        self.xc = rng.uniform(5., 85., 300)
+        self.yc = rng.uniform(5., 75., 300)
+        self.apertures = np.array([[CircularAperture(3.)],
+                                   [EllipticalAnnulus(2., 5., 3., 0.7)]])
+
+    @pytest.mark.parametrize('method', ['center', 'subpixel', 'exact'])
+    def test_matches_serial(self, method):
+        kwargs = dict(error=self.error, gain=self.gain, method=method)
+        flux1, fluxerr1 = aperture_photometry(self.data, self.xc, self.yc,
+                                              self.apertures, **kwargs)
+        flux, fluxerr = aperture_photometry_parallel(
+            self.data, self.xc, self.yc, self.apertures, processes=2,
+            min_objects=0, **kwargs)
+        assert_array_equal(flux, flux1)
+        assert_array_equal(fluxerr, fluxerr1)
+
+    def test_matches_serial_scalar_error(self):
+        kwargs = dict(error=1.5, pixelwise_errors=False)
+        flux1, fluxerr1 = aperture_photometry(self.data, self.xc, self.yc,
+                                              CircularAperture(4.), **kwargs)
+        flux, fluxerr = aperture_photometry_parallel(
+            self.data, self.xc, self.yc, CircularAperture(4.), processes=3,
+            min_objects=0, **kwargs)
+        assert flux.shape == (300,)
+        assert_array_equal(flux, flux1)
+        assert_array_equal(fluxerr, fluxerr1)
+
+    def test_serial_fallback(self):
+        # Below min_objects, the result comes from aperture_photometry.
+        flux1 = aperture_photometry(self.data, 40., 30., CircularAperture(4.))
+        flux = aperture_photometry_parallel(self.data, 40., 30.,
+                                            CircularAperture(4.),
+                                            processes=2)
+        assert np.isscalar(flux)
+        assert flux == flux1
+
+    def test_invalid_processes(self):
+        with pytest.raises(ValueError):
+            aperture_photometry_parallel(self.data, self.xc, self.yc,
+                                         self.apertures, processes=0)
@@ -6,7 +6,7 @@
 
 import pytest
 import numpy as np
-from numpy.testing import assert_array_almost_equal_nulp
+from numpy.testing import assert_allclose, assert_array_almost_equal_nulp
 
 from ..aperture import CircularAperture,\
                        CircularAnnulus, \
@@ -160,3 +160,74 @@ class TestErrorGainEllipticalAnnulus(BaseTestErrorGain):
         self.aperture = EllipticalAnnulus(a_in, a_out, b_out, theta)
         self.area = np.pi * (a_out * b_out) - np.pi * (a_in * b_out * a_in / a_out)
         self.true_flux = self.area
+
+
+def mirrored(array, mask, xc, yc, aperture):
+    """Copy of ``array`` in which the masked pixels of the sub-array of an
+    object are replaced by the pixel mirrored across its center, or by
+    zero if that pixel is masked or out of the sub-array."""
+    x_lo, x_hi, y_lo, y_hi = aperture.extent()
+    x_min = max(int(xc + x_lo + 0.5), 0)
+    x_max = min(int(xc + x_hi + 1.5), array.shape[1])
+    y_min = max(int(yc + y_lo + 0.5), 0)
+    y_max = min(int(yc + y_hi + 1.5), array.shape[0])
+    result = array.copy()
+    for y in range(y_min, y_max):
+        for x in range(x_min, x_max):
+            if not mask[y, x]:
+                continue
+            x_mirror = int(np.floor(2. * xc - x + 0.5))
+            y_mirror = int(np.floor(2. * yc - y + 0.5))
+            if (x_min <= x_mirror < x_max and y_min <= y_mirror < y_max and
+                    not mask[y_mirror, x_mirror]):
+                result[y, x] = array[y_mirror, x_mirror]
+            else:
+                result[y, x] = 0.
+    return result
+
+
+@pytest.mark.parametrize(('aperture'), APERTURES)
+@pytest.mark.parametrize(('method'), ['center', 'subpixel', 'exact'])
+def test_mask_mirrors(aperture, method):
+    rng = np.random.RandomState(1234)
+    data = rng.uniform(1., 10., (30, 30))
+    error = rng.uniform(0.5, 2., (30, 30))
+    mask = rng.uniform(size=(30, 30)) > 0.8
+    data[mask] = np.nan
+    for xc, yc in [(14.3, 15.6), (2.2, 27.9)]:
+        flux, fluxerr = aperture_photometry(data, xc, yc, aperture,
+                                            error=error, gain=2., mask=mask,
+                                            method=method)
+        # The variance of the masked pixels is that of their mirrors.
+        replaced = mirrored(data, mask, xc, yc, aperture)
+        variance = mirrored(error ** 2 + data / 2., mask, xc, yc, aperture)
+        true_flux, true_variance = [
+            aperture_photometry(array, xc, yc, aperture, method=method)
+            for array in (replaced, np.where(np.isnan(variance), 0.,
+                                             variance))]
+        assert abs(flux - true_flux) < 1.e-10 * abs(true_flux)
+        assert abs(fluxerr ** 2 - true_variance) < 1.e-10 * true_variance
+
+
+@pytest.mark.parametrize(('method'), ['center', 'subpixel', 'exact'])
+def test_mask_mirrors_cube(method):
+    # The masked pixels of a stack of images are mirrored frame by frame,
+    # with a mask per frame or one mask for all of them.
+    rng = np.random.RandomState(24680)
+    data = rng.uniform(1., 10., (4, 40, 30))
+    error = rng.uniform(0.5, 2., (4, 40, 30))
+    xc = rng.uniform(-5., 35., 20)
+    yc = rng.uniform(-5., 45., 20)
+    cube_mask = rng.uniform(size=(4, 40, 30)) > 0.9
+    for mask in [cube_mask, cube_mask[0]]:
+        flux, fluxerr = aperture_photometry(data, xc, yc, APERTURES[2],
+                                            error=error, mask=mask,
+                                            method=method)
+        for k in range(data.shape[0]):
+            frame_mask = mask[k] if mask.ndim == 3 else mask
+            true_flux, true_fluxerr = aperture_photometry(
+                data[k], xc, yc, APERTURES[2], error=error[k],
+                mask=frame_mask, method=method)
+            assert_allclose(flux[k], true_flux, rtol=1.e-12, atol=1.e-12)
+            assert_allclose(fluxerr[k], true_fluxerr, rtol=1.e-12,
+                            atol=1.e-12)
@@ -0,0 +1,74 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+
+from __future__ import division
+
+import pytest
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from ..aperture import CircularAperture, CircularAnnulus, \
+                       aperture_photometry
+from ..aperture_stream import iter_aperture_photometry
+
+
+class TestIterPhotometry(object):
+
+    def setup_class(self):
+        rng = np.random.RandomState(1357)
+        self.data = rng.uniform(1., 10., (60, 70))
+        self.error = rng.uniform(0.5, 2., (60, 70))
+        self.xc = rng.uniform(0., 70., 53)
+        self.yc = rng.uniform(0., 60., 53)
+        self.radii = rng.uniform(1., 6., 53)
+
+    def test_shared_apertures(self):
+        apertures = np.array([[CircularAperture(3.)],
+                              [CircularAnnulus(4., 6.)]], dtype=object)
+        expected = aperture_photometry(self.data, self.xc, self.yc,
+                                       apertures, error=self.error)
+        centers = np.column_stack([self.xc, self.yc])
+        for sources in [centers, (tuple(row) for row in centers)]:
+            chunks = list(iter_aperture_photometry(
+                self.data, sources, apertures, chunk_size=10,
+                error=self.error))
+            assert len(chunks) == 6
+            flux = np.concatenate([chunk[0] for chunk in chunks], axis=1)
+            fluxerr = np.concatenate([chunk[1] for chunk in chunks], axis=1)
+            assert_array_equal(flux, expected[0])
+            assert_array_equal(fluxerr, expected[1])
+
+    def test_source_apertures(self):
+        apertures = np.array([CircularAperture(r) for r in self.radii],
+                             dtype=object)
+        expected = aperture_photometry(self.data, self.xc, self.yc,
+                                       apertures)
+        sources = ((x, y, CircularAperture(r))
+                   for x, y, r in zip(self.xc, self.yc, self.radii))
+        flux = np.concatenate(list(iter_aperture_photometry(
+            self.data, sources, chunk_size=20)))
+        assert_array_equal(flux, expected)
+
+        sources = [(x, y, [CircularAperture(r), CircularAperture(2. * r)])
+                   for x, y, r in zip(self.xc, self.yc, self.radii)]
+        apertures = np.array([source[2] for source in sources],
+                             dtype=object).T
+        expected = aperture_photometry(self.data, self.xc, self.yc,
+                                       apertures)
+        flux = np.concatenate(list(iter_aperture_photometry(
+            self.data, sources, chunk_size=20)), axis=1)
+        assert_array_equal(flux, expected)
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            next(iter_aperture_photometry(self.data, [(1., 2.)],
+                                          CircularAperture(3.),
+                                          chunk_size=0))
+        with pytest.raises(ValueError):
+            next(iter_aperture_photometry(self.data, [(1., 2.)]))
+        with pytest.raises(ValueError):
+            next(iter_aperture_photometry(
+                self.data, [(1., 2., CircularAperture(3.)),
+                            (1., 2., [CircularAperture(3.)] * 2)]))
+        with pytest.raises(ValueError):
+            next(iter_aperture_photometry(self.data, np.zeros((5, 3)),
+                                          CircularAperture(3.)))
@@ -1,3 +1,4 @@
+import math
 import random
 
 import numpy as np
@@ -25,6 +26,24 @@ def sample_grid(r):
     return xmin, xmax, ymin, ymax, nx, ny, area
 
 
+def ref_elliptical_sampled(xmin, xmax, ymin, ymax, nx, ny, a_in, b_in,
+                           a_out, b_out, theta, subpixels):
+    """Reference (meshgrid) implementation of the 'center' and 'subpixel'
+    methods of the elliptical apertures."""
+    from ..utils.downsample import downsample
+    x_size = (xmax - xmin) / (nx * subpixels)
+    y_size = (ymax - ymin) / (ny * subpixels)
+    x_centers = np.arange(xmin + x_size / 2., xmax, x_size)
+    y_centers = np.arange(ymin + y_size / 2., ymax, y_size)
+    xx, yy = np.meshgrid(x_centers, y_centers)
+    numerator1 = xx * math.cos(theta) + yy * math.sin(theta)
+    numerator2 = yy * math.cos(theta) - xx * math.sin(theta)
+    in_aper = ((numerator1 / a_out) ** 2 + (numerator2 / b_out) ** 2) < 1.
+    if a_in != 0 and b_in != 0:
+        in_aper &= ((numerator1 / a_in) ** 2 + (numerator2 / b_in) ** 2) > 1.
+    return downsample(in_aper.astype(float), subpixels)
+
+
 def test_accuracy_circular_exact():
     random.seed('test_accuracy_circular_exact')
     for i in range(NITER):
@@ -71,3 +90,81 @@ def test_accuracy_elliptical_annulus_exact():
         xmin, xmax, ymin, ymax, nx, ny, area = sample_grid(a_out)
         frac = ap.encloses(xmin, xmax, ymin, ymax, nx, ny, method='exact')
         assert_allclose(np.sum(frac) * area, ap.area(), rtol=TOL)
+
+
+def test_circular_annulus_matches_difference():
+    from ..circular_overlap import circular_overlap_grid
+    random.seed('test_circular_annulus_matches_difference')
+    for i in range(100):
+        r1 = random.uniform(0., 10.)
+        r2 = random.uniform(r1, 10.)
+        ap = CircularAnnulus(r1, r2)
+        xmin, xmax, ymin, ymax, nx, ny, area = sample_grid(r2)
+        for use_exact, method in [(0, 'subpixel'), (1, 'exact')]:
+            frac = ap.encloses(xmin, xmax, ymin, ymax, nx, ny,
+                               method=method, subpixels=3)
+            ref = (circular_overlap_grid(xmin, xmax, ymin, ymax, nx, ny, r2,
+                                         use_exact, 3) -
+                   circular_overlap_grid(xmin, xmax, ymin, ymax, nx, ny, r1,
+                                         use_exact, 3))
+            assert np.all(frac == ref)
+
+
+def test_elliptical_annulus_matches_difference():
+    from ..elliptical_exact import elliptical_overlap_grid
+    random.seed('test_elliptical_annulus_matches_difference')
+    for i in range(100):
+        a_in = random.uniform(0., 10.)
+        a_out = random.uniform(a_in, 10.)
+        b_out = random.uniform(0., a_out)
+        theta = random.uniform(0., 2. * np.pi)
+        ap = EllipticalAnnulus(a_in, a_out, b_out, theta)
+        xmin, xmax, ymin, ymax, nx, ny, area = sample_grid(a_out)
+        frac = ap.encloses(xmin, xmax, ymin, ymax, nx, ny, method='exact')
+        x = np.linspace(xmin, xmax, nx + 1)
+        y = np.linspace(ymin, ymax, ny + 1)
+        ref = (elliptical_overlap_grid(x, y, ap.a_out, ap.b_out, theta) -
+               elliptical_overlap_grid(x, y, ap.a_in, ap.b_in, theta))
+        assert_allclose(frac, ref, rtol=0., atol=TOL)
+
+
+def test_elliptical_extent():
+    # The extent is the bounding box of the rotated ellipse: it contains
+    # the whole boundary and touches it on each side.
+    random.seed('test_elliptical_extent')
+    phi = np.linspace(0., 2. * np.pi, 10001)
+    for i in range(100):
+        a = random.uniform(0., 10.)
+        b = random.uniform(0., a)
+        theta = random.uniform(0., 2. * np.pi)
+        x = a * np.cos(phi) * np.cos(theta) - b * np.sin(phi) * np.sin(theta)
+        y = a * np.cos(phi) * np.sin(theta) + b * np.sin(phi) * np.cos(theta)
+        for ap in [EllipticalAperture(a, b, theta),
+                   EllipticalAnnulus(0.5 * a, a, b, theta)]:
+            x_min, x_max, y_min, y_max = ap.extent()
+            assert_allclose([x_min, x_max, y_min, y_max],
+                            [x.min(), x.max(), y.min(), y.max()],
+                            rtol=0., atol=1.e-6 * a)
+
+
+def test_elliptical_sampled_matches_meshgrid():
+    random.seed('test_elliptical_sampled_matches_meshgrid')
+    for i in range(100):
+        a_in = random.uniform(0., 10.)
+        a_out = random.uniform(a_in, 10.)
+        b_out = random.uniform(0., a_out)
+        theta = random.uniform(0., 2. * np.pi)
+        xmin, xmax, ymin, ymax, nx, ny, area = sample_grid(a_out)
+        for ap, a_in, b_in, a_out, b_out in [
+                (EllipticalAperture(a_out, b_out, theta), 0., 0., a_out,
+                 b_out),
+                (EllipticalAnnulus(a_in, a_out, b_out, theta), a_in,
+                 a_in * b_out / a_out, a_out, b_out)]:
+            for method, subpixels in [('center', 1), ('subpixel', 1),
+                                      ('subpixel', 4)]:
+                frac = ap.encloses(xmin, xmax, ymin, ymax, nx, ny,
+                                   method=method, subpixels=subpixels)
+                ref = ref_elliptical_sampled(xmin, xmax, ymin, ymax, nx, ny,
+                                             a_in, b_in, a_out, b_out, theta,
+                                             subpixels)
+                assert np.all(frac == ref)
@@ -0,0 +1,199 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+
+# These tests check the C-level exact circular overlap functions against
+# a pure-Python transcription of the original def-based implementation,
+# which is kept here as a reference. Both do the same floating-point
+# operations in the same order, so results must be identical.
+
+import math
+import random
+
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from ..circular_overlap import distance, area_arc, area_triangle, \
+                               circular_overlap_grid, \
+                               overlap_single_subpixel, \
+                               overlap_single_exact, circular_overlap_core
+
+NITER = 1000
+
+
+def ref_distance(x1, y1, x2, y2):
+    return math.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
+
+
+def ref_area_arc(x1, y1, x2, y2, R):
+    a = ref_distance(x1, y1, x2, y2)
+    theta = 2. * math.asin(0.5 * a / R)
+    return 0.5 * R * R * (theta - math.sin(theta))
+
+
+def ref_area_triangle(x1, y1, x2, y2, x3, y3):
+    return 0.5 * abs(x1 * (y2 - y3) + x2 * (y3 - y1) + x3 * (y1 - y2))
+
+
+def ref_circular_overlap_grid(xmin, xmax, ymin, ymax, nx, ny, R, use_exact,
+                              subpixels):
+    frac = np.zeros([ny, nx])
+    dx = (xmax - xmin) / nx
+    dy = (ymax - ymin) / ny
+    pixrad = 0.5 * math.sqrt(dx * dx + dy * dy)
+    xlim0 = -R - 0.5 * dx
+    xlim1 = R + 0.5 * dx
+    ylim0 = -R - 0.5 * dy
+    ylim1 = R + 0.5 * dy
+    for i in range(nx):
+        x = xmin + (i + 0.5) * dx
+        if x > xlim0 and x < xlim1:
+            for j in range(ny):
+                y = ymin + (j + 0.5) * dy
+                if y > ylim0 and y < ylim1:
+                    d = math.sqrt(x * x + y * y)
+                    if d < R - pixrad:
+                        frac[j, i] = 1.
+                    elif d < R + pixrad:
+                        if use_exact:
+                            frac[j, i] = ref_overlap_single_exact(
+                                x - 0.5 * dx, y - 0.5 * dy, x + 0.5 * dx,
+                                y + 0.5 * dy, R) / (dx * dy)
+                        else:
+                            frac[j, i] = ref_overlap_single_subpixel(
+                                x - 0.5 * dx, y - 0.5 * dy, x + 0.5 * dx,
+                                y + 0.5 * dy, R, subpixels)
+    return frac
+
+
+def ref_overlap_single_subpixel(x0, y0, x1, y1, R, subpixels):
+    frac = 0.
+    dx = (x1 - x0) / subpixels
+    dy = (y1 - y0) / subpixels
+    R_squared = R ** 2
+    x = x0 - 0.5 * dx
+    for i in range(subpixels):
+        x += dx
+        y = y0 - 0.5 * dy
+        for j in range(subpixels):
+            y += dy
+            if x * x + y * y < R_squared:
+                frac += 1.
+    return frac / (subpixels * subpixels)
+
+
+def ref_overlap_single_exact(xmin, ymin, xmax, ymax, r):
+    if 0. <= xmin:
+        if 0. <= ymin:
+            return ref_circular_overlap_core(xmin, ymin, xmax, ymax, r)
+        elif 0. >= ymax:
+            return ref_circular_overlap_core(-ymax, xmin, -ymin, xmax, r)
+        else:
+            return ref_overlap_single_exact(xmin, ymin, xmax, 0., r) \
+                 + ref_overlap_single_exact(xmin, 0., xmax, ymax, r)
+    elif 0. >= xmax:
+        if 0. <= ymin:
+            return ref_circular_overlap_core(-xmax, ymin, -xmin, ymax, r)
+        elif 0. >= ymax:
+            return ref_circular_overlap_core(-xmax, -ymax, -xmin, -ymin, r)
+        else:
+            return ref_overlap_single_exact(xmin, ymin, xmax, 0., r) \
+                 + ref_overlap_single_exact(xmin, 0., xmax, ymax, r)
+    else:
+        if 0. <= ymin:
+            return ref_overlap_single_exact(xmin, ymin, 0., ymax, r) \
+                 + ref_overlap_single_exact(0., ymin, xmax, ymax, r)
+        if 0. >= ymax:
+            return ref_overlap_single_exact(xmin, ymin, 0., ymax, r) \
+                 + ref_overlap_single_exact(0., ymin, xmax, ymax, r)
+        else:
+            return ref_overlap_single_exact(xmin, ymin, 0., 0., r) \
+                 + ref_overlap_single_exact(0., ymin, xmax, 0., r) \
+                 + ref_overlap_single_exact(xmin, 0., 0., ymax, r) \
+                 + ref_overlap_single_exact(0., 0., xmax, ymax, r)
+
+
+def ref_circular_overlap_core(xmin, ymin, xmax, ymax, R):
+    if xmin * xmin + ymin * ymin > R * R:
+        area = 0.
+    elif xmax * xmax + ymax * ymax < R * R:
+        area = (xmax - xmin) * (ymax - ymin)
+    else:
+        area = 0.
+        d1 = math.sqrt(xmax * xmax + ymin * ymin)
+        d2 = math.sqrt(xmin * xmin + ymax * ymax)
+        if d1 < R and d2 < R:
+            x1, y1 = math.sqrt(R * R - ymax * ymax), ymax
+            x2, y2 = xmax, math.sqrt(R * R - xmax * xmax)
+            area = (xmax - xmin) * (ymax - ymin) \
+                - ref_area_triangle(x1, y1, x2, y2, xmax, ymax) \
+                + ref_area_arc(x1, y1, x2, y2, R)
+        elif d1 < R:
+            x1, y1 = xmin, math.sqrt(R * R - xmin * xmin)
+            x2, y2 = xmax, math.sqrt(R * R - xmax * xmax)
+            area = ref_area_arc(x1, y1, x2, y2, R) \
+                + ref_area_triangle(x1, y1, x1, ymin, xmax, ymin) \
+                + ref_area_triangle(x1, y1, x2, ymin, x2, y2)
+        elif d2 < R:
+            x1, y1 = math.sqrt(R * R - ymin * ymin), ymin
+            x2, y2 = math.sqrt(R * R - ymax * ymax), ymax
+            area = ref_area_arc(x1, y1, x2, y2, R) \
+                + ref_area_triangle(x1, y1, xmin, y1, xmin, ymax) \
+                + ref_area_triangle(x1, y1, xmin, y2, x2, y2)
+        else:
+            x1, y1 = math.sqrt(R * R - ymin * ymin), ymin
+            x2, y2 = xmin, math.sqrt(R * R - xmin * xmin)
+            area = ref_area_arc(x1, y1, x2, y2, R) \
+                + ref_area_triangle(x1, y1, x2, y2, xmin, ymin)
+    return area
+
+
+def sample_box(R):
+    xmin, xmax = sorted([random.uniform(-1.5 * R, 1.5 * R) for j in range(2)])
+    ymin, ymax = sorted([random.uniform(-1.5 * R, 1.5 * R) for j in range(2)])
+    return xmin, ymin, xmax, ymax
+
+
+def test_helpers_regression():
+    random.seed('test_helpers_regression')
+    for i in range(NITER):
+        R = random.uniform(0.1, 10.)
+        x1, y1, x2, y2 = [random.uniform(-R, R) / math.sqrt(2.)
+                          for j in range(4)]
+        x3, y3 = random.uniform(-R, R), random.uniform(-R, R)
+        assert distance(x1, y1, x2, y2) == ref_distance(x1, y1, x2, y2)
+        assert area_arc(x1, y1, x2, y2, R) == ref_area_arc(x1, y1, x2, y2, R)
+        assert (area_triangle(x1, y1, x2, y2, x3, y3) ==
+                ref_area_triangle(x1, y1, x2, y2, x3, y3))
+
+
+def test_overlap_single_regression():
+    random.seed('test_overlap_single_regression')
+    for i in range(NITER):
+        R = random.uniform(0.1, 10.)
+        xmin, ymin, xmax, ymax = sample_box(R)
+        assert (overlap_single_exact(xmin, ymin, xmax, ymax, R) ==
+                ref_overlap_single_exact(xmin, ymin, xmax, ymax, R))
+        subpixels = random.randint(1, 10)
+        assert (overlap_single_subpixel(xmin, ymin, xmax, ymax, R,
+                                        subpixels) ==
+                ref_overlap_single_subpixel(xmin, ymin, xmax, ymax, R,
+                                            subpixels))
+        # The core function requires the center to be below and left of
+        # the box.
+        xmin, xmax = abs(xmin), abs(xmin) + (xmax - xmin)
+        ymin, ymax = abs(ymin), abs(ymin) + (ymax - ymin)
+        assert (circular_overlap_core(xmin, ymin, xmax, ymax, R) ==
+                ref_circular_overlap_core(xmin, ymin, xmax, ymax, R))
+
+
+def test_circular_overlap_grid_regression():
+    random.seed('test_circular_overlap_grid_regression')
+    for i in range(100):
+        R = random.uniform(0.1, 10.)
+        nx = random.randint(1, 20)
+        ny = random.randint(1, 20)
+        xmin, ymin, xmax, ymax = sample_box(R)
+        for use_exact, subpixels in [(1, 1), (0, 1), (0, 5)]:
+            args = (xmin, xmax, ymin, ymax, nx, ny, R, use_exact,
+                    subpixels)
+            assert_array_equal(circular_overlap_grid(*args),
+                               ref_circular_overlap_grid(*args))
@@ -0,0 +1,266 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+
+# These tests check the C-level exact elliptical overlap functions against
+# a pure-Python transcription of the original tuple-based implementation,
+# which is kept here as a reference. Python and C may round the last bit
+# differently, so results are compared to a tight tolerance.
+
+import math
+import random
+
+import numpy as np
+from numpy.testing import assert_allclose
+
+from ..elliptical_exact import elliptical_overlap_single, \
+                               elliptical_overlap_grid, \
+                               overlap_area_triangle_unit_circle
+
+NITER = 1000
+TOL = 1.e-12
+
+
+def ref_area_arc_unit(x1, y1, x2, y2):
+    a = math.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
+    theta = 2. * math.asin(0.5 * a)
+    return 0.5 * (theta - math.sin(theta))
+
+
+def ref_area_triangle(x1, y1, x2, y2, x3, y3):
+    return 0.5 * abs(x1 * (y2 - y3) + x2 * (y3 - y1) + x3 * (y1 - y2))
+
+
+def ref_in_triangle(x, y, x1, y1, x2, y2, x3, y3):
+    c = 0
+    c += ((y1 > y) != (y2 > y) and x < (x2 - x1) * (y - y1) / (y2 - y1) + x1)
+    c += ((y2 > y) != (y3 > y) and x < (x3 - x2) * (y - y2) / (y3 - y2) + x2)
+    c += ((y3 > y) != (y1 > y) and x < (x1 - x3) * (y - y3) / (y1 - y3) + x3)
+    return c % 2 == 1
+
+
+def ref_circle_line(x1, y1, x2, y2):
+    dx = x2 - x1
+    dy = y2 - y1
+    if abs(dx) < 1.e-10 and abs(dy) < 1.e-10:
+        return 2., 2., 2., 2.
+    if abs(dx) > abs(dy):
+        a = dy / dx
+        b = y1 - a * x1
+        delta = 1. + a * a - b * b
+        if delta > 0.:
+            delta = math.sqrt(delta)
+            xi1 = (- a * b - delta) / (1. + a * a)
+            yi1 = a * xi1 + b
+            xi2 = (- a * b + delta) / (1. + a * a)
+            yi2 = a * xi2 + b
+            return xi1, yi1, xi2, yi2
+        else:
+            return 2., 2., 2., 2.
+    else:
+        a = dx / dy
+        b = x1 - a * y1
+        delta = 1. + a * a - b * b
+        if delta > 0.:
+            delta = math.sqrt(delta)
+            yi1 = (- a * b - delta) / (1. + a * a)
+            xi1 = a * yi1 + b
+            yi2 = (- a * b + delta) / (1. + a * a)
+            xi2 = a * yi2 + b
+            return xi1, yi1, xi2, yi2
+        else:
+            return 2., 2., 2., 2.
+
+
+def ref_circle_segment_single2(x1, y1, x2, y2):
+    xi1, yi1, xi2, yi2 = ref_circle_line(x1, y1, x2, y2)
+    dx1 = abs(xi1 - x2)
+    dy1 = abs(yi1 - y2)
+    dx2 = abs(xi2 - x2)
+    dy2 = abs(yi2 - y2)
+    if dx1 > dy1:
+        if dx1 > dx2:
+            return xi2, yi2
+        else:
+            return xi1, yi1
+    else:
+        if dy1 > dy2:
+            return xi2, yi2
+        else:
+            return xi1, yi1
+
+
+def ref_circle_segment(x1, y1, x2, y2):
+    xi1, yi1, xi2, yi2 = ref_circle_line(x1, y1, x2, y2)
+    if ((xi1 > x1 and xi1 > x2) or (xi1 < x1 and xi1 < x2) or
+            (yi1 > y1 and yi1 > y2) or (yi1 < y1 and yi1 < y2)):
+        xi1, yi1 = 2., 2.
+    if ((xi2 > x1 and xi2 > x2) or (xi2 < x1 and xi2 < x2) or
+            (yi2 > y1 and yi2 > y2) or (yi2 < y1 and yi2 < y2)):
+        xi2, yi2 = 2., 2.
+    if xi1 > 1. and xi2 < 2.:
+        return xi1, yi1, xi2, yi2
+    else:
+        return xi2, yi2, xi1, yi1
+
+
+def ref_overlap_area_triangle_unit_circle(x1, y1, x2, y2, x3, y3):
+    d1 = x1 * x1 + y1 * y1
+    d2 = x2 * x2 + y2 * y2
+    d3 = x3 * x3 + y3 * y3
+
+    if d1 < d2:
+        if d2 < d3:
+            pass
+        elif d1 < d3:
+            x2, y2, d2, x3, y3, d3 = x3, y3, d3, x2, y2, d2
+        else:
+            x1, y1, d1, x2, y2, d2, x3, y3, d3 = \
+                x3, y3, d3, x1, y1, d1, x2, y2, d2
+    else:
+        if d1 < d3:
+            x1, y1, d1, x2, y2, d2 = x2, y2, d2, x1, y1, d1
+        elif d2 < d3:
+            x1, y1, d1, x2, y2, d2, x3, y3, d3 = \
+                x2, y2, d2, x3, y3, d3, x1, y1, d1
+        else:
+            x1, y1, d1, x2, y2, d2, x3, y3, d3 = \
+                x3, y3, d3, x2, y2, d2, x1, y1, d1
+
+    assert d1 <= d2 <= d3
+
+    in1 = d1 < 1
+    in2 = d2 < 1
+    in3 = d3 < 1
+    on1 = abs(d1 - 1) < 1.e-10
+    on2 = abs(d2 - 1) < 1.e-10
+    on3 = abs(d3 - 1) < 1.e-10
+
+    if on3 or in3:
+        area = ref_area_triangle(x1, y1, x2, y2, x3, y3)
+    elif in2 or on2:
+        intersect13 = not on1 or x1 * (x3 - x1) + y1 * (y3 - y1) < 0.
+        intersect23 = not on2 or x2 * (x3 - x2) + y2 * (y3 - y2) < 0.
+        if intersect13 and intersect23:
+            xc1, yc1 = ref_circle_segment_single2(x1, y1, x3, y3)
+            xc2, yc2 = ref_circle_segment_single2(x2, y2, x3, y3)
+            area = ref_area_triangle(x1, y1, x2, y2, xc1, yc1) \
+                 + ref_area_triangle(x2, y2, xc1, yc1, xc2, yc2) \
+                 + ref_area_arc_unit(xc1, yc1, xc2, yc2)
+        elif intersect13:
+            xc1, yc1 = ref_circle_segment_single2(x1, y1, x3, y3)
+            area = ref_area_triangle(x1, y1, x2, y2, xc1, yc1) \
+                 + ref_area_arc_unit(x2, y2, xc1, yc1)
+        elif intersect23:
+            xc2, yc2 = ref_circle_segment_single2(x2, y2, x3, y3)
+            area = ref_area_triangle(x1, y1, x2, y2, xc2, yc2) \
+                 + ref_area_arc_unit(x1, y1, xc2, yc2)
+        else:
+            area = ref_area_arc_unit(x1, y1, x2, y2)
+    elif in1:
+        xc1, yc1, xc2, yc2 = ref_circle_segment(x2, y2, x3, y3)
+        xc3, yc3 = ref_circle_segment_single2(x1, y1, x2, y2)
+        xc4, yc4 = ref_circle_segment_single2(x1, y1, x3, y3)
+        if xc1 > 1.:
+            if (ref_in_triangle(0, 0, x1, y1, x2, y2, x3, y3) and
+                    not ref_in_triangle(0, 0, x1, y1, xc3, yc3, xc4, yc4)):
+                area = ref_area_triangle(x1, y1, xc3, yc3, xc4, yc4) \
+                     + (np.pi - ref_area_arc_unit(xc3, yc3, xc4, yc4))
+            else:
+                area = ref_area_triangle(x1, y1, xc3, yc3, xc4, yc4) \
+                     + ref_area_arc_unit(xc3, yc3, xc4, yc4)
+        else:
+            if abs(xc2 - x2) < abs(xc1 - x2):
+                xc1, yc1, xc2, yc2 = xc2, yc2, xc1, yc1
+            area = ref_area_triangle(x1, y1, xc3, yc3, xc1, yc1) \
+                 + ref_area_triangle(x1, y1, xc1, yc1, xc2, yc2) \
+                 + ref_area_triangle(x1, y1, xc2, yc2, xc4, yc4) \
+                 + ref_area_arc_unit(xc1, yc1, xc3, yc3) \
+                 + ref_area_arc_unit(xc2, yc2, xc4, yc4)
+    else:
+        xc1, yc1, xc2, yc2 = ref_circle_segment(x1, y1, x2, y2)
+        xc3, yc3, xc4, yc4 = ref_circle_segment(x2, y2, x3, y3)
+        xc5, yc5, xc6, yc6 = ref_circle_segment(x3, y3, x1, y1)
+        if xc1 <= 1.:
+            xp, yp = 0.5 * (xc1 + xc2), 0.5 * (yc1 + yc2)
+            area = ref_overlap_area_triangle_unit_circle(x1, y1, x3, y3, xp, yp) \
+                 + ref_overlap_area_triangle_unit_circle(x2, y2, x3, y3, xp, yp)
+        elif xc3 <= 1.:
+            xp, yp = 0.5 * (xc3 + xc4), 0.5 * (yc3 + yc4)
+            area = ref_overlap_area_triangle_unit_circle(x3, y3, x1, y1, xp, yp) \
+                 + ref_overlap_area_triangle_unit_circle(x2, y2, x1, y1, xp, yp)
+        elif xc5 <= 1.:
+            xp, yp = 0.5 * (xc5 + xc6), 0.5 * (yc5 + yc6)
+            area = ref_overlap_area_triangle_unit_circle(x1, y1, x2, y2, xp, yp) \
+                 + ref_overlap_area_triangle_unit_circle(x3, y3, x2, y2, xp, yp)
+        else:
+            if ref_in_triangle(0., 0., x1, y1, x2, y2, x3, y3):
+                return np.pi
+            else:
+                return 0.
+
+    return area
+
+
+def ref_elliptical_overlap_single(xmin, ymin, xmax, ymax, dx, dy, theta):
+    cos_m_theta = math.cos(-theta)
+    sin_m_theta = math.sin(-theta)
+    scale = dx * dy
+    x1, y1 = ((xmin * cos_m_theta - ymin * sin_m_theta) / dx,
+              (xmin * sin_m_theta + ymin * cos_m_theta) / dy)
+    x2, y2 = ((xmax * cos_m_theta - ymin * sin_m_theta) / dx,
+              (xmax * sin_m_theta + ymin * cos_m_theta) / dy)
+    x3, y3 = ((xmax * cos_m_theta - ymax * sin_m_theta) / dx,
+              (xmax * sin_m_theta + ymax * cos_m_theta) / dy)
+    x4, y4 = ((xmin * cos_m_theta - ymax * sin_m_theta) / dx,
+              (xmin * sin_m_theta + ymax * cos_m_theta) / dy)
+    return (ref_overlap_area_triangle_unit_circle(x1, y1, x2, y2, x3, y3) +
+            ref_overlap_area_triangle_unit_circle(x1, y1, x4, y4, x3, y3)) \
+        * scale
+
+
+def sample_ellipse():
+    a = random.uniform(0.1, 10.)
+    b = random.uniform(0.1, a)
+    theta = random.uniform(0., 2. * np.pi)
+    return a, b, theta
+
+
+def test_triangle_unit_circle_regression():
+    random.seed('test_triangle_unit_circle_regression')
+    for i in range(NITER):
+        vertices = [random.uniform(-2., 2.) for j in range(6)]
+        assert_allclose(overlap_area_triangle_unit_circle(*vertices),
+                        ref_overlap_area_triangle_unit_circle(*vertices),
+                        rtol=TOL, atol=TOL)
+
+
+def test_elliptical_overlap_single_regression():
+    random.seed('test_elliptical_overlap_single_regression')
+    for i in range(NITER):
+        a, b, theta = sample_ellipse()
+        xmin, xmax = sorted([random.uniform(-12., 12.) for j in range(2)])
+        ymin, ymax = sorted([random.uniform(-12., 12.) for j in range(2)])
+        assert_allclose(elliptical_overlap_single(xmin, ymin, xmax, ymax,
+                                                  a, b, theta),
+                        ref_elliptical_overlap_single(xmin, ymin, xmax, ymax,
+                                                      a, b, theta),
+                        rtol=TOL, atol=TOL)
+
+
+def test_elliptical_overlap_grid_regression():
+    random.seed('test_elliptical_overlap_grid_regression')
+    for i in range(20):
+        a, b, theta = sample_ellipse()
+        nx = random.randint(1, 20)
+        ny = random.randint(1, 20)
+        x = np.linspace(random.uniform(-12., -a), random.uniform(a, 12.),
+                        nx + 1)
+        y = np.linspace(random.uniform(-12., -a), random.uniform(a, 12.),
+                        ny + 1)
+        frac = elliptical_overlap_grid(x, y, a, b, theta)
+        ref = np.zeros((ny, nx))
+        for ii in range(nx):
+            for jj in range(ny):
+                ref[jj, ii] = ref_elliptical_overlap_single(
+                    x[ii], y[jj], x[ii + 1], y[jj + 1], a, b, theta) \
+                    / (x[ii + 1] - x[ii]) / (y[jj + 1] - y[jj])
+        assert_allclose(frac, ref, rtol=TOL, atol=TOL)